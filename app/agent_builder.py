@@ -1,7 +1,9 @@
 # agent_builder.py
 import os
+import functools
 from dotenv import load_dotenv
 from google.adk.agents import Agent, SequentialAgent
+from google.genai import types
 from app.agent_instructions import get_agent_instructions
 from modules.flight_module import FlightModule
 from modules.meal_order_module import MealOrderModule
@@ -9,15 +11,20 @@ from modules.stock_count_module import StockCountModule
 from modules.erp_module import ERPModule
 from modules.export_excel_module import ExportTextModule
 from modules.knowledge_module import KnowledgeModule
+from modules.data_store import create_data_store
+from modules.reconciliation_module import ReconciliationModule
 
 load_dotenv()
 MODAL_GEMINI_2_0_FLASH = os.environ["GOOGLE_GENAI_MODAL"]
 
 def build_root_agent():
-    flight_module = FlightModule()
-    meal_order_module = MealOrderModule()
-    stock_count_module = StockCountModule()
-    erp_module = ERPModule()
+    # Shared SQLite store when DATA_STORE_BACKEND=sqlite, else the modules' built-in data
+    data_store = create_data_store()
+    flight_module = FlightModule(store=data_store)
+    meal_order_module = MealOrderModule(store=data_store)
+    stock_count_module = StockCountModule(store=data_store)
+    erp_module = ERPModule(store=data_store)
+    reconciliation_module = ReconciliationModule(stock_count_module, erp_module)
     export_text_module = ExportTextModule()
     knowledge_module = KnowledgeModule()
 
@@ -90,7 +97,7 @@ def build_root_agent():
         name="stock_count_reconciliation_agent",
         instruction=get_agent_instructions("stock_count_reconciliation_agent"),
         description="Handles stock count and ERP data comparison and reconciliation",
-        tools=[]
+        tools=[reconciliation_module.reconcile_transaction]
     )
 
     post_approval_export_agent = Agent(
@@ -101,12 +108,73 @@ def build_root_agent():
         tools=[export_text_module.export_post_approval_data]
     )
 
+    # Async knowledge tools keep the event loop free while retrieval runs;
+    # they keep the sync tools' names, docstrings and signatures for the LLM.
+    # Responses are compacted to the packed context plus chunk references
+    # (KNOWLEDGE_RESPONSE_MODE); full chunk text is fetched with get_knowledge_documents
+    @functools.wraps(knowledge_module.get_knowledge_context)
+    async def get_knowledge_context(*args, **kwargs):
+        return knowledge_module.format_context_response(await knowledge_module.get_knowledge_context_async(*args, **kwargs))
+
+    @functools.wraps(knowledge_module.search_specific_topic)
+    async def search_specific_topic(*args, **kwargs):
+        return knowledge_module.format_topic_response(await knowledge_module.search_specific_topic_async(*args, **kwargs))
+
+    @functools.wraps(knowledge_module.get_knowledge_documents)
+    async def get_knowledge_documents(*args, **kwargs):
+        return await knowledge_module.get_knowledge_documents_async(*args, **kwargs)
+
+    # Semantic answer cache: a paraphrase of an earlier question is answered from the
+    # cache without retrieval or an LLM call. Only standalone questions take part: a turn
+    # that follows earlier ones may depend on them, so it is neither looked up nor stored,
+    # and an answer is stored only when the turn's knowledge tools all returned documents
+    # without previous_queries
+    async def reuse_cached_answer(callback_context):
+        if _has_earlier_turns(callback_context):
+            return None
+        cached = await knowledge_module.lookup_semantic_answer(_content_text(callback_context.user_content))
+        if cached is None:
+            return None
+        return types.Content(role="model", parts=[types.Part(text=cached["answer"])])
+
+    def track_cacheable_answer(tool, args, tool_context, tool_response):
+        if tool.name not in ("get_knowledge_context", "search_specific_topic"):
+            return None
+        cacheable = (
+            isinstance(tool_response, dict)
+            and tool_response.get("status") == "success"
+            and bool(tool_response.get("total_documents_found") or tool_response.get("documents_found"))
+            and not args.get("previous_queries")
+        )
+        tracked = tool_context.state.get(CACHEABLE_ANSWER_STATE) or {}
+        if tracked.get("invocation_id") == tool_context.invocation_id:
+            cacheable = cacheable and tracked["cacheable"]
+        tool_context.state[CACHEABLE_ANSWER_STATE] = {"invocation_id": tool_context.invocation_id, "cacheable": cacheable}
+        return None
+
+    async def remember_answer(callback_context, llm_response):
+        content = llm_response.content
+        if llm_response.partial or not content or not content.parts:
+            return None
+        if any(part.function_call for part in content.parts):
+            return None
+        tracked = callback_context.state.get(CACHEABLE_ANSWER_STATE) or {}
+        if tracked.get("invocation_id") != callback_context.invocation_id or not tracked.get("cacheable"):
+            return None
+        if _has_earlier_turns(callback_context):
+            return None
+        await knowledge_module.remember_semantic_answer(_content_text(callback_context.user_content), _content_text(content))
+        return None
+
     knowledge_agent = Agent(
         model=MODAL_GEMINI_2_0_FLASH,
         name="knowledge_agent",
         instruction=get_agent_instructions("knowledge_agent"),
         description="Handles detailed knowledge queries by searching the vector database and providing comprehensive answers",
-        tools=[knowledge_module.get_knowledge_context, knowledge_module.search_specific_topic]
+        tools=[get_knowledge_context, search_specific_topic, get_knowledge_documents],
+        before_agent_callback=reuse_cached_answer,
+        after_tool_callback=track_cacheable_answer,
+        after_model_callback=remember_answer
     )
 
     # --- Create the SequentialAgent ---
@@ -150,3 +218,22 @@ def say_hello(name: Optional[str] = None) -> str:
 
 def say_goodbye() -> str:
     return "Goodbye! Have a great day."
+
+# Session state entry recording whether the current turn's answer may be cached
+CACHEABLE_ANSWER_STATE = "temp:knowledge_answer_cacheable"
+
+def _has_earlier_turns(callback_context) -> bool:
+    # User messages from earlier invocations of the session, read through the public
+    # session API; without it the turn cannot be shown to be standalone, so it is not cached
+    session = getattr(callback_context, "session", None)
+    if session is None or getattr(session, "events", None) is None:
+        return True
+    return any(
+        event.author == "user" and event.invocation_id != callback_context.invocation_id
+        for event in session.events
+    )
+
+def _content_text(content) -> str:
+    if not content or not content.parts:
+        return ""
+    return "".join(part.text for part in content.parts if part.text and not part.thought).strip()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Knowledge retrieval benchmark
+Runs KnowledgeModule.get_knowledge_context over synthetic corpora (1k to 1M chunks) loaded into
+a temporary ChromaDB, using a deterministic hashing embedder so no Azure access is needed.
+Reports p50/p95/p99 per pipeline stage (decompose, embed, keyword, search, rerank) and end to
+end, plus recall@k of the vector search and recall of the packed context against a golden set.
+exact_recall@k is the same metric for a brute-force search, so index recall loss (HNSW ef_search,
+ef_construction, max_neighbors) can be told apart from embedding quality.
+
+    python -m benchmarks.knowledge_benchmark --sizes 1000 10000 100000
+    python -m benchmarks.knowledge_benchmark --sizes 1000000 --queries 100 --json report.json
+    python -m benchmarks.knowledge_benchmark --sizes 10000 --ef-search 200 --ef-construction 200
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+import uuid
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stats import summarize
+from modules.keyword_search import ChromaKeywordSearch
+from modules.vector_snapshot import VectorSnapshot
+from modules.knowledge_module import KnowledgeModule
+
+SYLLABLES = [
+    "ba", "ca", "de", "fi", "go", "hu", "ja", "ke", "li", "mo", "nu", "pa", "qui", "ro", "sa",
+    "te", "vi", "wo", "xa", "ye", "zu", "bri", "cro", "dra", "fle", "gra", "pro", "sta", "tri", "ver",
+]
+COMMON_WORDS = 5000
+CHUNK_WORDS = (40, 80)
+RELEVANT_PER_QUERY = 3
+DISTRACTORS_PER_QUERY = 3
+# Times each planted topic word appears in a relevant or distractor chunk
+TOPIC_REPEATS = 4
+STAGES = ["decompose", "embed", "keyword", "search", "rerank"]
+
+
+def _word(index: int, prefix: str = "") -> str:
+    # Deterministic pronounceable pseudo-word, unique per index
+    parts = []
+    index += 1
+    while index:
+        index, remainder = divmod(index, len(SYLLABLES))
+        parts.append(SYLLABLES[remainder])
+    return prefix + "".join(parts)
+
+
+def _bucket_and_sign(word: str, dimensions: int) -> Tuple[int, float]:
+    value = zlib.crc32(word.encode("utf-8"))
+    return value % dimensions, 1.0 if (value >> 16) & 1 else -1.0
+
+
+class HashingEmbeddings:
+    """
+    Deterministic bag-of-words embedder standing in for Azure OpenAI.
+    latency_ms adds a fixed delay per request to emulate the network round trip.
+    """
+
+    def __init__(self, dimensions: int = 256, latency_ms: float = 0.0):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+        self.requests = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"[a-z0-9]+", text.lower()):
+                bucket, sign = _bucket_and_sign(token, self.dimensions)
+                matrix[row, bucket] += sign
+        return _normalize(matrix).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class OverlapReranker:
+    """
+    Deterministic cross-encoder stand-in: query term overlap with a small length penalty
+    """
+
+    def predict(self, pairs, batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        scores = []
+        for query, document in pairs:
+            query_terms = set(re.findall(r"[a-z0-9]+", query.lower()))
+            document_terms = re.findall(r"[a-z0-9]+", document.lower())
+            overlap = sum(1 for term in document_terms if term in query_terms)
+            scores.append(overlap / (1.0 + 0.01 * len(document_terms)))
+        return np.asarray(scores, dtype=np.float32)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SyntheticCorpus:
+    """
+    Zipf-distributed filler chunks with planted answers for a golden query set.
+    Each golden query has three rare topic words; its relevant chunks repeat them and
+    distractor chunks mention only one, so retrieval and reranking are both exercised.
+    """
+
+    def __init__(self, size: int, golden_queries: int = 50, dimensions: int = 256, seed: int = 7):
+        self.size = size
+        self.dimensions = dimensions
+        self.seed = seed
+        self.common = [_word(i) for i in range(COMMON_WORDS)]
+        weights = 1.0 / np.arange(1, COMMON_WORDS + 1)
+        self.probabilities = weights / weights.sum()
+        self.common_hash = np.array([_bucket_and_sign(word, dimensions) for word in self.common])
+
+        planted_per_query = RELEVANT_PER_QUERY + DISTRACTORS_PER_QUERY
+        golden_queries = min(golden_queries, max(1, size // (planted_per_query * 2)))
+        self.golden: List[Dict[str, Any]] = []
+        self.planted: Dict[int, List[str]] = {}
+        rng = np.random.default_rng(seed)
+        for g in range(golden_queries):
+            topic = [_word(g * 3 + k, prefix="zy") for k in range(3)]
+            base = g * planted_per_query
+            relevant = [f"chunk-{base + r}" for r in range(RELEVANT_PER_QUERY)]
+            for r in range(RELEVANT_PER_QUERY):
+                self.planted[base + r] = topic * TOPIC_REPEATS
+            for d in range(DISTRACTORS_PER_QUERY):
+                self.planted[base + RELEVANT_PER_QUERY + d] = [topic[d % 3]] * TOPIC_REPEATS
+            self.golden.append({"query": f"what is the {topic[0]} {topic[1]} process for {topic[2]}", "relevant_ids": relevant})
+
+        # Every fourth golden query asks two questions at once to exercise decomposition
+        for first, second in zip(self.golden[0::4], self.golden[1::4]):
+            first["query"] = f"{first['query']} and {second['query']}"
+            first["relevant_ids"] = first["relevant_ids"] + second["relevant_ids"]
+        self._rng = rng
+
+    def batches(self, batch_size: int):
+        """
+        Yield (ids, documents, metadatas, embeddings) batches without holding the whole corpus
+        """
+        rng = np.random.default_rng(self.seed + 1)
+        for start in range(0, self.size, batch_size):
+            count = min(batch_size, self.size - start)
+            lengths = rng.integers(CHUNK_WORDS[0], CHUNK_WORDS[1], size=count)
+            token_ids = rng.choice(COMMON_WORDS, size=int(lengths.sum()), p=self.probabilities)
+            rows = np.repeat(np.arange(count), lengths)
+            matrix = np.zeros((count, self.dimensions), dtype=np.float32)
+            np.add.at(matrix, (rows, self.common_hash[token_ids, 0].astype(np.int64)), self.common_hash[token_ids, 1])
+
+            documents = []
+            offsets = np.concatenate([[0], np.cumsum(lengths)])
+            for row in range(count):
+                words = [self.common[t] for t in token_ids[offsets[row]:offsets[row + 1]]]
+                extra = self.planted.get(start + row)
+                if extra:
+                    for word in extra:
+                        words.insert(int(rng.integers(0, len(words) + 1)), word)
+                        bucket, sign = _bucket_and_sign(word, self.dimensions)
+                        matrix[row, bucket] += sign
+                documents.append(" ".join(words))
+
+            ids = [f"chunk-{start + row}" for row in range(count)]
+            metadatas = [{"source": f"synthetic-{self.size}.pdf", "page": (start + row) // 20 + 1} for row in range(count)]
+            yield ids, documents, metadatas, _normalize(matrix).tolist()
+
+
+def load_corpus(corpus: SyntheticCorpus, directory: str, hnsw: Dict[str, int], query_vectors: np.ndarray, k: int):
+    """
+    Load the corpus into a fresh persistent ChromaDB under directory.
+    While streaming, the exact top-k ids for query_vectors are tracked by brute force so
+    the HNSW index recall can be compared with exact search.
+    Returns (client, collection, seconds, exact_top_ids).
+    """
+    import chromadb
+
+    client = chromadb.PersistentClient(path=directory)
+    configuration = {"hnsw": hnsw} if hnsw else None
+    collection = client.create_collection(name=f"bench_{uuid.uuid4().hex[:8]}", configuration=configuration)
+    batch_size = min(5000, client.get_max_batch_size())
+
+    best_ids = [[] for _ in range(len(query_vectors))]
+    best_scores = np.full((len(query_vectors), 0), -np.inf, dtype=np.float32)
+    started = time.perf_counter()
+    load_seconds = 0.0
+    for ids, documents, metadatas, embeddings in corpus.batches(batch_size):
+        add_started = time.perf_counter()
+        collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+        load_seconds += time.perf_counter() - add_started
+
+        # Keep the running exact top-k (cosine on normalized vectors)
+        scores = np.concatenate([best_scores, query_vectors @ np.asarray(embeddings, dtype=np.float32).T], axis=1)
+        candidates = [row + ids for row in best_ids]
+        keep = np.argsort(-scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_ids = [[candidates[q][i] for i in keep[q]] for q in range(len(query_vectors))]
+    logging.info(f"✅ Generated and loaded {corpus.size} chunks in {time.perf_counter() - started:.1f}s")
+    return client, collection, load_seconds, best_ids
+
+
+def build_module(module: KnowledgeModule, client, collection, directory: str, embeddings, reranker, mode: str, caches: bool, snapshot: Optional[str] = None) -> KnowledgeModule:
+    """
+    Wire a KnowledgeModule to the benchmark collection, bypassing the production stores
+    """
+    module.chroma_client = client
+    module.collection = collection
+    module.embeddings = embeddings
+    module.embedding_model_key = "benchmark:hashing"
+    module.encoder_model = reranker
+    module.retrieval_mode = mode
+    module.keyword_search = ChromaKeywordSearch(collection, sqlite_path=os.path.join(directory, "chroma.sqlite3"))
+    # Search through the HNSW index, or the flat NumPy snapshot in the given dtype
+    module.vector_snapshot = None
+    if snapshot:
+        module.vector_snapshot = VectorSnapshot(os.path.join(directory, "snapshot"), module.collection_version, max_chunks=collection.count(), dtype=snapshot)
+    if caches:
+        from modules.embedding_cache import EmbeddingCache
+
+        module.embedding_cache = EmbeddingCache(model_key="benchmark:hashing")
+    else:
+        # Measure the uncached path: every query pays for retrieval and reranking
+        module.result_cache = None
+        module.semantic_cache = None
+        module.score_cache = None
+    module.ready.set()
+    return module
+
+
+def recall(found_ids: List[str], relevant_ids: List[str]) -> float:
+    return len(set(found_ids) & set(relevant_ids)) / len(relevant_ids)
+
+
+def run_size(size: int, args) -> Dict[str, Any]:
+    corpus = SyntheticCorpus(size, args.queries, args.dimensions)
+    module = KnowledgeModule(warm_up=False)
+    embeddings = HashingEmbeddings(args.dimensions, args.embed_latency_ms)
+    sub_queries = [module._prepare_queries(item["query"], None)[1] for item in corpus.golden]
+    flat_queries = [query for queries in sub_queries for query in queries]
+    query_vectors = np.asarray(embeddings.embed_documents(flat_queries), dtype=np.float32)
+    hnsw = {
+        key: value for key, value in (
+            ("ef_search", args.ef_search), ("ef_construction", args.ef_construction), ("max_neighbors", args.max_neighbors)
+        ) if value
+    }
+
+    with tempfile.TemporaryDirectory(prefix="knowledge-bench-") as directory:
+        client, collection, load_seconds, exact_ids = load_corpus(corpus, directory, hnsw, query_vectors, args.k)
+        exact_by_query = dict(zip(flat_queries, exact_ids))
+        if args.reranker == "model":
+            from modules.reranker_backends import create_reranker
+
+            reranker = create_reranker()
+        else:
+            reranker = OverlapReranker()
+        build_module(module, client, collection, directory, embeddings, reranker, args.mode, args.caches, args.snapshot)
+
+        # Quality pass (untimed): recall@k of the index and of exact search, and of the packed context
+        search_recall, exact_recall, context_recall = [], [], []
+        for item, queries in zip(corpus.golden, sub_queries):
+            hits = module.query_collection(queries, args.k)
+            search_recall.append(recall([hit["id"] for per_query in hits for hit in per_query], item["relevant_ids"]))
+            exact_recall.append(recall([chunk_id for query in queries for chunk_id in exact_by_query[query]], item["relevant_ids"]))
+            result = module.get_knowledge_context(item["query"])
+            context_recall.append(recall([chunk["id"] for chunk in result.get("chunks", [])], item["relevant_ids"]))
+
+        # Latency pass
+        timings = module.enable_stage_timings()
+        totals = []
+        for _ in range(args.repeat):
+            for item in corpus.golden:
+                started = time.perf_counter()
+                module.get_knowledge_context(item["query"])
+                totals.append((time.perf_counter() - started) * 1000)
+
+        report = {
+            "corpus_size": size,
+            "golden_queries": len(corpus.golden),
+            "mode": args.mode,
+            "search": f"snapshot-{args.snapshot}" if args.snapshot else "chroma",
+            "load_seconds": round(load_seconds, 1),
+            "hnsw": collection.configuration.get("hnsw") if hasattr(collection, "configuration") else hnsw,
+            "stages_ms": {stage: summarize(timings[stage]) for stage in STAGES if timings.get(stage)},
+            "total_ms": summarize(totals),
+            f"recall@{args.k}": round(float(np.mean(search_recall)), 4),
+            f"exact_recall@{args.k}": round(float(np.mean(exact_recall)), 4),
+            "context_recall": round(float(np.mean(context_recall)), 4),
+            "rerank": module.get_rerank_stats(),
+        }
+        del module, collection, client
+        return report
+
+
+def print_report(report: Dict[str, Any], k: int) -> None:
+    print(
+        f"\n✅ {report['corpus_size']:,} chunks ({report['mode']}, {report['search']}, {report['golden_queries']} golden queries, "
+        f"loaded in {report['load_seconds']}s)  recall@{k} {report[f'recall@{k}']:.3f} "
+        f"(exact {report[f'exact_recall@{k}']:.3f})  "
+        f"context recall {report['context_recall']:.3f}  rerank skip rate {report['rerank']['skip_rate']:.2f}"
+    )
+    print(f"   {'stage':<10}{'p50':>10}{'p95':>10}{'p99':>10}   (ms)")
+    for stage, stats in list(report["stages_ms"].items()) + [("total", report["total_ms"])]:
+        print(f"   {stage:<10}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark knowledge retrieval latency and quality on synthetic corpora")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000], help="Corpus sizes in chunks (up to 1000000)")
+    parser.add_argument("--queries", type=int, default=50, help="Golden queries per corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the golden set")
+    parser.add_argument("--k", type=int, default=5, help="Vector search depth for recall@k")
+    parser.add_argument("--mode", choices=["vector", "hybrid"], default="vector", help="Retrieval mode")
+    parser.add_argument("--dimensions", type=int, default=256, help="Embedding dimensions")
+    parser.add_argument("--ef-search", type=int, help="HNSW ef_search for the benchmark collection (Chroma default if unset)")
+    parser.add_argument("--ef-construction", type=int, help="HNSW ef_construction")
+    parser.add_argument("--max-neighbors", type=int, help="HNSW max_neighbors (M)")
+    parser.add_argument("--snapshot", choices=["float32", "float16"], help="Search the flat NumPy snapshot instead of HNSW")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated embedding round-trip latency")
+    parser.add_argument("--reranker", choices=["overlap", "model"], default="overlap", help="Deterministic stand-in or the configured cross-encoder")
+    parser.add_argument("--caches", action="store_true", help="Keep the result, score and semantic caches enabled")
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    reports = []
+    for size in args.sizes:
+        report = run_size(size, args)
+        print_report(report, args.k)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
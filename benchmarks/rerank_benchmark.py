@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Reranker runtime benchmark
+Compares latency, resident memory and ranking agreement of the torch fp32 cross-encoder
+(the baseline) against the torch int8, ONNX Runtime and ONNX int8 backends.
+Each runtime is loaded in its own process so memory numbers are not shared.
+
+    python -m benchmarks.rerank_benchmark --runtimes torch torch-int8 onnx onnx-int8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sqlite3
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stats import summarize
+from modules.reranker_backends import RERANKER_MODEL, create_reranker
+
+QUERIES = [
+    "how do I approve a stock count",
+    "stock count approval process",
+    "why can't I place meal orders for a cargo flight",
+    "what does FF status mean for a flight",
+    "how are ERP quantities reconciled with stock counts",
+    "export pre approval data to a text file",
+    "meal order eligibility rules for passenger flights",
+    "what happens when a transaction is approved",
+]
+
+SAMPLE_DOCUMENTS = [
+    "Stock count approval requires the reviewer to compare book quantities with ERP data.",
+    "Meal orders are allowed only for passenger flights with service type P.",
+    "Cargo flights carry freight and meal orders cannot be placed.",
+    "The FF status marks a flight as finalised for catering uplift.",
+    "Inventory management alerts you on low stock and generates purchase orders.",
+    "Customers can place catering orders online and pay with cards or wallets.",
+    "Approved transactions are exported to the post-approval file for the ERP system.",
+    "Reconciliation flags items whose counted quantity differs from the ERP quantity.",
+]
+
+CHROMA_SQLITE_PATH = "./chroma-db/chroma.sqlite3"
+
+RUNTIMES = {
+    "torch": ("torch", False),
+    "torch-int8": ("torch", True),
+    "onnx": ("onnx", False),
+    "onnx-int8": ("onnx", True),
+}
+
+
+def load_documents(limit: int) -> List[str]:
+    """
+    Use chunks from the local rag_collection when available, else the built-in samples
+    """
+    try:
+        # Read-only: opening a PersistentClient would touch the committed store files
+        with sqlite3.connect(f"file:{CHROMA_SQLITE_PATH}?mode=ro", uri=True) as conn:
+            rows = conn.execute(
+                "SELECT string_value FROM embedding_metadata WHERE key = 'chroma:document' LIMIT ?", (limit,)
+            ).fetchall()
+        documents = [row[0] for row in rows if row[0]]
+        if documents:
+            return documents
+    except sqlite3.Error:
+        pass
+    return (SAMPLE_DOCUMENTS * (limit // len(SAMPLE_DOCUMENTS) + 1))[:limit]
+
+
+def _run_runtime(name: str, model: str, threads: int, batch_size: int, repeat: int, workload: List[Tuple[str, List[str]]], queue) -> None:
+    runtime, quantize = RUNTIMES[name]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    try:
+        encoder = create_reranker(model, runtime=runtime, quantize=quantize, threads=threads)
+    except Exception as e:
+        queue.put({"runtime": name, "error": str(e)})
+        return
+    load_seconds = time.perf_counter() - started
+
+    # Warm-up pass so one-off graph optimisation is not counted as latency
+    encoder.predict([(workload[0][0], document) for document in workload[0][1]], batch_size=batch_size, show_progress_bar=False)
+
+    latencies = []
+    scores = []
+    for iteration in range(repeat):
+        for query, documents in workload:
+            pairs = [(query, document) for document in documents]
+            started = time.perf_counter()
+            result = encoder.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if iteration == 0:
+                scores.append([float(score) for score in result])
+
+    queue.put({
+        "runtime": name,
+        "load_seconds": round(load_seconds, 2),
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "model_rss_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1),
+        "latency_ms": summarize(latencies),
+        "scores": scores,
+    })
+
+
+def ranking_agreement(baseline: List[List[float]], candidate: List[List[float]], top_k: int = 3) -> Dict[str, float]:
+    """
+    Top-1 agreement, top-k overlap and mean Spearman correlation against the baseline
+    """
+    top1, overlap, spearman = [], [], []
+    for base, other in zip(baseline, candidate):
+        base_order, other_order = np.argsort(base)[::-1], np.argsort(other)[::-1]
+        top1.append(float(base_order[0] == other_order[0]))
+        k = min(top_k, len(base))
+        overlap.append(len(set(base_order[:k]) & set(other_order[:k])) / k)
+        base_ranks, other_ranks = np.argsort(np.argsort(base)), np.argsort(np.argsort(other))
+        if len(base) > 1:
+            spearman.append(float(np.corrcoef(base_ranks, other_ranks)[0, 1]))
+    return {
+        "top1_agreement": round(statistics.fmean(top1), 3),
+        f"top{top_k}_overlap": round(statistics.fmean(overlap), 3),
+        "spearman": round(statistics.fmean(spearman), 3) if spearman else 1.0,
+    }
+
+
+def run_benchmark(runtimes: List[str], model: str, threads: int, batch_size: int, repeat: int, docs_per_query: int) -> List[Dict[str, Any]]:
+    documents = load_documents(len(QUERIES) * docs_per_query)
+    workload = [
+        (query, documents[i * docs_per_query:(i + 1) * docs_per_query] or documents[:docs_per_query])
+        for i, query in enumerate(QUERIES)
+    ]
+
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    for name in runtimes:
+        queue = context.Queue()
+        process = context.Process(target=_run_runtime, args=(name, model, threads, batch_size, repeat, workload, queue))
+        process.start()
+        report = queue.get()
+        process.join()
+        reports.append(report)
+
+    baseline = next((report for report in reports if report["runtime"] == "torch" and "scores" in report), None)
+    for report in reports:
+        if baseline is not None and "scores" in report:
+            report["agreement"] = ranking_agreement(baseline["scores"], report["scores"])
+            report["speedup_p50"] = round(baseline["latency_ms"]["p50"] / max(report["latency_ms"]["p50"], 1e-9), 2)
+    for report in reports:
+        report.pop("scores", None)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cross-encoder reranker runtimes")
+    parser.add_argument("--runtimes", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"], choices=list(RUNTIMES))
+    parser.add_argument("--model", default=RERANKER_MODEL, help="Local cross-encoder directory")
+    parser.add_argument("--threads", type=int, default=1, help="Intra-op threads per runtime")
+    parser.add_argument("--batch-size", type=int, default=32, help="Pairs per forward pass")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the query workload")
+    parser.add_argument("--docs-per-query", type=int, default=20, help="Candidate chunks reranked per query")
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.runtimes, args.model, args.threads, args.batch_size, args.repeat, args.docs_per_query)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for report in results:
+            if "error" in report:
+                print(f"❌ {report['runtime']}: {report['error']}")
+                continue
+            latency = report["latency_ms"]
+            agreement = report.get("agreement", {})
+            print(
+                f"✅ {report['runtime']:<11} p50 {latency['p50']:>8.2f} ms  p95 {latency['p95']:>8.2f} ms  "
+                f"rss {report['peak_rss_mb']:>7.1f} MB  speedup {report.get('speedup_p50', '-')}  "
+                f"top1 {agreement.get('top1_agreement', '-')}  top3 {agreement.get('top3_overlap', '-')}  "
+                f"spearman {agreement.get('spearman', '-')}"
+            )
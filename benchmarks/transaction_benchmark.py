@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Transaction lookup benchmark
+Loads synthetic stock count rows (10^6 by default) into StockCountModule and times
+get_stock_count_details through the transaction-grouped columnar table against the
+previous implementation, a scan over a list of dicts with a validated Pydantic model per row.
+Also times reconcile_transaction on a --reconcile-items item transaction against ERP
+records with a few mismatched and missing items (expected well under 500 ms).
+
+    python -m benchmarks.transaction_benchmark
+    python -m benchmarks.transaction_benchmark --rows 1000000 --transactions 200 --json report.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stats import summarize
+from modules.erp_module import ERPModule
+from modules.reconciliation_module import ReconciliationModule
+from modules.stock_count_module import StockCountItem, StockCountModule, StockCountResponse
+
+
+def synthetic_rows(rows: int, transactions: int, seed: int = 7) -> Iterator[Dict[str, Any]]:
+    """
+    Stock count rows spread evenly over transactions, in shuffled order
+    """
+    rng = random.Random(seed)
+    order = list(range(rows))
+    rng.shuffle(order)
+    for row in order:
+        book_bulk = rng.randint(10, 500)
+        yield {
+            "transaction_id": f"TXN{row % transactions:06d}",
+            "item_code": f"ITEM{row // transactions:07d}",
+            "item_desc": f"Item {row // transactions}",
+            "book_bulk": book_bulk,
+            "book_actual": book_bulk - rng.randint(0, 5),
+            "float_book": book_bulk // 2,
+            "float_actual": book_bulk // 2 - rng.randint(0, 3),
+            "is_review_yn": "N",
+        }
+
+
+def scan_lookup(records: List[Dict[str, Any]], transaction_id: str) -> StockCountResponse:
+    """
+    The previous get_stock_count_details: full scan, then one validated model per match
+    """
+    matching_records = [record for record in records if record["transaction_id"] == transaction_id]
+    items = [StockCountItem(**record) for record in matching_records]
+    return StockCountResponse(status="success", message="", data=items, total_items=len(items))
+
+
+def time_lookups(lookup, transaction_ids: List[str]) -> List[float]:
+    latencies = []
+    for transaction_id in transaction_ids:
+        start = time.perf_counter()
+        lookup(transaction_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def time_reconciliation(items: int, queries: int) -> Dict[str, float]:
+    """
+    reconcile_transaction latencies for one transaction of `items` items, where every
+    1000th item differs, ERP lacks item 1 and has one extra item
+    """
+    def record(n: int, book_actual: int) -> Dict[str, Any]:
+        return {"transaction_id": "TXNREC", "item_code": f"ITEM{n:07d}", "item_desc": f"Item {n}",
+                "book_bulk": 100, "book_actual": book_actual, "float_book": 0, "float_actual": 0, "is_review_yn": "N"}
+
+    stock_counts, erp = StockCountModule(), ERPModule()
+    stock_counts.load_stock_counts(record(n, 90 if n % 1000 == 0 else 95) for n in range(items))
+    erp.load_erp_items(record(n, 95) for n in range(items + 1) if n != 1)
+    reconciliation = ReconciliationModule(stock_counts, erp)
+    assert reconciliation.reconcile_transaction("TXNREC").missing_in_erp == 1
+    return summarize(time_lookups(reconciliation.reconcile_transaction, ["TXNREC"] * queries))
+
+
+def run(args) -> Dict[str, Any]:
+    records = list(synthetic_rows(args.rows, args.transactions))
+    rng = random.Random(11)
+    transaction_ids = [f"TXN{rng.randrange(args.transactions):06d}" for _ in range(args.queries)]
+
+    module = StockCountModule()
+    start = time.perf_counter()
+    module.load_stock_counts(records)
+    load_seconds = time.perf_counter() - start
+
+    # Same rows and order from both paths
+    sample = transaction_ids[0]
+    indexed = module.get_stock_count_details(sample).data
+    scanned = sorted(scan_lookup(records, sample).data, key=lambda item: item.item_code)
+    assert [item.model_dump() for item in indexed] == [item.model_dump() for item in scanned]
+
+    scan_latencies = summarize(time_lookups(lambda tid: scan_lookup(records, tid), transaction_ids[:args.scan_queries]))
+    table_latencies = summarize(time_lookups(module.get_stock_count_details, transaction_ids))
+    reconcile_latencies = time_reconciliation(args.reconcile_items, args.reconcile_queries)
+    return {
+        "rows": args.rows,
+        "transactions": args.transactions,
+        "items_per_transaction": args.rows // args.transactions,
+        "table_load_seconds": round(load_seconds, 2),
+        "scan_ms": scan_latencies,
+        "table_ms": table_latencies,
+        "speedup_p50": round(scan_latencies["p50"] / table_latencies["p50"], 1) if table_latencies["p50"] else None,
+        "reconcile_items": args.reconcile_items,
+        "reconcile_ms": reconcile_latencies,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"\n{report['rows']} rows, {report['transactions']} transactions "
+        f"({report['items_per_transaction']} items each), table loaded in {report['table_load_seconds']}s"
+    )
+    print(f"{'path':<8} {'count':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name in ("scan", "table"):
+        latencies = report[f"{name}_ms"]
+        print(
+            f"{name:<8} {latencies['count']:>6} {latencies['mean']:>9} {latencies['p50']:>9} "
+            f"{latencies['p95']:>9} {latencies['p99']:>9}"
+        )
+    print(f"p50 speedup: {report['speedup_p50']}x")
+    reconcile = report["reconcile_ms"]
+    print(
+        f"reconcile_transaction, {report['reconcile_items']} items: "
+        f"mean {reconcile['mean']} ms, p50 {reconcile['p50']} ms, p99 {reconcile['p99']} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-transaction stock count lookups")
+    parser.add_argument("--rows", type=int, default=1000000, help="Stock count rows loaded")
+    parser.add_argument("--transactions", type=int, default=1000, help="Distinct transaction ids")
+    parser.add_argument("--queries", type=int, default=200, help="Timed lookups through the columnar table")
+    parser.add_argument("--scan-queries", type=int, default=20, help="Timed lookups through the list scan baseline")
+    parser.add_argument("--reconcile-items", type=int, default=5000, help="Items in the reconciled transaction")
+    parser.add_argument("--reconcile-queries", type=int, default=20, help="Timed reconcile_transaction calls")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,87 @@
+# context_packer.py
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Rough characters-per-token ratio for English text with OpenAI/Gemini tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate used for budgeting prompt context
+    """
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _word_set(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def pack_context(
+    chunks: List[Dict[str, Any]],
+    token_budget: int,
+    mmr_lambda: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Select chunks for the prompt context without exceeding token_budget.
+
+    Chunks are dicts with at least "document" and "score" (higher is better).
+    Without mmr_lambda chunks are taken greedily by score; with it, each pick
+    maximises mmr_lambda * relevance - (1 - mmr_lambda) * similarity to the
+    chunks already picked, trading a little relevance for less repetition.
+    Returns the selected chunks in selection order.
+    """
+    if not chunks:
+        return []
+
+    remaining = sorted(chunks, key=lambda chunk: chunk["score"], reverse=True)
+    if mmr_lambda is not None:
+        top, bottom = remaining[0]["score"], remaining[-1]["score"]
+        spread = (top - bottom) or 1.0
+        relevance = {id(chunk): (chunk["score"] - bottom) / spread for chunk in remaining}
+        words = {id(chunk): _word_set(chunk["document"]) for chunk in remaining}
+
+    selected: List[Dict[str, Any]] = []
+    used_tokens = 0
+    while remaining:
+        if mmr_lambda is None or not selected:
+            best = remaining[0]
+        else:
+            best = max(
+                remaining,
+                key=lambda chunk: mmr_lambda * relevance[id(chunk)] - (1 - mmr_lambda) * max(
+                    _jaccard(words[id(chunk)], words[id(picked)]) for picked in selected
+                ),
+            )
+        remaining.remove(best)
+
+        tokens = estimate_tokens(best["document"])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(best)
+        used_tokens += tokens
+
+    if not selected:
+        # Even the best chunk is over budget: keep a truncated copy of it
+        best = max(chunks, key=lambda chunk: chunk["score"])
+        selected.append(dict(best, document=best["document"][:token_budget * CHARS_PER_TOKEN]))
+
+    return selected
+
+
+def stitch_sections(pieces: List[Tuple[int, str]]) -> str:
+    """
+    Rebuild a section from overlapping pieces given as (character offset, text).
+    Gaps left by stripped whitespace between pieces become spaces.
+    """
+    text = ""
+    for offset, piece in sorted(pieces, key=lambda item: item[0]):
+        if offset + len(piece) > len(text):
+            text = text[:offset].ljust(offset) + piece
+    return text
@@ -0,0 +1,362 @@
+# data_store.py
+import argparse
+import csv
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Storage behind the flight, meal order, stock count and ERP modules:
+# "memory" (each module's built-in sample data) or "sqlite" (one shared on-disk dataset)
+DATA_STORE_BACKEND = os.getenv("DATA_STORE_BACKEND", "memory").lower()
+DATA_STORE_PATH = os.getenv("DATA_STORE_PATH", "./.cache/catering_data.sqlite3")
+# Read-only connections kept open for concurrent lookups
+DATA_STORE_READ_CONNECTIONS = int(os.getenv("DATA_STORE_READ_CONNECTIONS", "4"))
+
+# Column name -> SQLite type; names match the dict keys the modules return.
+# Stock count and ERP columns are NOT NULL like the fields of their Pydantic models:
+# a blank text field takes the column default, a blank quantity rejects the row
+TABLES: Dict[str, Dict[str, Any]] = {
+    "flights": {
+        "columns": {
+            "flightNo": "TEXT NOT NULL",
+            "flightDate": "TEXT NOT NULL",
+            "flight_date_ordinal": "INTEGER NOT NULL",
+            "mflId": "INTEGER",
+            "registration_number": "TEXT",
+            "serviceType": "TEXT",
+            "flightStatus": "TEXT",
+        },
+        "primary_key": ("flightNo", "flight_date_ordinal"),
+        "indexes": [("mflId",)],
+    },
+    "meal_orders": {
+        "columns": {"mflId": "INTEGER NOT NULL", "f": "INTEGER", "j": "INTEGER", "w": "INTEGER", "y": "INTEGER"},
+        "primary_key": ("mflId",),
+        "indexes": [],
+    },
+    "stock_counts": {
+        "columns": {
+            "transaction_id": "TEXT NOT NULL",
+            "item_code": "TEXT NOT NULL",
+            "item_desc": "TEXT NOT NULL DEFAULT ''",
+            "book_bulk": "INTEGER NOT NULL",
+            "book_actual": "INTEGER NOT NULL",
+            "float_book": "INTEGER NOT NULL",
+            "float_actual": "INTEGER NOT NULL",
+            "is_review_yn": "TEXT NOT NULL DEFAULT ''",
+        },
+        "primary_key": ("transaction_id", "item_code"),
+        "indexes": [],
+        # A repeated item in a transaction keeps its first record, as in the in-memory table
+        "on_conflict": "IGNORE",
+    },
+    "erp_items": {
+        "columns": {
+            "transaction_id": "TEXT NOT NULL",
+            "item_code": "TEXT NOT NULL",
+            "item_desc": "TEXT NOT NULL DEFAULT ''",
+            "book_bulk": "INTEGER NOT NULL",
+            "book_actual": "INTEGER NOT NULL",
+            "float_book": "INTEGER NOT NULL",
+            "float_actual": "INTEGER NOT NULL",
+        },
+        "primary_key": ("transaction_id", "item_code"),
+        "indexes": [],
+        # A repeated item in a transaction keeps its first record, as in the in-memory table
+        "on_conflict": "IGNORE",
+    },
+}
+
+# Columns that are bookkeeping for the indexes and not part of the returned records
+INTERNAL_COLUMNS = {"flight_date_ordinal"}
+
+
+def _quoted(columns: Iterable[str]) -> str:
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def _column_default(sql_type: str) -> Optional[Any]:
+    _, has_default, default = sql_type.partition(" DEFAULT ")
+    if not has_default:
+        return None
+    return default.strip("'") if default.startswith("'") else int(default)
+
+
+class SQLiteDataStore:
+    """
+    Indexed SQLite storage for the catering data modules.
+    WAL mode lets every worker process read the same file while one writer loads it;
+    lookups use a small pool of read-only connections.
+    """
+
+    def __init__(self, path: str = DATA_STORE_PATH, read_connections: int = DATA_STORE_READ_CONNECTIONS):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._write_lock = threading.Lock()
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+        # Connections are opened on demand, up to read_connections, and reused
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._reader_slots = threading.BoundedSemaphore(max(1, read_connections))
+
+    def _create_schema(self):
+        with self._write_lock, self._writer:
+            for table, spec in TABLES.items():
+                columns = ", ".join(f'"{name}" {sql_type}' for name, sql_type in spec["columns"].items())
+                self._writer.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ({columns}, PRIMARY KEY ({_quoted(spec['primary_key'])})) WITHOUT ROWID"
+                )
+                for index_columns in spec["indexes"]:
+                    name = f"idx_{table}_{'_'.join(index_columns).lower()}"
+                    self._writer.execute(
+                        f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({_quoted(index_columns)})"
+                    )
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        self._reader_slots.acquire()
+        try:
+            try:
+                connection = self._readers.get_nowait()
+            except queue.Empty:
+                connection = self._open_reader()
+            try:
+                yield connection
+            finally:
+                self._readers.put(connection)
+        finally:
+            self._reader_slots.release()
+
+    def _open_reader(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        with self._reader() as connection:
+            rows = connection.execute(sql, tuple(params)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def _iter_query(self, sql: str, params: Iterable[Any] = (), batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        # Own connection rather than a pooled one: several iterators may be open at once
+        connection = self._open_reader()
+        try:
+            cursor = connection.execute(sql, tuple(params))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield self._record(row)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> Dict[str, Any]:
+        return {key: row[key] for key in row.keys() if key not in INTERNAL_COLUMNS}
+
+    def _query_one(self, sql: str, params: Iterable[Any] = ()) -> Optional[Dict[str, Any]]:
+        rows = self._query(sql, params)
+        return rows[0] if rows else None
+
+    # --- lookups used by the data modules ---
+
+    def get_flight(self, flightNo: str, date_ordinal: int) -> Optional[Dict[str, Any]]:
+        return self._query_one('SELECT * FROM flights WHERE "flightNo" = ? AND flight_date_ordinal = ?', (flightNo, date_ordinal))
+
+    def get_next_flight(self, flightNo: str, date_ordinal: int) -> Optional[Dict[str, Any]]:
+        return self._query_one(
+            'SELECT * FROM flights WHERE "flightNo" = ? AND flight_date_ordinal >= ? ORDER BY flight_date_ordinal LIMIT 1',
+            (flightNo, date_ordinal),
+        )
+
+    def get_latest_flight(self, flightNo: str, date_ordinal: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        if date_ordinal is None:
+            return self._query_one('SELECT * FROM flights WHERE "flightNo" = ? ORDER BY flight_date_ordinal DESC LIMIT 1', (flightNo,))
+        return self._query_one(
+            'SELECT * FROM flights WHERE "flightNo" = ? AND flight_date_ordinal <= ? ORDER BY flight_date_ordinal DESC LIMIT 1',
+            (flightNo, date_ordinal),
+        )
+
+    def get_meal_order(self, mflId: int) -> Optional[Dict[str, Any]]:
+        return self._query_one('SELECT * FROM meal_orders WHERE "mflId" = ?', (mflId,))
+
+    def get_stock_counts(self, transaction_id: str) -> List[Dict[str, Any]]:
+        return self._query("SELECT * FROM stock_counts WHERE transaction_id = ? ORDER BY item_code", (transaction_id,))
+
+    def get_erp_items(self, transaction_id: str) -> List[Dict[str, Any]]:
+        return self._query("SELECT * FROM erp_items WHERE transaction_id = ? ORDER BY item_code", (transaction_id,))
+
+    def iter_stock_counts(self, transaction_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a transaction's stock counts in item_code order (primary key order, no sort)
+        """
+        return self._iter_query("SELECT * FROM stock_counts WHERE transaction_id = ? ORDER BY item_code", (transaction_id,))
+
+    def iter_erp_items(self, transaction_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a transaction's ERP items in item_code order (primary key order, no sort)
+        """
+        return self._iter_query("SELECT * FROM erp_items WHERE transaction_id = ? ORDER BY item_code", (transaction_id,))
+
+    # --- loading ---
+
+    def load_rows(self, table: str, rows: Iterable[Dict[str, Any]], batch_size: int = 5000) -> Dict[str, int]:
+        """
+        Insert rows in batches; a row with an existing key replaces it, or is skipped for
+        tables whose on_conflict is IGNORE (stock counts and ERP items keep the first record).
+        Rows missing a key column or a required quantity are skipped, blank text fields take
+        their column default.
+        Flight rows get their flight number normalized and their date ordinal computed.
+        """
+        spec = TABLES[table]
+        columns = list(spec["columns"])
+        sql = f"INSERT OR {spec.get('on_conflict', 'REPLACE')} INTO {table} ({_quoted(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        stats = {"loaded": 0, "skipped": 0}
+
+        batch = []
+        for row in rows:
+            values = self._row_values(table, row, columns)
+            if values is None:
+                stats["skipped"] += 1
+                continue
+            batch.append(values)
+            if len(batch) >= batch_size:
+                self._write_batch(sql, batch, stats)
+                batch = []
+        if batch:
+            self._write_batch(sql, batch, stats)
+        return stats
+
+    def _write_batch(self, sql: str, batch: List[tuple], stats: Dict[str, int]):
+        # Ignored duplicates are not written, so they count as skipped
+        written = self._write(sql, batch)
+        stats["loaded"] += written
+        stats["skipped"] += len(batch) - written
+
+    def _write(self, sql: str, batch: List[tuple]) -> int:
+        with self._write_lock, self._writer:
+            return self._writer.executemany(sql, batch).rowcount
+
+    @staticmethod
+    def _row_values(table: str, row: Dict[str, Any], columns: List[str]) -> Optional[tuple]:
+        record = dict(row)
+        if table == "flights":
+            from modules.flight_module import flight_date_ordinal, normalize_flight_no
+
+            if not record.get("flightNo") or not record.get("flightDate"):
+                return None
+            record["flight_date_ordinal"] = flight_date_ordinal(record["flightDate"])
+            record["flightNo"] = normalize_flight_no(record["flightNo"])
+
+        values = []
+        for column in columns:
+            value = record.get(column)
+            if value == "":
+                value = None
+            sql_type = TABLES[table]["columns"][column]
+            if value is not None and sql_type.startswith("INTEGER"):
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    return None
+            if value is None and "NOT NULL" in sql_type:
+                # An explicit NULL would not fall back to the column default
+                default = _column_default(sql_type)
+                if default is None:
+                    return None
+                value = default
+            values.append(value)
+        return tuple(values)
+
+    def load_file(self, table: str, path: str, batch_size: int = 5000) -> Dict[str, int]:
+        """
+        Stream a CSV (header row with column names) or JSONL file into table
+        """
+        stats = self.load_rows(table, iter_records(path), batch_size)
+        logging.info(f"✅ Loaded {stats['loaded']} rows into {table} from {path} ({stats['skipped']} skipped)")
+        return stats
+
+    def count(self, table: str) -> int:
+        with self._reader() as connection:
+            return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def close(self):
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._write_lock:
+            self._writer.close()
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from a .csv or .jsonl / .ndjson file
+    """
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def create_data_store(backend: str = DATA_STORE_BACKEND, path: str = DATA_STORE_PATH) -> Optional[SQLiteDataStore]:
+    """
+    Shared store for the data modules, or None to keep their in-memory sample data
+    """
+    if backend == "sqlite":
+        logging.info(f"✅ Using SQLite data store at {path}")
+        return SQLiteDataStore(path)
+    return None
+
+
+def seed_sample_data(store: SQLiteDataStore) -> Dict[str, Dict[str, int]]:
+    """
+    Copy the modules' built-in sample data into the store
+    """
+    from modules.erp_module import ERPModule
+    from modules.flight_module import FlightModule
+    from modules.meal_order_module import MealOrderModule
+    from modules.stock_count_module import StockCountModule
+
+    return {
+        "flights": store.load_rows("flights", FlightModule().flightList),
+        "meal_orders": store.load_rows("meal_orders", MealOrderModule().flightList),
+        "stock_counts": store.load_rows("stock_counts", StockCountModule().table.iter_all_rows()),
+        "erp_items": store.load_rows("erp_items", ERPModule().table.iter_all_rows()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load catering data into the shared SQLite store")
+    parser.add_argument("--db", default=DATA_STORE_PATH, help="SQLite database path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    load_parser = subparsers.add_parser("load", help="Bulk-load a CSV or JSONL file")
+    load_parser.add_argument("table", choices=list(TABLES))
+    load_parser.add_argument("path")
+    load_parser.add_argument("--batch-size", type=int, default=5000)
+    subparsers.add_parser("seed", help="Load the modules' built-in sample data")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    data_store = SQLiteDataStore(args.db)
+    if args.command == "load":
+        print(data_store.load_file(args.table, args.path, args.batch_size))
+    else:
+        print(seed_sample_data(data_store))
+    data_store.close()
@@ -0,0 +1,128 @@
+# embedding_backends.py
+import asyncio
+import logging
+import os
+from typing import List, Optional, Tuple
+
+# Embedding backend selection: "azure" (default) or "local" (sentence-transformers on CPU)
+EMBEDDING_BACKEND = os.getenv("KNOWLEDGE_EMBEDDING_BACKEND", "azure").lower()
+LOCAL_EMBEDDING_MODEL = os.getenv("KNOWLEDGE_LOCAL_EMBEDDING_MODEL", "./Modal/all-MiniLM-L6-v2")
+# Local inference runtime: "torch" or "onnx"; quantize enables int8 dynamic quantization
+LOCAL_EMBEDDING_RUNTIME = os.getenv("KNOWLEDGE_LOCAL_EMBEDDING_RUNTIME", "torch").lower()
+LOCAL_EMBEDDING_QUANTIZE = os.getenv("KNOWLEDGE_LOCAL_EMBEDDING_QUANTIZE", "false").lower() == "true"
+
+
+class LocalEmbeddings:
+    """
+    CPU sentence-transformers embedder exposing the same methods as the LangChain
+    embeddings used by KnowledgeModule (embed_documents / embed_query and async variants).
+    Supports the ONNX Runtime backend and int8 dynamic quantization.
+    """
+
+    def __init__(self, model_name_or_path: str = LOCAL_EMBEDDING_MODEL, runtime: str = LOCAL_EMBEDDING_RUNTIME, quantize: bool = LOCAL_EMBEDDING_QUANTIZE, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+
+        if not os.path.exists(model_name_or_path) and model_name_or_path.startswith("./Modal/"):
+            # Fallback to online model if local doesn't exist
+            model_name_or_path = "sentence-transformers/" + os.path.basename(model_name_or_path)
+
+        self.model_name = os.path.basename(model_name_or_path.rstrip("/"))
+        self.runtime = runtime
+        self.quantize = quantize
+        self.batch_size = batch_size
+
+        if runtime == "onnx":
+            model_kwargs = {"provider": "CPUExecutionProvider"}
+            if quantize:
+                # Quantized weights exported with sentence_transformers.export_dynamic_quantized_onnx_model
+                model_kwargs["file_name"] = os.getenv("KNOWLEDGE_LOCAL_EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512.onnx")
+            self.model = SentenceTransformer(model_name_or_path, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        else:
+            self.model = SentenceTransformer(model_name_or_path, device="cpu")
+            if quantize:
+                import torch
+
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        # sentence-transformers renamed get_sentence_embedding_dimension in newer releases
+        get_dimension = getattr(self.model, "get_embedding_dimension", None) or self.model.get_sentence_embedding_dimension
+        self.dimensions = get_dimension()
+
+    @property
+    def model_key(self) -> str:
+        suffix = "-int8" if self.quantize else ""
+        return f"local:{self.model_name}:{self.runtime}{suffix}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # CPU-bound; keep it off the event loop
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+
+def create_embedding_backend(backend: str = EMBEDDING_BACKEND) -> Tuple[object, str, Optional[int]]:
+    """
+    Build the configured embedding backend.
+    Returns (embeddings, model_key, dimensions); dimensions is None when it is only
+    known after the first remote call.
+    """
+    if backend == "local":
+        embeddings = LocalEmbeddings()
+        return embeddings, embeddings.model_key, embeddings.dimensions
+
+    from langchain_openai import AzureOpenAIEmbeddings
+
+    embeddings = AzureOpenAIEmbeddings(
+        azure_deployment=os.getenv("AZURE_OPENAI_EMBEDDING_MODEL"),
+        openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        openai_api_version=os.getenv("AZURE_OPENAI_EMBEDDING_VERSION"),
+    )
+    model_key = f"azure:{os.getenv('AZURE_OPENAI_EMBEDDING_MODEL')}:{os.getenv('AZURE_OPENAI_EMBEDDING_VERSION')}"
+    return embeddings, model_key, None
+
+
+def check_collection_compatibility(collection, model_key: str, dimensions: Optional[int]) -> Optional[str]:
+    """
+    Verify that a collection was built with the given embedding model.
+    Returns a description of the mismatch, or None when the collection is compatible.
+    """
+    metadata = collection.metadata or {}
+    stored_model = metadata.get("embedding_model")
+    if stored_model and stored_model != model_key:
+        return f"collection '{collection.name}' was embedded with {stored_model}, not {model_key}"
+
+    if dimensions is not None:
+        sample = collection.get(limit=1, include=["embeddings"])
+        stored = sample.get("embeddings")
+        if stored is not None and len(stored) and len(stored[0]) != dimensions:
+            return (
+                f"collection '{collection.name}' stores {len(stored[0])}-dimensional vectors "
+                f"but {model_key} produces {dimensions}"
+            )
+    return None
+
+
+def record_collection_embedding_model(collection, model_key: str) -> None:
+    """
+    Stamp the collection metadata with the embedding model used to build it
+    """
+    metadata = dict(collection.metadata or {})
+    if metadata.get("embedding_model") == model_key:
+        return
+    metadata["embedding_model"] = model_key
+    try:
+        collection.modify(metadata=metadata)
+    except Exception as e:
+        logging.warning(f"⚠️ Could not record embedding model on collection: {str(e)}")
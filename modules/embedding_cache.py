@@ -0,0 +1,191 @@
+# embedding_cache.py
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence
+
+from modules.lru_cache import LRUCache
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize query text so trivially different spellings share a cache entry
+    """
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """
+    Two-tier query embedding cache.
+    Tier 1 is an in-memory LRU, tier 2 is an optional SQLite file that survives restarts.
+    Keys combine the normalized query text with the embedding model key
+    (deployment/version), so switching models never returns stale vectors.
+    """
+
+    # Number of written rows between disk-tier TTL/size pruning passes
+    PRUNE_INTERVAL = 256
+
+    def __init__(
+        self,
+        model_key: str,
+        path: Optional[str] = None,
+        max_entries: int = 10000,
+        max_disk_entries: int = 200000,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.model_key = model_key
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes_since_prune = 0
+        if path:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, model_key TEXT NOT NULL, vector BLOB NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_query_embeddings_last_used ON query_embeddings(last_used)"
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Embedding cache disk tier disabled ({path}): {str(e)}")
+            self._conn = None
+
+    def make_key(self, text: str) -> str:
+        digest = hashlib.sha256(f"{self.model_key}\x00{normalize_query(text)}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Look up embeddings for texts; missing entries are returned as None
+        """
+        keys = [self.make_key(text) for text in texts]
+        vectors: List[Optional[List[float]]] = [self.memory.get(key) for key in keys]
+
+        disk_found = 0
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing and self._conn is not None:
+            disk_vectors = self._read_disk([keys[i] for i in missing])
+            for i in missing:
+                vector = disk_vectors.get(keys[i])
+                if vector is not None:
+                    vectors[i] = vector
+                    self.memory.put(keys[i], vector)
+                    disk_found += 1
+
+        with self._lock:
+            found = sum(1 for vector in vectors if vector is not None)
+            self.hits += found
+            self.disk_hits += disk_found
+            self.misses += len(vectors) - found
+        return vectors
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """
+        Store embeddings for texts in both tiers
+        """
+        rows = []
+        now = time.time()
+        for text, vector in zip(texts, vectors):
+            key = self.make_key(text)
+            vector = list(vector)
+            self.memory.put(key, vector)
+            rows.append((key, self.model_key, array("f", vector).tobytes(), now, now))
+
+        if rows and self._conn is not None:
+            with self._lock:
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO query_embeddings (key, model_key, vector, created_at, last_used) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    self._writes_since_prune += len(rows)
+                    if self._writes_since_prune >= self.PRUNE_INTERVAL:
+                        self._prune_disk()
+                        self._writes_since_prune = 0
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f"⚠️ Error writing embedding cache: {str(e)}")
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+        with self._lock:
+            try:
+                placeholders = ",".join("?" * len(keys))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, created_at FROM query_embeddings WHERE key IN ({placeholders})",
+                    keys,
+                ).fetchall()
+                for key, blob, created_at in rows:
+                    if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                        continue
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                if found:
+                    self._conn.executemany(
+                        "UPDATE query_embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key in found],
+                    )
+                    self._conn.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"⚠️ Error reading embedding cache: {str(e)}")
+        return found
+
+    def _prune_disk(self) -> None:
+        if self.ttl_seconds is not None:
+            self._conn.execute(
+                "DELETE FROM query_embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()
+        if count > self.max_disk_entries:
+            self._conn.execute(
+                "DELETE FROM query_embeddings WHERE key IN "
+                "(SELECT key FROM query_embeddings ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM query_embeddings")
+                self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters for both tiers
+        """
+        lookups = self.hits + self.misses
+        return {
+            "model_key": self.model_key,
+            "hits": self.hits,
+            "memory_hits": self.hits - self.disk_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_enabled": self._conn is not None,
+        }
@@ -0,0 +1,145 @@
+# embedding_coalescer.py
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _EmbeddingRequest:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class EmbeddingCoalescer:
+    """
+    Merges embedding requests from concurrent callers into batched provider calls.
+    A request that arrives while nothing else is queued or in flight is sent at once;
+    otherwise the first request waits up to max_wait_ms for others (or until
+    max_batch_size texts), the texts are de-duplicated and sent in one call, and each
+    caller gets its own vectors. At most max_concurrency calls are in flight; while
+    they are busy, new requests queue up and go out together in the next batch.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_wait_ms: float = 5.0,
+        max_batch_size: int = 64,
+        max_concurrency: int = 4,
+    ):
+        self.embed_fn = embed_fn
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self._queue: "queue.Queue[Optional[_EmbeddingRequest]]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embedding-batch")
+        self._dispatcher = None
+        self._in_flight = 0
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "texts_sent": 0, "errors": 0}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Blocking: vectors for texts, in order"""
+        return [vector for future in self._submit(texts) for vector in future.result()]
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        """Async: vectors for texts, in order, without blocking the event loop"""
+        results = await asyncio.gather(*(asyncio.wrap_future(future) for future in self._submit(texts)))
+        return [vector for vectors in results for vector in vectors]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["avg_batch_size"] = round(stats["texts_sent"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["requests_per_batch"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    def close(self):
+        if self._dispatcher is not None:
+            self._queue.put(None)
+            self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def _submit(self, texts: List[str]) -> List[Future]:
+        self._ensure_started()
+        # Oversized requests are split so each part can join a batch
+        requests = [
+            _EmbeddingRequest(list(texts[start:start + self.max_batch_size]))
+            for start in range(0, len(texts), self.max_batch_size)
+        ]
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["texts"] += len(texts)
+        for request in requests:
+            self._queue.put(request)
+        return [request.future for request in requests]
+
+    def _ensure_started(self):
+        if self._dispatcher is not None:
+            return
+        with self._start_lock:
+            if self._dispatcher is None:
+                dispatcher = threading.Thread(target=self._dispatch_loop, name="embedding-coalescer", daemon=True)
+                dispatcher.start()
+                self._dispatcher = dispatcher
+
+    def _dispatch_loop(self):
+        carry = None
+        while True:
+            request = carry or self._queue.get()
+            carry = None
+            if request is None:
+                return
+            # Wait for a free slot first, so requests arriving meanwhile join this batch
+            self._slots.acquire()
+            batch = [request]
+            size = len(request.texts)
+            with self._stats_lock:
+                idle = self._in_flight == 0
+            # A lone caller has nobody to wait for; only take what is already queued
+            deadline = time.monotonic() + (0 if idle and self._queue.empty() else self.max_wait)
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    following = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if following is None:
+                    # Stop after this batch
+                    self._queue.put(None)
+                    break
+                if size + len(following.texts) > self.max_batch_size:
+                    carry = following
+                    break
+                batch.append(following)
+                size += len(following.texts)
+            with self._stats_lock:
+                self._in_flight += 1
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[_EmbeddingRequest]):
+        texts = list(dict.fromkeys(text for request in batch for text in request.texts))
+        try:
+            vectors = self.embed_fn(texts)
+            by_text = dict(zip(texts, vectors))
+            for request in batch:
+                request.future.set_result([by_text[text] for text in request.texts])
+        except Exception as e:
+            logging.error(f"❌ Error embedding a batch of {len(texts)} texts: {str(e)}")
+            with self._stats_lock:
+                self.stats["errors"] += 1
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            with self._stats_lock:
+                self.stats["batches"] += 1
+                self.stats["texts_sent"] += len(texts)
+                self._in_flight -= 1
+            self._slots.release()
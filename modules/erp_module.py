@@ -1,6 +1,20 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+import numpy as np
 from pydantic import BaseModel, Field
 
+from modules.transaction_table import TransactionTable
+
+# Column types of the in-memory columnar table
+ERP_COLUMNS = {
+    "transaction_id": str,
+    "item_code": str,
+    "item_desc": str,
+    "book_bulk": int,
+    "book_actual": int,
+    "float_book": int,
+    "float_actual": int,
+}
+
 class ERPItem(BaseModel):
     transaction_id: str = Field(..., description="Transaction ID")
     item_code: str = Field(..., description="Item Code")
@@ -17,8 +31,10 @@ class ERPResponse(BaseModel):
     total_items: int = Field(0, description="Total number of items")
 
 class ERPModule:
-    def __init__(self):
-        self.erpList = []
+    def __init__(self, store=None):
+        # Optional shared data store; the dummy records below are the in-memory fallback
+        self.store = store
+        records = []
         
         # Dummy data with multiple records per transaction ID
         # Transaction TXN001 - Multiple items
@@ -137,17 +153,48 @@ class ERPModule:
         }
         
         # Add all records to the list
-        self.erpList.append(erp1)
-        self.erpList.append(erp2)
-        self.erpList.append(erp3)
-        self.erpList.append(erp4)
-        self.erpList.append(erp5)
-        self.erpList.append(erp6)
-        self.erpList.append(erp7)
-        self.erpList.append(erp8)
-        self.erpList.append(erp9)
-        self.erpList.append(erp10)
-        self.erpList.append(erp11)
+        records.append(erp1)
+        records.append(erp2)
+        records.append(erp3)
+        records.append(erp4)
+        records.append(erp5)
+        records.append(erp6)
+        records.append(erp7)
+        records.append(erp8)
+        records.append(erp9)
+        records.append(erp10)
+        records.append(erp11)
+
+        # Records grouped by transaction in contiguous column ranges; the table is the only
+        # copy, so bulk loads below are reflected in every lookup
+        self.table = TransactionTable(ERP_COLUMNS, unique=True)
+        self.table.load(records)
+
+    def load_erp_items(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Bulk-load ERP records into the data store or the in-memory table; returns rows loaded
+        """
+        if self.store is not None:
+            return self.store.load_rows("erp_items", records)["loaded"]
+        return self.table.load(records)
+
+    def get_transaction_columns(self, transaction_id: str) -> Dict[str, np.ndarray]:
+        """
+        Column arrays of one transaction's ERP records, sorted by item_code
+        """
+        if self.store is None:
+            return self.table.get_columns(transaction_id)
+        rows = TransactionTable(ERP_COLUMNS)
+        rows.load(self.store.get_erp_items(transaction_id))
+        return rows.get_columns(transaction_id)
+
+    def iter_erp_items(self, transaction_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream one transaction's ERP records in item_code order without loading them all
+        """
+        if self.store is None:
+            return self.table.iter_rows(transaction_id)
+        return self.store.iter_erp_items(transaction_id)
 
     def get_erp_details(self, transaction_id: str) -> ERPResponse:
         # Check if transaction_id is provided
@@ -160,10 +207,10 @@ class ERPModule:
             )
         
         # Find all ERP records that match the transaction_id
-        matching_records = []
-        for erp in self.erpList:
-            if erp["transaction_id"] == transaction_id:
-                matching_records.append(erp)
+        if self.store is not None:
+            matching_records = self.store.get_erp_items(transaction_id)
+        else:
+            matching_records = self.table.get_rows(transaction_id)
         
         # Return results based on number of matches
         if len(matching_records) == 0:
@@ -174,8 +221,11 @@ class ERPModule:
                 total_items=0
             )
         else:
-            # Convert to Pydantic models
-            erp_items = [ERPItem(**record) for record in matching_records]
+            # Convert to Pydantic models; table rows are already typed by their columns
+            if self.store is not None:
+                erp_items = [ERPItem(**record) for record in matching_records]
+            else:
+                erp_items = [ERPItem.model_construct(**record) for record in matching_records]
             return ERPResponse(
                 status="success",
                 message=f"Found {len(erp_items)} ERP records for transaction {transaction_id}",
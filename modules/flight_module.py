@@ -1,25 +1,179 @@
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# Accepted flightDate formats; "DD-MMM-YYYY" is what the agents send
+FLIGHT_DATE_FORMATS = ("%d-%b-%Y", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y")
+
+_MONTHS = {name: number for number, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1
+)}
+_FLIGHT_NO_PATTERN = re.compile(r"^([A-Z0-9]{2})\s*-?\s*0*(\d{1,4})([A-Z]?)$")
+
+
+def normalize_flight_no(flightNo: str) -> str:
+    """
+    Canonical flight number: upper case, no spaces, numeric part padded to 4 digits
+    ("ek 202" -> "EK0202")
+    """
+    value = flightNo.strip().upper()
+    match = _FLIGHT_NO_PATTERN.match(value)
+    if not match:
+        return re.sub(r"\s+", "", value)
+    airline, number, suffix = match.groups()
+    return f"{airline}{int(number):04d}{suffix}"
+
+
+def flight_date_ordinal(flightDate: Union[str, date, int]) -> Optional[int]:
+    """
+    Day ordinal of a flight date (case-insensitive "DD-MMM-YYYY" or the other accepted formats);
+    None when it cannot be parsed
+    """
+    if isinstance(flightDate, int):
+        return flightDate
+    if isinstance(flightDate, date):
+        return flightDate.toordinal()
+    value = flightDate.strip()
+    # Fast path for DD-MMM-YYYY; strptime dominates bulk loads otherwise
+    day, _, rest = value.partition("-")
+    month, _, year = rest.partition("-")
+    if day.isdigit() and year.isdigit() and month.lower() in _MONTHS:
+        try:
+            return date(int(year), _MONTHS[month.lower()], int(day)).toordinal()
+        except ValueError:
+            return None
+    for fmt in FLIGHT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).toordinal()
+        except ValueError:
+            continue
+    return None
+
+
 class FlightModule:
-    def __init__(self):
+    """
+    Flight schedule with hash and sorted indexes:
+    (flightNo, date ordinal) -> leg for O(1) lookups, and per flightNo the legs sorted
+    by date for O(log n) next / latest leg queries.
+    With a data store the same lookups run against its indexed flights table instead.
+    """
+
+    def __init__(self, flights: Optional[Iterable[Dict[str, Any]]] = None, store=None):
+        self.store = store
         self.flightList = []
-        flight1 = {"flightNo": "EK0202", "flightDate": "21-Jun-2025", "mflId": 1, "registration_number": "A6-ABC", "serviceType": "J", "flightStatus": "PD"}
-        flight2 = {"flightNo": "EK0203", "flightDate": "20-Jun-2025", "mflId": 2, "registration_number": "A6-DEF", "serviceType": "P", "flightStatus": "PD"}
-        flight3 = {"flightNo": "EK0500", "flightDate": "23-Jun-2025", "mflId": 4, "registration_number": "A6-GHI", "serviceType": "J", "flightStatus": "FO"}
-        flight4 = {"flightNo": "EK0600", "flightDate": "23-Jun-2025", "mflId": 5, "registration_number": "A6-JKL", "serviceType": "J", "flightStatus": "FO"}
-        self.flightList.append(flight1)
-        self.flightList.append(flight2)
-        self.flightList.append(flight3)
-        self.flightList.append(flight4)
+        self._by_flight_and_date: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._dates_by_flight: Dict[str, List[int]] = {}
+        self._legs_by_flight: Dict[str, List[Dict[str, Any]]] = {}
+
+        # Built-in sample legs, unless the schedule comes from a data store
+        if flights is None and store is None:
+            flight1 = {"flightNo": "EK0202", "flightDate": "21-Jun-2025", "mflId": 1, "registration_number": "A6-ABC", "serviceType": "J", "flightStatus": "PD"}
+            flight2 = {"flightNo": "EK0203", "flightDate": "20-Jun-2025", "mflId": 2, "registration_number": "A6-DEF", "serviceType": "P", "flightStatus": "PD"}
+            flight3 = {"flightNo": "EK0500", "flightDate": "23-Jun-2025", "mflId": 4, "registration_number": "A6-GHI", "serviceType": "J", "flightStatus": "FO"}
+            flight4 = {"flightNo": "EK0600", "flightDate": "23-Jun-2025", "mflId": 5, "registration_number": "A6-JKL", "serviceType": "J", "flightStatus": "FO"}
+            flights = [flight1, flight2, flight3, flight4]
+        if flights is not None:
+            self.load_flights(flights)
+
+    def load_flights(self, flights: Iterable[Dict[str, Any]]) -> int:
+        """
+        Bulk-load legs: hash index filled in one pass, then each flight's legs sorted once.
+        Returns the number of legs indexed.
+        """
+        if self.store is not None:
+            return self.store.load_rows("flights", flights)["loaded"]
+        new_legs: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for flight in flights:
+            key = self._index_key(flight)
+            if key is None:
+                continue
+            self.flightList.append(flight)
+            # The first leg stored for a flight and date wins, as with the old list scan
+            if key in self._by_flight_and_date:
+                continue
+            self._by_flight_and_date[key] = flight
+            new_legs.setdefault(key[0], []).append((key[1], flight))
+
+        for flightNo, legs in new_legs.items():
+            legs.extend(zip(self._dates_by_flight.get(flightNo, []), self._legs_by_flight.get(flightNo, [])))
+            legs.sort(key=lambda leg: leg[0])
+            self._dates_by_flight[flightNo] = [ordinal for ordinal, _ in legs]
+            self._legs_by_flight[flightNo] = [flight for _, flight in legs]
+        return sum(len(legs) for legs in new_legs.values())
+
+    def add_flight(self, flight: Dict[str, Any]) -> bool:
+        """
+        Index a single leg, keeping the per-flight date order; False if it is invalid or a duplicate
+        """
+        key = self._index_key(flight)
+        if self.store is not None:
+            if key is None or self.store.get_flight(*key) is not None:
+                return False
+            return self.store.load_rows("flights", [flight])["loaded"] == 1
+        if key is None or key in self._by_flight_and_date:
+            return False
+        self.flightList.append(flight)
+        self._by_flight_and_date[key] = flight
+        dates = self._dates_by_flight.setdefault(key[0], [])
+        position = bisect_right(dates, key[1])
+        dates.insert(position, key[1])
+        self._legs_by_flight.setdefault(key[0], []).insert(position, flight)
+        return True
 
     def get_flight_details(self, flightNo: str, flightDate: str):
         #check flightNo is exist and flightDate is no exist
         if not flightNo:
             return "Please provide flightNo"
-        
-        #return flight details based on flightNo and flightDate fetched from the flightList
-        for flight in self.flightList:
-            if not flightDate:
-                if flight["flightNo"] == flightNo:
-                    return flight
-            elif flight["flightNo"] == flightNo and flight["flightDate"] == flightDate:
-                return flight
-        return "Flight details not found"
\ No newline at end of file
+
+        #without a date, return the next leg from today (or the latest one if none is upcoming)
+        if not flightDate:
+            return self.get_next_flight(flightNo) or self.get_latest_flight(flightNo) or "Flight details not found"
+
+        ordinal = flight_date_ordinal(flightDate)
+        if ordinal is None:
+            return "Please provide flightDate in DD-MMM-YYYY format"
+        key = (normalize_flight_no(flightNo), ordinal)
+        flight = self.store.get_flight(*key) if self.store is not None else self._by_flight_and_date.get(key)
+        return flight or "Flight details not found"
+
+    def get_next_flight(self, flightNo: str, on_or_after: Union[str, date, int, None] = None) -> Optional[Dict[str, Any]]:
+        """
+        First leg of flightNo on or after the given date (default today)
+        """
+        ordinal = flight_date_ordinal(on_or_after if on_or_after is not None else date.today())
+        if ordinal is None:
+            return None
+        if self.store is not None:
+            return self.store.get_next_flight(normalize_flight_no(flightNo), ordinal)
+        dates, legs = self._legs(flightNo)
+        position = bisect_left(dates, ordinal)
+        return legs[position] if position < len(legs) else None
+
+    def get_latest_flight(self, flightNo: str, on_or_before: Union[str, date, int, None] = None) -> Optional[Dict[str, Any]]:
+        """
+        Last leg of flightNo on or before the given date (default: the last scheduled leg)
+        """
+        ordinal = flight_date_ordinal(on_or_before) if on_or_before is not None else None
+        if on_or_before is not None and ordinal is None:
+            return None
+        if self.store is not None:
+            return self.store.get_latest_flight(normalize_flight_no(flightNo), ordinal)
+        dates, legs = self._legs(flightNo)
+        if ordinal is None:
+            return legs[-1] if legs else None
+        position = bisect_right(dates, ordinal)
+        return legs[position - 1] if position else None
+
+    def _legs(self, flightNo: str) -> Tuple[List[int], List[Dict[str, Any]]]:
+        flightNo = normalize_flight_no(flightNo)
+        return self._dates_by_flight.get(flightNo, []), self._legs_by_flight.get(flightNo, [])
+
+    @staticmethod
+    def _index_key(flight: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+        if not flight.get("flightNo") or not flight.get("flightDate"):
+            return None
+        ordinal = flight_date_ordinal(flight["flightDate"])
+        if ordinal is None:
+            return None
+        return normalize_flight_no(flight["flightNo"]), ordinal
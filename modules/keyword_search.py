@@ -0,0 +1,158 @@
+# keyword_search.py
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+# Words too common to be useful as full-text terms
+STOPWORDS = {
+    "the", "and", "for", "with", "what", "how", "are", "can", "does", "this", "that",
+    "from", "about", "when", "where", "which", "who", "why", "into", "your", "you",
+    "have", "has", "was", "were", "will", "should", "would", "could", "there", "their",
+}
+
+# Reciprocal rank fusion constant (from the original RRF paper)
+RRF_K = 60
+
+# Hyphenated or slashed codes such as "CX-12" or "FF/01", searched as one substring
+CODE_PATTERN = re.compile(r"\w+(?:[-/]\w+)+")
+
+
+def keyword_terms(query: str) -> List[str]:
+    """
+    Extract full-text search terms; the trigram index needs at least 3 characters per term.
+    Codes are kept whole (in the query's case) before the query is split into words, so
+    "CX-12" is still searchable although "cx" and "12" are too short on their own.
+    """
+    codes = [code for code in CODE_PATTERN.findall(query) if len(code) >= 3]
+    words = [token for token in re.findall(r"\w+", query.lower()) if len(token) >= 3 and token not in STOPWORDS]
+    return list(dict.fromkeys(codes + words))
+
+
+def is_lexical_query(query: str) -> bool:
+    """
+    Heuristic for exact-lookup style queries (form codes, status codes, ids, quoted text)
+    that keyword search answers well without an embedding call
+    """
+    words = query.split()
+    if not words or len(words) > 5:
+        return False
+    if re.search(r'"[^"]+"', query):
+        return True
+    for word in words:
+        token = word.strip(".,;:?!()'\"")
+        if re.fullmatch(r"[A-Z]{2,}", token):
+            return True
+        if re.search(r"\d", token) and re.search(r"[A-Za-z]", token):
+            return True
+    return False
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], n_results: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merge ranked hit lists by chunk id with reciprocal rank fusion.
+    The first occurrence of a hit keeps its fields (e.g. vector distance) and gains "rrf_score".
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits):
+            entry = merged.get(hit["id"])
+            if entry is None:
+                entry = merged[hit["id"]] = dict(hit, rrf_score=0.0)
+            elif entry.get("distance") is None and hit.get("distance") is not None:
+                entry["distance"] = hit["distance"]
+            entry["rrf_score"] += 1.0 / (k + rank + 1)
+    return sorted(merged.values(), key=lambda hit: hit["rrf_score"], reverse=True)[:n_results]
+
+
+class ChromaKeywordSearch:
+    """
+    BM25 keyword search over a ChromaDB collection.
+    For a persistent client it queries Chroma's own FTS5 index (embedding_fulltext_search)
+    read-only; otherwise it falls back to where_document filtering with term-count scoring.
+    """
+
+    def __init__(self, collection, sqlite_path: Optional[str] = None):
+        self.collection = collection
+        self.sqlite_path = sqlite_path if sqlite_path and os.path.exists(sqlite_path) else None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def search(self, queries: List[str], n_results: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Keyword search for each query; returns hits shaped like vector search hits
+        (id, document, distance=None, metadata, keyword_score)
+        """
+        results = []
+        for query in queries:
+            try:
+                results.append(self._search_one(query, n_results))
+            except Exception as e:
+                logging.error(f"❌ Error in keyword search: {str(e)}")
+                results.append([])
+        return results
+
+    def _search_one(self, query: str, n_results: int) -> List[Dict[str, Any]]:
+        terms = keyword_terms(query)
+        if not terms:
+            return []
+
+        if self.sqlite_path:
+            scored = self._search_fts(query, terms, n_results)
+        else:
+            scored = self._search_where_document(terms, n_results)
+        if not scored:
+            return []
+
+        ids = [chunk_id for chunk_id, _ in scored]
+        stored = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: (document, metadata)
+            for chunk_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        return [
+            {
+                "id": chunk_id,
+                "document": by_id[chunk_id][0],
+                "distance": None,
+                "metadata": by_id[chunk_id][1] or {},
+                "keyword_score": score,
+            }
+            for chunk_id, score in scored if chunk_id in by_id
+        ]
+
+    def _search_fts(self, query: str, terms: List[str], n_results: int) -> List[tuple]:
+        # Exact phrase (for codes like "FF status") OR any of the individual terms
+        phrase = " ".join(re.findall(r"\w+", query))
+        expressions = [f'"{phrase}"'] if len(phrase) >= 3 else []
+        expressions += [f'"{term}"' for term in terms]
+        match = " OR ".join(dict.fromkeys(expressions))
+
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(f"file:{self.sqlite_path}?mode=ro", uri=True, check_same_thread=False)
+            rows = self._conn.execute(
+                "SELECT e.embedding_id, bm25(embedding_fulltext_search) AS rank "
+                "FROM embedding_fulltext_search "
+                "JOIN embeddings e ON e.id = embedding_fulltext_search.rowid "
+                "JOIN segments s ON s.id = e.segment_id "
+                "WHERE embedding_fulltext_search MATCH ? AND s.collection = ? AND s.scope = 'METADATA' "
+                "ORDER BY rank LIMIT ?",
+                (match, str(self.collection.id), n_results),
+            ).fetchall()
+        # FTS5 bm25() is lower-is-better; flip it so higher is better
+        return [(chunk_id, -rank) for chunk_id, rank in rows]
+
+    def _search_where_document(self, terms: List[str], n_results: int) -> List[tuple]:
+        clauses = [{"$contains": term} for term in terms]
+        where_document = clauses[0] if len(clauses) == 1 else {"$or": clauses}
+        stored = self.collection.get(where_document=where_document, include=["documents"], limit=n_results * 20)
+
+        scored = []
+        for chunk_id, document in zip(stored["ids"], stored["documents"]):
+            text = (document or "").lower()
+            scored.append((chunk_id, float(sum(text.count(term.lower()) for term in terms))))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:n_results]
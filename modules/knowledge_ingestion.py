@@ -0,0 +1,278 @@
+# knowledge_ingestion.py
+import argparse
+import hashlib
+import logging
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from modules.embedding_backends import record_collection_embedding_model
+from modules.knowledge_module import KnowledgeModule
+
+DEFAULT_SOURCE_DIRECTORY = "./chroma-db/data files"
+
+
+def iter_pdf_pages(path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Stream (page_number, text) pairs from a PDF one page at a time
+    """
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+
+    with pymupdf.open(path) as document:
+        for page_number, page in enumerate(document, start=1):
+            yield page_number, page.get_text()
+
+
+def iter_chunks(pages: Iterable[Tuple[int, str]], chunk_size: int = 1000, chunk_overlap: int = 150) -> Iterator[Tuple[int, str]]:
+    """
+    Split streamed page text into overlapping chunks of about chunk_size characters.
+    Chunks may span pages; each is tagged with the page it ends on.
+    Only one chunk's worth of text is buffered at a time.
+    """
+    # Cuts land in the second half of the window, so a larger overlap could stop the buffer advancing
+    if chunk_overlap < 0 or chunk_overlap >= max(chunk_size // 2, 1):
+        raise ValueError(f"chunk_overlap must be less than half of chunk_size ({chunk_size}), got {chunk_overlap}")
+    return _split_chunks(pages, chunk_size, chunk_overlap)
+
+
+def _split_chunks(pages: Iterable[Tuple[int, str]], chunk_size: int, chunk_overlap: int) -> Iterator[Tuple[int, str]]:
+    buffer = ""
+    page_number = 0
+    for page_number, text in pages:
+        buffer = f"{buffer} {text}" if buffer else text
+        while len(buffer) >= chunk_size:
+            # Prefer to cut on whitespace in the second half of the window
+            cut = buffer.rfind(" ", chunk_size // 2, chunk_size)
+            if cut <= 0:
+                cut = chunk_size
+            chunk = buffer[:cut].strip()
+            if chunk:
+                yield page_number, chunk
+            start = max(cut - chunk_overlap, 1)
+            next_space = buffer.find(" ", start, cut)
+            buffer = buffer[next_space + 1 if next_space != -1 else start:]
+    if buffer.strip():
+        yield page_number, buffer.strip()
+
+
+def iter_parent_child_chunks(
+    pages: Iterable[Tuple[int, str]],
+    parent_chunk_size: int = 4000,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 150,
+) -> Iterator[Tuple[int, str, int, int]]:
+    """
+    Split streamed page text into parent sections of about parent_chunk_size characters
+    and each section into overlapping child chunks.
+    Yields (page_number, child_text, parent_index, offset of the child in its parent);
+    the offsets let the parent be rebuilt from its children at query time.
+    """
+    for parent_index, (page_number, parent) in enumerate(iter_chunks(pages, parent_chunk_size, 0)):
+        search_from = 0
+        for _, child in iter_chunks([(page_number, parent)], chunk_size, chunk_overlap):
+            offset = parent.find(child, search_from)
+            if offset < 0:
+                offset = search_from
+            search_from = offset + 1
+            yield page_number, child, parent_index, offset
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class KnowledgeIngestion:
+    """
+    Incremental PDF ingestion into the knowledge module's rag_collection.
+    Pages are streamed, chunked and processed in fixed-size batches; chunks whose
+    content hash is unchanged are skipped, so only new or edited text is embedded.
+    With parent_chunk_size set, small child chunks are embedded and their parent
+    section is recorded in metadata (parent_id, parent_offset) so retrieval can
+    return the surrounding section.
+    """
+
+    def __init__(
+        self,
+        knowledge_module: Optional[KnowledgeModule] = None,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 150,
+        batch_size: int = 256,
+        parent_chunk_size: int = 0,
+    ):
+        self.knowledge_module = knowledge_module or KnowledgeModule()
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.parent_chunk_size = parent_chunk_size
+
+    @property
+    def collection(self):
+        return self.knowledge_module.collection
+
+    def ingest_directory(self, directory: str = DEFAULT_SOURCE_DIRECTORY, purge_unmanaged: bool = False, prune_missing: bool = False) -> Dict[str, Any]:
+        """
+        Ingest every PDF in directory and return aggregate statistics.
+        With prune_missing, chunks of documents not in directory are deleted, so only use
+        it when directory holds the whole library (not for a subfolder or a new batch).
+        """
+        self.knowledge_module.initialize_vector_store()
+        totals = {"files": 0, "chunks": 0, "unchanged": 0, "embedded": 0, "deleted": 0}
+        try:
+            seen_sources: Set[str] = set()
+            for name in sorted(os.listdir(directory)):
+                if not name.lower().endswith(".pdf"):
+                    continue
+                stats = self.ingest_pdf(os.path.join(directory, name))
+                seen_sources.add(stats["source"])
+                totals["files"] += 1
+                for key in ("chunks", "unchanged", "embedded", "deleted"):
+                    totals[key] += stats[key]
+
+            if prune_missing:
+                removed = self.delete_missing_sources(seen_sources)
+                totals["deleted"] += removed
+                if removed:
+                    self.knowledge_module.bump_collection_version()
+
+            if purge_unmanaged:
+                purged = self.purge_unmanaged()
+                totals["deleted"] += purged
+                if purged:
+                    self.knowledge_module.bump_collection_version()
+
+            return {"status": "success", "directory": directory, **totals}
+        except Exception as e:
+            logging.error(f"❌ Error ingesting knowledge documents: {str(e)}")
+            return {"status": "error", "error": str(e), "directory": directory, **totals}
+
+    def ingest_pdf(self, path: str) -> Dict[str, Any]:
+        """
+        Ingest a single PDF; returns counts of chunks seen, unchanged, embedded and deleted
+        """
+        self.knowledge_module.initialize_vector_store()
+        if self.knowledge_module.embedding_model_key:
+            record_collection_embedding_model(self.collection, self.knowledge_module.embedding_model_key)
+        source = os.path.basename(path)
+        stats = {"source": source, "chunks": 0, "unchanged": 0, "embedded": 0, "deleted": 0}
+        seen_ids: Set[str] = set()
+
+        batch: List[Dict[str, Any]] = []
+        for chunk_index, (page_number, text, parent_index, parent_offset) in enumerate(self._iter_chunks(path)):
+            chunk_id = f"{source}::{chunk_index}"
+            seen_ids.add(chunk_id)
+            metadata = {
+                "source": source,
+                "page": page_number,
+                "chunk_index": chunk_index,
+                "content_hash": content_hash(text),
+            }
+            if parent_index is not None:
+                metadata["parent_id"] = f"{source}::parent::{parent_index}"
+                metadata["parent_offset"] = parent_offset
+                # A moved parent boundary must rewrite the mapping even if the text is unchanged
+                metadata["content_hash"] = content_hash(f"{metadata['parent_id']}:{parent_offset}:{text}")
+            batch.append({"id": chunk_id, "document": text, "metadata": metadata})
+            if len(batch) >= self.batch_size:
+                self._flush(batch, stats)
+                batch = []
+        if batch:
+            self._flush(batch, stats)
+
+        stats["deleted"] = self._delete_stale(source, seen_ids)
+        if stats["embedded"] or stats["deleted"]:
+            # Invalidate cached knowledge results built from the old content
+            self.knowledge_module.bump_collection_version()
+        logging.info(
+            f"✅ Ingested {source}: {stats['chunks']} chunks, {stats['embedded']} embedded, "
+            f"{stats['unchanged']} unchanged, {stats['deleted']} deleted"
+        )
+        return stats
+
+    def _iter_chunks(self, path: str) -> Iterator[Tuple[int, str, Optional[int], Optional[int]]]:
+        pages = iter_pdf_pages(path)
+        if self.parent_chunk_size > 0:
+            return iter_parent_child_chunks(pages, self.parent_chunk_size, self.chunk_size, self.chunk_overlap)
+        return ((page_number, text, None, None) for page_number, text in iter_chunks(pages, self.chunk_size, self.chunk_overlap))
+
+    def _flush(self, batch: List[Dict[str, Any]], stats: Dict[str, Any]) -> None:
+        stats["chunks"] += len(batch)
+
+        # Skip chunks whose stored content hash is unchanged
+        existing = self.collection.get(ids=[chunk["id"] for chunk in batch], include=["metadatas"])
+        stored_hashes = {
+            chunk_id: (metadata or {}).get("content_hash")
+            for chunk_id, metadata in zip(existing["ids"], existing["metadatas"])
+        }
+        changed = [chunk for chunk in batch if stored_hashes.get(chunk["id"]) != chunk["metadata"]["content_hash"]]
+        stats["unchanged"] += len(batch) - len(changed)
+        if not changed:
+            return
+
+        # One embedding request and one bulk upsert per batch
+        embeddings = self.knowledge_module.embeddings.embed_documents([chunk["document"] for chunk in changed])
+        self.collection.upsert(
+            ids=[chunk["id"] for chunk in changed],
+            documents=[chunk["document"] for chunk in changed],
+            metadatas=[chunk["metadata"] for chunk in changed],
+            embeddings=embeddings,
+        )
+        stats["embedded"] += len(changed)
+
+    def _delete_stale(self, source: str, seen_ids: Set[str]) -> int:
+        # Remove chunks left over from a longer previous version of the document
+        stored = self.collection.get(where={"source": source}, include=[])
+        stale_ids = [chunk_id for chunk_id in stored["ids"] if chunk_id not in seen_ids]
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+        return len(stale_ids)
+
+    def delete_missing_sources(self, seen_sources: Set[str]) -> int:
+        """
+        Delete chunks of documents that were removed or renamed since the last run
+        (managed chunks whose source was not seen during this pass)
+        """
+        stored = self.collection.get(include=["metadatas"])
+        missing_ids = [
+            chunk_id for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+            if (metadata or {}).get("content_hash") and (metadata or {}).get("source") not in seen_sources
+        ]
+        if missing_ids:
+            self.collection.delete(ids=missing_ids)
+            logging.info(f"✅ Deleted {len(missing_ids)} chunks of documents no longer in the source directory")
+        return len(missing_ids)
+
+    def purge_unmanaged(self) -> int:
+        """
+        Delete chunks that were not written by this pipeline (no content hash metadata)
+        """
+        stored = self.collection.get(include=["metadatas"])
+        unmanaged_ids = [
+            chunk_id for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+            if not (metadata or {}).get("content_hash")
+        ]
+        if unmanaged_ids:
+            self.collection.delete(ids=unmanaged_ids)
+        return len(unmanaged_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally ingest PDFs into the knowledge rag_collection")
+    parser.add_argument("directory", nargs="?", default=DEFAULT_SOURCE_DIRECTORY, help="Directory containing PDF files")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Approximate chunk size in characters")
+    parser.add_argument("--chunk-overlap", type=int, default=150, help="Characters of overlap between chunks")
+    parser.add_argument("--parent-chunk-size", type=int, default=0, help="Parent section size in characters; 0 disables parent-child chunking")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks embedded and upserted per batch")
+    parser.add_argument("--purge-unmanaged", action="store_true", help="Delete chunks not created by this pipeline")
+    parser.add_argument("--prune-missing", action="store_true", help="Delete chunks of documents that are not in the directory (it must hold the whole library)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ingestion = KnowledgeIngestion(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size,
+        parent_chunk_size=args.parent_chunk_size,
+    )
+    print(ingestion.ingest_directory(args.directory, purge_unmanaged=args.purge_unmanaged, prune_missing=args.prune_missing))
@@ -1,50 +1,287 @@
 # knowledge_module.py
 import os
+import asyncio
+import hashlib
 import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-import chromadb
-from langchain_openai import AzureOpenAIEmbeddings
-from sentence_transformers import CrossEncoder
 from dotenv import load_dotenv
+from modules.embedding_cache import EmbeddingCache
+from modules.embedding_coalescer import EmbeddingCoalescer
+from modules.embedding_backends import create_embedding_backend, check_collection_compatibility
+from modules.reranker_backends import create_reranker
+from modules.reranker_service import RERANKER_SOCKET, RerankerClient
+from modules.context_packer import estimate_tokens, pack_context, stitch_sections
+from modules.keyword_search import ChromaKeywordSearch, is_lexical_query, reciprocal_rank_fusion
+from modules.result_cache import CollectionVersion, ResultCache, ScoreCache
+from modules.semantic_cache import SemanticCache
+from modules.vector_snapshot import VectorSnapshot
 
 load_dotenv()
 
+CHROMA_PATH = "./chroma-db"
+
+# Retrieval mode: "vector" (default) or "hybrid" (vector + BM25 keyword search merged with RRF).
+# In hybrid mode, clearly lexical queries (codes, acronyms, quoted text) that keyword search
+# answers are served without an embedding call unless the fast path is disabled.
+RETRIEVAL_MODE = os.getenv("KNOWLEDGE_RETRIEVAL_MODE", "vector").lower()
+KEYWORD_FAST_PATH = os.getenv("KNOWLEDGE_KEYWORD_FAST_PATH", "true").lower() == "true"
+
+# Query embedding cache settings (an empty path keeps the cache in memory only)
+EMBEDDING_CACHE_PATH = os.getenv("KNOWLEDGE_EMBEDDING_CACHE_PATH", "./.cache/embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("KNOWLEDGE_EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("KNOWLEDGE_EMBEDDING_CACHE_TTL_SECONDS", "0")) or None
+
+# Number of (query, document) pairs scored per cross-encoder forward pass
+RERANK_BATCH_SIZE = int(os.getenv("KNOWLEDGE_RERANK_BATCH_SIZE", "32"))
+# Cross-encoder scores cached per (query, chunk id) pair (0 disables); cleared on collection version change
+RERANK_SCORE_CACHE_MAX_ENTRIES = int(os.getenv("KNOWLEDGE_RERANK_SCORE_CACHE_MAX_ENTRIES", "20000"))
+# Adaptive reranking: skip the cross-encoder when vector search already decides the top results
+# (no more candidates than are kept, or the best hit leads by at least the distance margin) and
+# only rerank candidates within the margin of the best distance (margin 0 disables distance rules)
+ADAPTIVE_RERANK = os.getenv("KNOWLEDGE_ADAPTIVE_RERANK", "true").lower() == "true"
+RERANK_DISTANCE_MARGIN = float(os.getenv("KNOWLEDGE_RERANK_DISTANCE_MARGIN", "0.1"))
+
+# Token budget for combined_context and optional MMR diversity weight (0..1, unset disables MMR)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("KNOWLEDGE_CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("KNOWLEDGE_CONTEXT_MMR_LAMBDA")) if os.getenv("KNOWLEDGE_CONTEXT_MMR_LAMBDA") else None
+# Chunks ingested with parent-child chunking (parent_id metadata) are searched and reranked
+# as small children, but the context returns their deduplicated parent sections
+PARENT_CONTEXT = os.getenv("KNOWLEDGE_PARENT_CONTEXT", "true").lower() == "true"
+
+# Bounded worker pools used by the async pipeline for ChromaDB and reranker work
+SEARCH_WORKERS = int(os.getenv("KNOWLEDGE_SEARCH_WORKERS", "4"))
+RERANK_WORKERS = int(os.getenv("KNOWLEDGE_RERANK_WORKERS", "2"))
+# Maximum texts per async embedding request; larger miss lists are sent concurrently
+ASYNC_EMBEDDING_BATCH_SIZE = int(os.getenv("KNOWLEDGE_ASYNC_EMBEDDING_BATCH_SIZE", "16"))
+
+# Embedding requests from concurrent sessions are coalesced: while other embedding calls are
+# queued or in flight, the first uncached request waits this long for others and they are
+# embedded in one call; a lone request is sent at once (0 disables coalescing).
+# Batches hold at most EMBEDDING_MAX_BATCH_SIZE texts and at most EMBEDDING_MAX_CONCURRENCY
+# calls are in flight, which keeps the provider under its rate limits.
+EMBEDDING_COALESCE_MS = float(os.getenv("KNOWLEDGE_EMBEDDING_COALESCE_MS", "5"))
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("KNOWLEDGE_EMBEDDING_MAX_BATCH_SIZE", "64"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("KNOWLEDGE_EMBEDDING_MAX_CONCURRENCY", "4"))
+
+# Tool result cache size (0 disables) and optional TTL; entries are tied to the collection version
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("KNOWLEDGE_RESULT_CACHE_MAX_ENTRIES", "512"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("KNOWLEDGE_RESULT_CACHE_TTL_SECONDS", "0")) or None
+
+# Semantic cache for paraphrased questions (0 disables): context and final answers are
+# reused when the query embedding's cosine similarity reaches the threshold
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("KNOWLEDGE_SEMANTIC_CACHE_MAX_ENTRIES", "256"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("KNOWLEDGE_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("KNOWLEDGE_SEMANTIC_CACHE_TTL_SECONDS", "0")) or None
+
+# Shape of knowledge tool responses sent to the LLM: "compact" (packed context plus chunk
+# references; full text via get_knowledge_documents) or "full" (every retrieved document)
+RESPONSE_MODE = os.getenv("KNOWLEDGE_RESPONSE_MODE", "compact").lower()
+
+# Collections with at most this many chunks are searched with a brute-force NumPy scan over
+# a memory-mapped snapshot instead of collection.query (0 disables). float16 halves its size
+# but converts each block to float32 per search, so it is slower than float32.
+# The snapshot is re-exported when the collection version or chunk count changes.
+VECTOR_SNAPSHOT_MAX_CHUNKS = int(os.getenv("KNOWLEDGE_VECTOR_SNAPSHOT_MAX_CHUNKS", "50000"))
+VECTOR_SNAPSHOT_PATH = os.getenv("KNOWLEDGE_VECTOR_SNAPSHOT_PATH", "./.cache/vector_snapshot")
+VECTOR_SNAPSHOT_DTYPE = os.getenv("KNOWLEDGE_VECTOR_SNAPSHOT_DTYPE", "float32").lower()
+
+# Start loading ChromaDB, embeddings and the reranker in a background thread at construction
+WARMUP_ON_START = os.getenv("KNOWLEDGE_WARMUP_ON_START", "false").lower() == "true"
+
 class KnowledgeModule:
-    def __init__(self):
+    def __init__(self, warm_up: bool = WARMUP_ON_START):
         self.chroma_client = None
         self.collection = None
         self.embeddings = None
+        self.embedding_model_key = None
         self.encoder_model = None
-        self._initialize_components()
+        self.embedding_cache = None
+        self.keyword_search = None
+        self.retrieval_mode = RETRIEVAL_MODE
+        self.keyword_fast_path = KEYWORD_FAST_PATH
+        self.rerank_batch_size = RERANK_BATCH_SIZE
+        self.adaptive_rerank = ADAPTIVE_RERANK
+        self.rerank_distance_margin = RERANK_DISTANCE_MARGIN
+        self.rerank_stats = {"full": 0, "shortened": 0, "skipped_few_candidates": 0, "skipped_decisive": 0, "pairs_skipped": 0}
+        self._rerank_stats_lock = threading.Lock()
+        self.context_token_budget = CONTEXT_TOKEN_BUDGET
+        self.context_mmr_lambda = CONTEXT_MMR_LAMBDA
+        self.parent_context = PARENT_CONTEXT
+        self.response_mode = RESPONSE_MODE
+        # Per-stage latencies in ms (decompose, embed, keyword, search, rerank); None disables timing
+        self.stage_timings = None
+        self.search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="knowledge-search")
+        self.rerank_executor = ThreadPoolExecutor(max_workers=RERANK_WORKERS, thread_name_prefix="knowledge-rerank")
+        
+        # Result cache keyed by query, parameters and collection version (bumped by ingestion)
+        self.collection_version = CollectionVersion(os.path.join(CHROMA_PATH, "rag_collection.version"))
+        self.result_cache = None
+        if RESULT_CACHE_MAX_ENTRIES > 0:
+            self.result_cache = ResultCache(self.collection_version, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS)
+        self.score_cache = None
+        if RERANK_SCORE_CACHE_MAX_ENTRIES > 0:
+            self.score_cache = ScoreCache(self.collection_version, RERANK_SCORE_CACHE_MAX_ENTRIES)
+        self.semantic_cache = None
+        if SEMANTIC_CACHE_MAX_ENTRIES > 0:
+            self.semantic_cache = SemanticCache(
+                self.collection_version, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_TTL_SECONDS
+            )
+        self.embedding_coalescer = None
+        if EMBEDDING_COALESCE_MS > 0:
+            # Looks up self.embeddings per batch, so swapping the backend needs no rebuild
+            self.embedding_coalescer = EmbeddingCoalescer(
+                lambda texts: self.embeddings.embed_documents(texts),
+                EMBEDDING_COALESCE_MS, EMBEDDING_MAX_BATCH_SIZE, EMBEDDING_MAX_CONCURRENCY
+            )
+        self.vector_snapshot = None
+        if VECTOR_SNAPSHOT_MAX_CHUNKS > 0 and VECTOR_SNAPSHOT_PATH:
+            self.vector_snapshot = VectorSnapshot(
+                VECTOR_SNAPSHOT_PATH, self.collection_version, VECTOR_SNAPSHOT_MAX_CHUNKS, VECTOR_SNAPSHOT_DTYPE
+            )
+        
+        # Components are loaded lazily on first use (or by warm_up), so building
+        # the agents does not pay for the chromadb / sentence-transformers / torch imports
+        self.ready = threading.Event()
+        self.init_error = None
+        self._init_lock = threading.Lock()
+        if warm_up:
+            self.warm_up()
+    
+    def enable_stage_timings(self) -> Dict[str, List[float]]:
+        """
+        Start recording per-stage latencies (used by the benchmarks); returns the live dict
+        """
+        self.stage_timings = defaultdict(list)
+        return self.stage_timings
+    
+    @contextmanager
+    def _stage(self, name: str):
+        if self.stage_timings is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_timings[name].append((time.perf_counter() - started) * 1000)
+    
+    def is_ready(self) -> bool:
+        """
+        True once ChromaDB, embeddings and the reranker are loaded
+        """
+        return self.ready.is_set()
+    
+    def warm_up(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Load the knowledge components ahead of the first request.
+        With background=True this runs in a daemon thread and returns it.
+        """
+        if not background:
+            self._ensure_initialized()
+            return None
+        
+        def _warm_up():
+            try:
+                self._ensure_initialized()
+            except Exception:
+                # Already logged; the next request retries initialization
+                pass
+        
+        thread = threading.Thread(target=_warm_up, name="knowledge-warm-up", daemon=True)
+        thread.start()
+        return thread
+    
+    def _ensure_initialized(self):
+        if self.ready.is_set():
+            return
+        with self._init_lock:
+            if self.ready.is_set():
+                return
+            try:
+                self._initialize_components()
+                self.init_error = None
+            except Exception as e:
+                self.init_error = str(e)
+                raise
+            self.ready.set()
+    
+    async def _ensure_initialized_async(self):
+        if not self.ready.is_set():
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.search_executor, self._ensure_initialized)
     
     def _initialize_components(self):
         """Initialize ChromaDB client, embeddings, and reranker"""
         try:
-            # Initialize ChromaDB client
-            self.chroma_client = chromadb.PersistentClient(path="./chroma-db")
-            self.collection = self.chroma_client.get_or_create_collection(name="rag_collection")
-            
-            # Initialize Azure OpenAI embeddings
-            self.embeddings = AzureOpenAIEmbeddings(
-                azure_deployment=os.getenv("AZURE_OPENAI_EMBEDDING_MODEL"),
-                openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-                openai_api_version=os.getenv("AZURE_OPENAI_EMBEDDING_VERSION"),
-            )
+            self.initialize_vector_store()
             
-            # Initialize cross-encoder for reranking using local model
-            local_model_path = "./Modal/ms-marco-MiniLM-L-6-v2"
-            if os.path.exists(local_model_path):
-                self.encoder_model = CrossEncoder(local_model_path, trust_remote_code=True, revision="main")
-            else:
-                # Fallback to online model if local doesn't exist
-                self.encoder_model = CrossEncoder("ms-marco-MiniLM-L-6-v2", trust_remote_code=True, revision="main")
+            # Initialize cross-encoder for reranking: the shared reranker service when one is
+            # configured, else an in-process model (torch or ONNX Runtime, optionally int8)
+            # with its CPU threads split between the rerank workers
+            self.encoder_model = self._connect_reranker_service(RERANKER_SOCKET) or create_reranker(workers=RERANK_WORKERS)
             
             logging.info("✅ Knowledge module initialized successfully")
         except Exception as e:
             logging.error(f"❌ Error initializing knowledge module: {str(e)}")
             raise
     
+    def _connect_reranker_service(self, socket_path: str, authkey: Optional[bytes] = None) -> Optional[RerankerClient]:
+        """
+        Client for the shared reranker service, or None when no service is configured
+        or it is unreachable (the module then loads its own model).
+        A configured socket without KNOWLEDGE_RERANKER_SOCKET_AUTHKEY is an error.
+        """
+        if not socket_path:
+            return None
+        client = RerankerClient(socket_path, authkey)
+        if not client.ping():
+            logging.warning(f"⚠️ Reranker service at {socket_path} is unreachable; loading an in-process reranker")
+            return None
+        logging.info(f"✅ Using shared reranker service at {socket_path}")
+        return client
+    
+    def initialize_vector_store(self):
+        """
+        Initialize ChromaDB client, embeddings and the query embedding cache only.
+        Used on its own by ingestion, which does not need the reranker.
+        """
+        if self.collection is not None and self.embeddings is not None:
+            return
+        
+        import chromadb
+        
+        # Initialize ChromaDB client
+        chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+        collection = chroma_client.get_or_create_collection(name="rag_collection")
+        
+        # Initialize the configured embedding backend (Azure OpenAI or local CPU model)
+        embeddings, model_key, dimensions = create_embedding_backend()
+        mismatch = check_collection_compatibility(collection, model_key, dimensions)
+        if mismatch:
+            raise ValueError(f"Embedding backend is incompatible with the vector store: {mismatch}")
+        
+        self.chroma_client = chroma_client
+        self.collection = collection
+        self.embeddings = embeddings
+        self.embedding_model_key = model_key
+        
+        # Keyword search over Chroma's own full-text index
+        self.keyword_search = ChromaKeywordSearch(self.collection, sqlite_path=os.path.join(CHROMA_PATH, "chroma.sqlite3"))
+        
+        # Initialize query embedding cache, keyed by embedding model and version
+        self.embedding_cache = EmbeddingCache(
+            model_key=self.embedding_model_key,
+            path=EMBEDDING_CACHE_PATH or None,
+            max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+            ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS,
+        )
+    
     def decompose_query(self, user_query: str) -> List[str]:
         """
         Decompose a complex user query into multiple simpler queries
@@ -77,56 +314,547 @@ class KnowledgeModule:
         # Limit to reasonable number of queries
         return queries[:5]
     
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed queries, serving repeats from the embedding cache and sending
+        only the uncached ones to the embedding model in a single batch
+        """
+        self._ensure_initialized()
+        with self._stage("embed"):
+            if self.embedding_cache is None:
+                return self._embed_texts(queries)
+            
+            vectors = self.embedding_cache.get_many(queries)
+            missing_texts = self._missing_texts(queries, vectors)
+            if missing_texts:
+                new_vectors = self._embed_texts(missing_texts)
+                self.embedding_cache.put_many(missing_texts, new_vectors)
+                self._fill_missing(queries, vectors, missing_texts, new_vectors)
+            return vectors
+    
+    async def embed_queries_async(self, queries: List[str]) -> List[List[float]]:
+        """
+        Async variant of embed_queries. Uncached texts go through the embedding
+        coalescer, or without it to the async client with large miss lists split
+        and requested concurrently.
+        """
+        await self._ensure_initialized_async()
+        loop = asyncio.get_running_loop()
+        with self._stage("embed"):
+            if self.embedding_cache is None:
+                vectors = [None] * len(queries)
+            else:
+                vectors = await loop.run_in_executor(self.search_executor, self.embedding_cache.get_many, queries)
+            
+            missing_texts = self._missing_texts(queries, vectors)
+            if missing_texts:
+                new_vectors = await self._aembed_texts(missing_texts)
+                if self.embedding_cache is not None:
+                    await loop.run_in_executor(self.search_executor, self.embedding_cache.put_many, missing_texts, new_vectors)
+                self._fill_missing(queries, vectors, missing_texts, new_vectors)
+            return vectors
+    
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        if self.embedding_coalescer is not None:
+            return self.embedding_coalescer.embed(texts)
+        return self.embeddings.embed_documents(texts)
+    
+    async def _aembed_texts(self, texts: List[str]) -> List[List[float]]:
+        if self.embedding_coalescer is not None:
+            # Joins requests from other sessions into shared batches
+            return await self.embedding_coalescer.aembed(texts)
+        batches = [
+            texts[i:i + ASYNC_EMBEDDING_BATCH_SIZE]
+            for i in range(0, len(texts), ASYNC_EMBEDDING_BATCH_SIZE)
+        ]
+        batch_vectors = await asyncio.gather(*(self._aembed_documents(batch) for batch in batches))
+        return [vector for batch in batch_vectors for vector in batch]
+    
+    async def _aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if hasattr(self.embeddings, "aembed_documents"):
+            return await self.embeddings.aembed_documents(texts)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.search_executor, self.embeddings.embed_documents, texts)
+    
+    @staticmethod
+    def _missing_texts(queries: List[str], vectors: List[Optional[List[float]]]) -> List[str]:
+        # Each distinct missing text is embedded once
+        return list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+    
+    @staticmethod
+    def _fill_missing(queries: List[str], vectors: List[Optional[List[float]]], missing_texts: List[str], new_vectors: List[List[float]]) -> None:
+        by_text = dict(zip(missing_texts, new_vectors))
+        for i, query in enumerate(queries):
+            if vectors[i] is None:
+                vectors[i] = by_text[query]
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss statistics for the knowledge caches
+        """
+        return {
+            "embedding_cache": self.embedding_cache.get_stats() if self.embedding_cache else None,
+            "embedding_coalescer": self.embedding_coalescer.get_stats() if self.embedding_coalescer else None,
+            "result_cache": self.result_cache.get_stats() if self.result_cache else None,
+            "score_cache": self.score_cache.get_stats() if self.score_cache else None,
+            "semantic_cache": self.semantic_cache.get_stats() if self.semantic_cache else None,
+            "vector_snapshot": self.vector_snapshot.get_stats() if self.vector_snapshot else None
+        }
+    
+    def get_rerank_stats(self) -> Dict[str, Any]:
+        """
+        Return how often the adaptive policy reranked, shortened or skipped a candidate list
+        """
+        with self._rerank_stats_lock:
+            stats = dict(self.rerank_stats)
+        decisions = stats["full"] + stats["shortened"] + stats["skipped_few_candidates"] + stats["skipped_decisive"]
+        skipped = stats["skipped_few_candidates"] + stats["skipped_decisive"]
+        stats["skip_rate"] = round(skipped / decisions, 4) if decisions else 0.0
+        return stats
+    
+    def bump_collection_version(self) -> int:
+        """
+        Mark the collection as changed so cached results are no longer served
+        """
+        return self.collection_version.bump()
+    
+    def _cached_result(self, method: str, query: str, n_results: Optional[int] = None, previous_queries: Optional[List[str]] = None) -> tuple[Any, Optional[Dict[str, Any]]]:
+        if self.result_cache is None:
+            return None, None
+        key = self.result_cache.make_key(method, query, n_results, previous_queries)
+        return key, self.result_cache.get(key)
+    
+    def _remember_result(self, key: Any, result: Dict[str, Any]) -> Dict[str, Any]:
+        if key is not None:
+            self.result_cache.put(key, result)
+        return result
+    
+    def _semantic_embedding(self, user_query: str, previous_queries: Optional[List[str]] = None, queries: Optional[List[str]] = None) -> tuple[Optional[List[float]], Dict[str, List[float]]]:
+        """
+        Embedding of user_query for the semantic cache, or None when it does not apply.
+        The sub-queries are embedded in the same call; their vectors are returned by text
+        so retrieval does not need a second round trip.
+        """
+        # Follow-up questions depend on earlier turns, and lexical lookups served by the
+        # keyword fast path should not pay for an embedding call
+        if self.semantic_cache is None or previous_queries:
+            return None, {}
+        try:
+            if self._use_hybrid() and self._fast_path_candidates([user_query]):
+                return None, {}
+            texts = self._semantic_batch(user_query, queries)
+            vectors = dict(zip(texts, self.embed_queries(texts)))
+            return vectors[user_query], vectors
+        except Exception as e:
+            logging.warning(f"⚠️ Semantic cache lookup skipped: {str(e)}")
+            return None, {}
+    
+    async def _semantic_embedding_async(self, user_query: str, previous_queries: Optional[List[str]] = None, queries: Optional[List[str]] = None) -> tuple[Optional[List[float]], Dict[str, List[float]]]:
+        if self.semantic_cache is None or previous_queries:
+            return None, {}
+        try:
+            await self._ensure_initialized_async()
+            if self._use_hybrid() and self._fast_path_candidates([user_query]):
+                return None, {}
+            texts = self._semantic_batch(user_query, queries)
+            vectors = dict(zip(texts, await self.embed_queries_async(texts)))
+            return vectors[user_query], vectors
+        except Exception as e:
+            logging.warning(f"⚠️ Semantic cache lookup skipped: {str(e)}")
+            return None, {}
+    
+    def _semantic_batch(self, user_query: str, queries: Optional[List[str]]) -> List[str]:
+        # Lexical sub-queries may be answered by keyword search alone, so they are left out
+        queries = queries or []
+        lexical = self._fast_path_candidates(queries) if self._use_hybrid() else set()
+        return list(dict.fromkeys([user_query] + [query for query in queries if query not in lexical]))
+    
+    def _semantic_context(self, user_query: str, embedding: Optional[List[float]]) -> Optional[Dict[str, Any]]:
+        if embedding is None:
+            return None
+        match = self.semantic_cache.lookup(embedding, "context")
+        if match is None:
+            return None
+        result = match["context"]
+        result["original_query"] = user_query
+        result["semantic_cache_hit"] = {"matched_query": match["query"], "similarity": match["similarity"]}
+        return result
+    
+    def _remember_semantic_context(self, user_query: str, embedding: Optional[List[float]], result: Dict[str, Any]) -> Dict[str, Any]:
+        if embedding is not None and result.get("status") == "success" and result.get("total_documents_found"):
+            self.semantic_cache.store(user_query, embedding, context=result)
+        return result
+    
+    async def lookup_semantic_answer(self, user_query: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a previously generated answer for a paraphrase of user_query
+        ({"answer", "matched_query", "similarity"}), or None
+        """
+        if not user_query or not user_query.strip():
+            return None
+        embedding, _ = await self._semantic_embedding_async(user_query)
+        if embedding is None:
+            return None
+        match = self.semantic_cache.lookup(embedding, "answer")
+        if match is None:
+            return None
+        return {"answer": match["answer"], "matched_query": match["query"], "similarity": match["similarity"]}
+    
+    async def remember_semantic_answer(self, user_query: str, answer: str) -> None:
+        """
+        Store the final answer generated for user_query so paraphrases can reuse it
+        """
+        if not user_query or not user_query.strip() or not answer:
+            return
+        embedding, _ = await self._semantic_embedding_async(user_query)
+        if embedding is not None:
+            self.semantic_cache.store(user_query, embedding, answer=answer)
+    
     def search_vector_store(self, query: str, n_results: int = 5) -> List[str]:
         """
         Search the vector store for relevant documents
         """
+        return self.search_vector_store_batch([query], n_results)[0]
+    
+    def search_vector_store_batch(self, queries: List[str], n_results: int = 5) -> List[List[str]]:
+        """
+        Search the vector store for several queries at once.
+        Uses a single embedding request and a single ChromaDB query, then
+        splits the results back out per query (same order as `queries`).
+        """
+        return [[hit["document"] for hit in hits] for hits in self.query_collection(queries, n_results)]
+    
+    def query_collection(self, queries: List[str], n_results: int = 5, query_vectors: Optional[Dict[str, List[float]]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Batched search returning hits with their ChromaDB id, document,
+        distance and metadata, one list per query.
+        Uses vector search, or vector + keyword search in hybrid mode.
+        query_vectors holds embeddings already computed for some queries, by text.
+        """
+        if not queries:
+            return []
+        
         try:
-            # Generate query embedding
-            query_embedding = self.embeddings.embed_query(query)
+            if self._use_hybrid():
+                keyword_hits = self._keyword_search(queries, n_results)
+                vector_queries = self._vector_queries(queries, keyword_hits)
+                vector_hits = self._query_by_embeddings(vector_queries, self._embed_with(vector_queries, query_vectors), n_results) if vector_queries else []
+                return self._merge_hybrid(queries, keyword_hits, vector_queries, vector_hits, n_results)
             
-            # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding], 
-                n_results=n_results
-            )
+            # Generate all query embeddings (cached or in one round trip)
+            query_embeddings = self._embed_with(queries, query_vectors)
             
-            # Extract documents
-            documents = results["documents"][0] if results["documents"] else []
-            
-            return documents
+            return self._query_by_embeddings(queries, query_embeddings, n_results)
         except Exception as e:
             logging.error(f"❌ Error searching vector store: {str(e)}")
-            return []
+            return [[] for _ in queries]
     
-    def rerank_documents(self, documents: List[str], query: str) -> tuple[str, List[int]]:
+    async def query_collection_async(self, queries: List[str], n_results: int = 5, query_vectors: Optional[Dict[str, List[float]]] = None) -> List[List[Dict[str, Any]]]:
         """
-        Rerank documents using cross-encoder
+        Async variant of query_collection; ChromaDB and keyword queries run on the bounded search pool
         """
+        if not queries:
+            return []
+        
         try:
-            if not documents:
-                return "", []
+            await self._ensure_initialized_async()
+            loop = asyncio.get_running_loop()
+            if not self._use_hybrid():
+                query_embeddings = await self._aembed_with(queries, query_vectors)
+                return await loop.run_in_executor(
+                    self.search_executor, self._query_by_embeddings, queries, query_embeddings, n_results
+                )
             
-            # Rerank using cross-encoder
-            ranks = self.encoder_model.rank(query, documents, top_k=min(3, len(documents)))
+            # Embed non-lexical queries while the keyword search runs
+            lexical = self._fast_path_candidates(queries)
+            eager_queries = [query for query in queries if query not in lexical]
+            keyword_hits, eager_embeddings = await asyncio.gather(
+                loop.run_in_executor(self.search_executor, self._keyword_search, queries, n_results),
+                self._aembed_with(eager_queries, query_vectors) if eager_queries else asyncio.sleep(0, result=[])
+            )
             
-            relevant_text = ""
-            relevant_text_ids = []
+            # Lexical queries that keyword search could not answer still need vectors
+            late_queries = [query for query in self._vector_queries(queries, keyword_hits) if query in lexical]
+            late_embeddings = await self._aembed_with(late_queries, query_vectors) if late_queries else []
             
-            for rank in ranks:
-                relevant_text += documents[rank["corpus_id"]] + "\n\n"
-                relevant_text_ids.append(rank["corpus_id"])
+            vector_queries = eager_queries + late_queries
+            vector_hits = []
+            if vector_queries:
+                vector_hits = await loop.run_in_executor(
+                    self.search_executor, self._query_by_embeddings,
+                    vector_queries, eager_embeddings + late_embeddings, n_results
+                )
+            return self._merge_hybrid(queries, keyword_hits, vector_queries, vector_hits, n_results)
+        except Exception as e:
+            logging.error(f"❌ Error searching vector store: {str(e)}")
+            return [[] for _ in queries]
+    
+    def _embed_with(self, queries: List[str], query_vectors: Optional[Dict[str, List[float]]]) -> List[List[float]]:
+        # Vectors computed earlier in the same request are reused; only the rest are embedded
+        missing = [query for query in dict.fromkeys(queries) if query not in (query_vectors or {})]
+        vectors = dict(query_vectors or {})
+        if missing:
+            vectors.update(zip(missing, self.embed_queries(missing)))
+        return [vectors[query] for query in queries]
+    
+    async def _aembed_with(self, queries: List[str], query_vectors: Optional[Dict[str, List[float]]]) -> List[List[float]]:
+        missing = [query for query in dict.fromkeys(queries) if query not in (query_vectors or {})]
+        vectors = dict(query_vectors or {})
+        if missing:
+            vectors.update(zip(missing, await self.embed_queries_async(missing)))
+        return [vectors[query] for query in queries]
+    
+    def _keyword_search(self, queries: List[str], n_results: int) -> List[List[Dict[str, Any]]]:
+        with self._stage("keyword"):
+            return self.keyword_search.search(queries, n_results)
+    
+    def _use_hybrid(self) -> bool:
+        self._ensure_initialized()
+        return self.retrieval_mode == "hybrid" and self.keyword_search is not None
+    
+    def _fast_path_candidates(self, queries: List[str]) -> set:
+        if not self.keyword_fast_path:
+            return set()
+        return {query for query in queries if is_lexical_query(query)}
+    
+    def _vector_queries(self, queries: List[str], keyword_hits: List[List[Dict[str, Any]]]) -> List[str]:
+        # Lexical queries answered by keyword search skip the embedding call entirely
+        lexical = self._fast_path_candidates(queries)
+        return [query for query, hits in zip(queries, keyword_hits) if not (query in lexical and hits)]
+    
+    @staticmethod
+    def _merge_hybrid(queries: List[str], keyword_hits: List[List[Dict[str, Any]]], vector_queries: List[str], vector_hits: List[List[Dict[str, Any]]], n_results: int) -> List[List[Dict[str, Any]]]:
+        vector_by_query = dict(zip(vector_queries, vector_hits))
+        return [
+            reciprocal_rank_fusion([vector_by_query.get(query, []), hits], n_results)
+            for query, hits in zip(queries, keyword_hits)
+        ]
+    
+    def _query_by_embeddings(self, queries: List[str], query_embeddings: List[List[float]], n_results: int) -> List[List[Dict[str, Any]]]:
+        with self._stage("search"):
+            # Small collections: exact flat scan over the NumPy snapshot
+            hits = self._snapshot_search(query_embeddings, n_results)
+            if hits is not None:
+                return hits
             
-            return relevant_text, relevant_text_ids
+            # Search in ChromaDB for all queries at once
+            results = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "distances", "metadatas"]
+            )
+        
+        # Split results back out per query
+        hits = []
+        for i in range(len(queries)):
+            ids = results["ids"][i] if i < len(results["ids"]) else []
+            documents = results["documents"][i] if results.get("documents") else [None] * len(ids)
+            distances = results["distances"][i] if results.get("distances") else [None] * len(ids)
+            metadatas = results["metadatas"][i] if results.get("metadatas") else [None] * len(ids)
+            hits.append([
+                {"id": chunk_id, "document": document, "distance": distance, "metadata": metadata or {}}
+                for chunk_id, document, distance, metadata in zip(ids, documents, distances, metadatas)
+            ])
+        return hits
+    
+    def _snapshot_search(self, query_embeddings: List[List[float]], n_results: int) -> Optional[List[List[Dict[str, Any]]]]:
+        """
+        Hits from the flat vector snapshot, or None to fall back to collection.query
+        """
+        if self.vector_snapshot is None:
+            return None
+        try:
+            return self.vector_snapshot.search(self.collection, query_embeddings, n_results)
+        except Exception as e:
+            logging.warning(f"⚠️ Vector snapshot search failed, using ChromaDB: {str(e)}")
+            return None
+    
+    def rerank_documents(self, documents: List[str], query: str, chunk_ids: Optional[List[str]] = None) -> tuple[str, List[int]]:
+        """
+        Rerank documents using cross-encoder
+        """
+        return self.rerank_documents_batch([(query, documents)], chunk_ids=[chunk_ids] if chunk_ids else None)[0]
+    
+    def rerank_documents_batch(self, query_documents: List[tuple[str, List[str]]], top_k: int = 3, chunk_ids: Optional[List[List[str]]] = None) -> List[tuple[str, List[int]]]:
+        """
+        Rerank documents for several queries with one batched cross-encoder pass.
+        All (query, document) pairs are scored together and the scores are sliced
+        back per query; returns (relevant_text, relevant_ids) per input entry.
+        """
+        try:
+            all_scores = self.score_documents_batch(query_documents, chunk_ids)
         except Exception as e:
             logging.error(f"❌ Error reranking documents: {str(e)}")
-            return "\n\n".join(documents), list(range(len(documents)))
+            return [("\n\n".join(documents), list(range(len(documents)))) for _, documents in query_documents]
+        
+        results = []
+        for (_, documents), scores in zip(query_documents, all_scores):
+            relevant_text_ids = self._top_ids(scores, top_k)
+            relevant_text = "".join(documents[i] + "\n\n" for i in relevant_text_ids)
+            results.append((relevant_text, relevant_text_ids))
+        
+        return results
+    
+    def score_documents_batch(self, query_documents: List[tuple[str, List[str]]], chunk_ids: Optional[List[List[str]]] = None) -> List[List[float]]:
+        """
+        Score every (query, document) pair with one cross-encoder predict call
+        and return the scores grouped per query.
+        Scores are cached by (query, chunk id); only uncached pairs reach the model.
+        Without chunk_ids the document text hash stands in for the id.
+        """
+        pairs = [(query, document) for query, documents in query_documents for document in documents]
+        if not pairs:
+            return [[] for _ in query_documents]
+        
+        self._ensure_initialized()
+        keys = self._score_keys(query_documents, chunk_ids) if self.score_cache is not None else None
+        scores = self.score_cache.get_many(keys) if keys else [None] * len(pairs)
+        
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            predicted = self.encoder_model.predict(
+                [pairs[i] for i in missing],
+                batch_size=self.rerank_batch_size,
+                show_progress_bar=False
+            )
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+            if keys:
+                self.score_cache.put_many([keys[i] for i in missing], [scores[i] for i in missing])
+        
+        grouped = []
+        offset = 0
+        for _, documents in query_documents:
+            grouped.append([float(score) for score in scores[offset:offset + len(documents)]])
+            offset += len(documents)
+        return grouped
+    
+    @staticmethod
+    def _score_keys(query_documents: List[tuple[str, List[str]]], chunk_ids: Optional[List[List[str]]]) -> List[tuple[str, str]]:
+        keys = []
+        for index, (query, documents) in enumerate(query_documents):
+            query_hash = ScoreCache.query_hash(query)
+            ids = chunk_ids[index] if chunk_ids else [None] * len(documents)
+            for chunk_id, document in zip(ids, documents):
+                keys.append((query_hash, chunk_id or "sha1:" + hashlib.sha1(document.encode("utf-8")).hexdigest()))
+        return keys
+    
+    def _rerank_plan(self, hits: List[Dict[str, Any]], top_k: int) -> tuple[str, List[int]]:
+        """
+        Decide which hits the cross-encoder needs to score.
+        Returns the decision name and the indices to rerank (empty when skipped).
+        """
+        indices = list(range(len(hits)))
+        if not self.adaptive_rerank:
+            return "full", indices
+        if len(hits) <= top_k:
+            # Every candidate is kept anyway; vector order is good enough
+            return "skipped_few_candidates", []
+        
+        distances = [hit["distance"] for hit in hits]
+        if self.rerank_distance_margin <= 0 or any(distance is None for distance in distances):
+            # Keyword-only hits carry no distance to compare
+            return "full", indices
+        
+        by_distance = sorted(indices, key=lambda i: distances[i])
+        best = distances[by_distance[0]]
+        if distances[by_distance[1]] - best >= self.rerank_distance_margin:
+            return "skipped_decisive", []
+        
+        # Candidates further than the margin behind the best one cannot compete for the top spots
+        in_window = sum(1 for i in by_distance if distances[i] - best < self.rerank_distance_margin)
+        count = max(in_window, top_k)
+        if count >= len(hits):
+            return "full", indices
+        return "shortened", by_distance[:count]
+    
+    def _record_rerank(self, decision: str, skipped_pairs: int) -> None:
+        with self._rerank_stats_lock:
+            self.rerank_stats[decision] += 1
+            self.rerank_stats["pairs_skipped"] += skipped_pairs
+    
+    @staticmethod
+    def _distance(hit: Dict[str, Any]) -> float:
+        return hit["distance"] if hit["distance"] is not None else float("inf")
+    
+    @staticmethod
+    def _top_ids(scores: List[float], top_k: int) -> List[int]:
+        ranked_ids = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        return ranked_ids[:min(top_k, len(scores))]
     
     def get_knowledge_context(self, user_query: str, previous_queries: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Main function to get knowledge context from vector store
         """
+        cache_key, cached = self._cached_result("get_knowledge_context", user_query, previous_queries=previous_queries)
+        if cached is not None:
+            return cached
+        
+        try:
+            # Initialization errors must reach the caller, not read as an empty knowledge base
+            self._ensure_initialized()
+            decomposed_queries, unique_queries = self._prepare_queries(user_query, previous_queries)
+            
+            # Paraphrases of an earlier question reuse its context; the full query is embedded
+            # in one call with the sub-queries, and retrieval below reuses their vectors
+            semantic_embedding, query_vectors = self._semantic_embedding(user_query, previous_queries, unique_queries)
+            semantic_hit = self._semantic_context(user_query, semantic_embedding)
+            if semantic_hit is not None:
+                return semantic_hit
+            
+            # Search vector store for all queries in one batch
+            search_hits = self.query_collection(unique_queries, query_vectors=query_vectors)
+            
+            found, unique_count = self._assign_hits(unique_queries, search_hits)
+            
+            # Rerank every unique chunk in a single cross-encoder pass
+            all_scores = self._score_found(found)
+            
+            result = self._build_context_result(user_query, decomposed_queries, unique_queries, found, all_scores, unique_count)
+            return self._remember_result(cache_key, self._remember_semantic_context(user_query, semantic_embedding, result))
+            
+        except Exception as e:
+            logging.error(f"❌ Error getting knowledge context: {str(e)}")
+            return self._context_error(user_query, e)
+    
+    async def get_knowledge_context_async(self, user_query: str, previous_queries: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Async variant of get_knowledge_context that does not block the event loop.
+        Embedding requests are awaited, ChromaDB and reranker work runs on bounded thread pools.
+        """
+        cache_key, cached = self._cached_result("get_knowledge_context", user_query, previous_queries=previous_queries)
+        if cached is not None:
+            return cached
+        
         try:
+            await self._ensure_initialized_async()
+            decomposed_queries, unique_queries = self._prepare_queries(user_query, previous_queries)
+            
+            semantic_embedding, query_vectors = await self._semantic_embedding_async(user_query, previous_queries, unique_queries)
+            semantic_hit = self._semantic_context(user_query, semantic_embedding)
+            if semantic_hit is not None:
+                return semantic_hit
+            
+            search_hits = await self.query_collection_async(unique_queries, query_vectors=query_vectors)
+            
+            found, unique_count = self._assign_hits(unique_queries, search_hits)
+            
+            loop = asyncio.get_running_loop()
+            all_scores = await loop.run_in_executor(self.rerank_executor, self._score_found, found)
+            
+            # Packing may fetch parent sections from ChromaDB, so it stays off the event loop
+            result = await loop.run_in_executor(
+                self.search_executor, self._build_context_result,
+                user_query, decomposed_queries, unique_queries, found, all_scores, unique_count
+            )
+            return self._remember_result(cache_key, self._remember_semantic_context(user_query, semantic_embedding, result))
+            
+        except Exception as e:
+            logging.error(f"❌ Error getting knowledge context: {str(e)}")
+            return self._context_error(user_query, e)
+    
+    def _prepare_queries(self, user_query: str, previous_queries: Optional[List[str]]) -> tuple[List[str], List[str]]:
+        with self._stage("decompose"):
             # Decompose the current query
             decomposed_queries = self.decompose_query(user_query)
             
@@ -136,87 +864,332 @@ class KnowledgeModule:
                 all_queries.extend(previous_queries)
             
             # Remove duplicates while preserving order
-            seen = set()
-            unique_queries = []
-            for query in all_queries:
-                if query not in seen:
-                    seen.add(query)
-                    unique_queries.append(query)
-            
-            # Search and rerank for each query
-            all_relevant_text = []
-            query_results = {}
-            
-            for query in unique_queries:
-                # Search vector store
-                documents = self.search_vector_store(query)
-                
-                if documents:
-                    # Rerank documents
-                    relevant_text, relevant_ids = self.rerank_documents(documents, query)
-                    
-                    all_relevant_text.append(relevant_text)
-                    query_results[query] = {
-                        "documents": documents,
-                        "reranked_text": relevant_text,
-                        "relevant_ids": relevant_ids
-                    }
-            
-            # Combine all relevant text
-            combined_context = "\n\n".join(all_relevant_text)
+            unique_queries = list(dict.fromkeys(all_queries))
+        return decomposed_queries, unique_queries
+    
+    def _assign_hits(self, unique_queries: List[str], search_hits: List[List[Dict[str, Any]]]) -> tuple[List[tuple[str, List[Dict[str, Any]]]], int]:
+        # Deduplicate chunks by ChromaDB id across sub-queries: each chunk is
+        # kept once, under the sub-query that retrieved it closest
+        best_hit = {}
+        for query, hits in zip(unique_queries, search_hits):
+            for hit in hits:
+                current = best_hit.get(hit["id"])
+                if current is None or self._distance(hit) < self._distance(current[1]):
+                    best_hit[hit["id"]] = (query, hit)
+        
+        assigned = {query: [] for query in unique_queries}
+        for query, hit in sorted(best_hit.values(), key=lambda item: self._distance(item[1])):
+            assigned[query].append(hit)
+        found = [(query, assigned[query]) for query in unique_queries if assigned[query]]
+        return found, len(best_hit)
+    
+    def _score_found(self, found: List[tuple[str, List[Dict[str, Any]]]], top_k: int = 3) -> List[List[float]]:
+        """
+        Relevance of every hit on one 0-1 scale shared by all sub-queries: the sigmoid of
+        the cross-encoder logit, so scores from different sub-queries can be compared when
+        packing. Hits the adaptive policy did not send to the cross-encoder are ranked by
+        vector distance strictly below every reranked hit.
+        """
+        with self._stage("rerank"):
+            plans = []
+            for _, hits in found:
+                decision, indices = self._rerank_plan(hits, top_k)
+                self._record_rerank(decision, len(hits) - len(indices))
+                plans.append(indices)
             
-            return {
-                "status": "success",
-                "original_query": user_query,
-                "decomposed_queries": decomposed_queries,
-                "all_queries_processed": unique_queries,
-                "combined_context": combined_context,
-                "query_results": query_results,
-                "total_documents_found": len([doc for result in query_results.values() for doc in result["documents"]])
-            }
+            try:
+                scored = self.score_documents_batch(
+                    [(query, [hits[i]["document"] for i in indices]) for (query, hits), indices in zip(found, plans)],
+                    [[hits[i]["id"] for i in indices] for (_, hits), indices in zip(found, plans)]
+                )
+            except Exception as e:
+                # Fall back to vector search order
+                logging.error(f"❌ Error reranking documents: {str(e)}")
+                scored = [[] for _ in found]
+                plans = [[] for _ in found]
             
-        except Exception as e:
-            logging.error(f"❌ Error getting knowledge context: {str(e)}")
+            relevances = [[self._sigmoid(score) for score in scores] for scores in scored]
+            ceiling = min((relevance for scores in relevances for relevance in scores), default=1.0)
+            all_scores = []
+            for (_, hits), indices, scores in zip(found, plans, relevances):
+                hit_scores = self._distance_scores(hits, ceiling)
+                for i, score in zip(indices, scores):
+                    hit_scores[i] = score
+                all_scores.append(hit_scores)
+            return all_scores
+    
+    @staticmethod
+    def _sigmoid(logit: float) -> float:
+        return 1.0 / (1.0 + math.exp(-float(logit)))
+    
+    def _distance_scores(self, hits: List[Dict[str, Any]], ceiling: float) -> List[float]:
+        # Scores in (0, ceiling / 2] that fall with vector distance; keyword-only hits
+        # without a distance keep their retrieval order behind the rest
+        order = sorted(range(len(hits)), key=lambda i: self._distance(hits[i]))
+        scores = [0.0] * len(hits)
+        for rank, i in enumerate(order):
+            distance = hits[i]["distance"]
+            scores[i] = ceiling / (2.0 + (max(float(distance), 0.0) if distance is not None else len(hits) + rank))
+        return scores
+    
+    def _build_context_result(self, user_query: str, decomposed_queries: List[str], unique_queries: List[str], found: List[tuple[str, List[Dict[str, Any]]]], all_scores: List[List[float]], unique_count: int) -> Dict[str, Any]:
+        query_results = {}
+        relevant_chunks = []
+        for (query, hits), scores in zip(found, all_scores):
+            documents = [hit["document"] for hit in hits]
+            relevant_ids = self._top_ids(scores, 3)
+            query_results[query] = {
+                "documents": documents,
+                "reranked_text": "".join(documents[i] + "\n\n" for i in relevant_ids),
+                "relevant_ids": relevant_ids
+            }
+            relevant_chunks.extend(
+                {"id": hits[i]["id"], "document": documents[i], "score": scores[i], "metadata": hits[i].get("metadata") or {}}
+                for i in relevant_ids
+            )
+        
+        # Pack the best chunks (or their parent sections) into combined_context within the token budget
+        packed = self._pack_chunks(relevant_chunks)
+        combined_context = "\n\n".join(chunk["document"] for chunk in packed)
+        
+        return {
+            "status": "success",
+            "original_query": user_query,
+            "decomposed_queries": decomposed_queries,
+            "all_queries_processed": unique_queries,
+            "combined_context": combined_context,
+            "query_results": query_results,
+            "chunks": [self._chunk_reference(chunk) for chunk in packed],
+            "total_documents_found": unique_count
+        }
+    
+    def _pack_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Select chunks for the context within the token budget.
+        Child chunks are replaced by their parent section, once per parent and scored by
+        its best child; chunks without a parent are their own section, so both kinds are
+        ranked by the same score. Children whose parent does not fit keep their own text.
+        """
+        parent_ids = list(dict.fromkeys(
+            chunk["metadata"]["parent_id"] for chunk in chunks if (chunk.get("metadata") or {}).get("parent_id")
+        ))
+        if not self.parent_context or not parent_ids:
+            return pack_context(chunks, self.context_token_budget, self.context_mmr_lambda)
+        
+        sections = self._load_parent_sections(parent_ids)
+        units = {}
+        for chunk in chunks:
+            parent_id = (chunk.get("metadata") or {}).get("parent_id")
+            if parent_id in sections:
+                unit = {**chunk, "id": parent_id, "document": sections[parent_id]["document"]}
+            else:
+                unit = chunk
+            if unit["id"] not in units or unit["score"] > units[unit["id"]]["score"]:
+                units[unit["id"]] = unit
+        packed = pack_context(list(units.values()), self.context_token_budget, self.context_mmr_lambda)
+        
+        packed_ids = {chunk["id"] for chunk in packed}
+        leftovers = [
+            chunk for chunk in chunks
+            if (chunk.get("metadata") or {}).get("parent_id") in sections
+            and chunk["metadata"]["parent_id"] not in packed_ids
+        ]
+        remaining_budget = self.context_token_budget - sum(estimate_tokens(chunk["document"]) for chunk in packed)
+        if leftovers and remaining_budget > 0:
+            packed.extend(
+                chunk for chunk in pack_context(leftovers, remaining_budget, self.context_mmr_lambda)
+                if estimate_tokens(chunk["document"]) <= remaining_budget
+            )
+        return packed
+    
+    def _load_parent_sections(self, parent_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Rebuild parent sections from their child chunks (parent_id / parent_offset metadata)
+        """
+        stored = self.collection.get(where={"parent_id": {"$in": list(parent_ids)}}, include=["documents", "metadatas"])
+        pieces = defaultdict(list)
+        metadatas = {}
+        for document, metadata in zip(stored["documents"], stored["metadatas"]):
+            parent_id = metadata["parent_id"]
+            pieces[parent_id].append((int(metadata.get("parent_offset") or 0), document))
+            if parent_id not in metadatas or metadata.get("chunk_index", 0) < metadatas[parent_id].get("chunk_index", 0):
+                metadatas[parent_id] = metadata
+        return {
+            parent_id: {
+                "id": parent_id,
+                "document": stitch_sections(pieces[parent_id]),
+                "metadata": {key: metadatas[parent_id][key] for key in ("source", "page") if key in metadatas[parent_id]}
+            }
+            for parent_id in pieces
+        }
+    
+    @staticmethod
+    def _chunk_reference(chunk: Dict[str, Any]) -> Dict[str, Any]:
+        # Id, score and source metadata only; the text is in the context or via get_knowledge_documents
+        metadata = chunk.get("metadata") or {}
+        reference = {"id": chunk["id"], "score": round(float(chunk["score"]), 4)}
+        for key in ("source", "page"):
+            if metadata.get(key) is not None:
+                reference[key] = metadata[key]
+        return reference
+    
+    def format_context_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Shape a get_knowledge_context result for the LLM according to response_mode.
+        Compact responses drop the per-query document lists and keep only the packed
+        context with chunk references.
+        """
+        if self.response_mode != "compact" or result.get("status") != "success":
+            return result
+        return {
+            key: result[key]
+            for key in ("status", "original_query", "decomposed_queries", "combined_context", "chunks", "total_documents_found", "semantic_cache_hit")
+            if key in result
+        }
+    
+    def format_topic_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Shape a search_specific_topic result for the LLM according to response_mode
+        """
+        if self.response_mode != "compact" or result.get("status") != "success":
+            return result
+        return {key: value for key, value in result.items() if key != "document_ids"}
+    
+    def get_knowledge_documents(self, chunk_ids: List[str]) -> Dict[str, Any]:
+        """
+        Fetch the full text and source metadata of knowledge chunks by id
+        (the ids listed under "chunks" in knowledge search results, including parent sections)
+        """
+        try:
+            self._ensure_initialized()
+            requested = list(dict.fromkeys(chunk_ids))
+            stored = self.collection.get(ids=requested, include=["documents", "metadatas"])
+            by_id = {
+                chunk_id: {"id": chunk_id, "document": document, "metadata": metadata or {}}
+                for chunk_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+            }
+            unresolved = [chunk_id for chunk_id in requested if chunk_id not in by_id]
+            if unresolved:
+                # Parent sections are not stored as chunks; rebuild them from their children
+                by_id.update(self._load_parent_sections(unresolved))
+            # Keep the caller's order
+            documents = [by_id[chunk_id] for chunk_id in requested if chunk_id in by_id]
             return {
-                "status": "error",
-                "error": str(e),
-                "original_query": user_query,
-                "combined_context": ""
+                "status": "success" if documents else "no_results",
+                "documents": documents,
+                "missing_ids": [chunk_id for chunk_id in requested if chunk_id not in by_id]
             }
+        except Exception as e:
+            logging.error(f"❌ Error fetching knowledge documents: {str(e)}")
+            return {"status": "error", "error": str(e), "documents": []}
+    
+    async def get_knowledge_documents_async(self, chunk_ids: List[str]) -> Dict[str, Any]:
+        """
+        Async variant of get_knowledge_documents
+        """
+        try:
+            await self._ensure_initialized_async()
+        except Exception as e:
+            logging.error(f"❌ Error fetching knowledge documents: {str(e)}")
+            return {"status": "error", "error": str(e), "documents": []}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.search_executor, self.get_knowledge_documents, chunk_ids)
+    
+    @staticmethod
+    def _context_error(user_query: str, error: Exception) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "error": str(error),
+            "original_query": user_query,
+            "combined_context": ""
+        }
     
     def search_specific_topic(self, topic: str, n_results: int = 3) -> Dict[str, Any]:
         """
         Search for a specific topic in the knowledge base
         """
+        cache_key, cached = self._cached_result("search_specific_topic", topic, n_results=n_results)
+        if cached is not None:
+            return cached
+        
         try:
+            self._ensure_initialized()
             # Search vector store
-            documents = self.search_vector_store(topic, n_results)
+            hits = self.query_collection([topic], n_results)[0]
+            documents = [hit["document"] for hit in hits]
             
-            if documents:
-                # Rerank documents
-                relevant_text, relevant_ids = self.rerank_documents(documents, topic)
+            # Rerank documents (adaptively, using the vector distances)
+            relevant_text, relevant_ids, chunks = self._rerank_hits(topic, hits) if documents else ("", [], [])
+            
+            return self._remember_result(cache_key, self._topic_result(topic, documents, relevant_text, relevant_ids, chunks))
                 
-                return {
-                    "status": "success",
-                    "topic": topic,
-                    "documents_found": len(documents),
-                    "relevant_text": relevant_text,
-                    "document_ids": relevant_ids
-                }
-            else:
-                return {
-                    "status": "no_results",
-                    "topic": topic,
-                    "documents_found": 0,
-                    "relevant_text": "",
-                    "document_ids": []
-                }
+        except Exception as e:
+            logging.error(f"❌ Error searching specific topic: {str(e)}")
+            return self._topic_error(topic, e)
+    
+    async def search_specific_topic_async(self, topic: str, n_results: int = 3) -> Dict[str, Any]:
+        """
+        Async variant of search_specific_topic that does not block the event loop
+        """
+        cache_key, cached = self._cached_result("search_specific_topic", topic, n_results=n_results)
+        if cached is not None:
+            return cached
+        
+        try:
+            await self._ensure_initialized_async()
+            hits = (await self.query_collection_async([topic], n_results))[0]
+            documents = [hit["document"] for hit in hits]
+            
+            relevant_text, relevant_ids, chunks = ("", [], [])
+            if documents:
+                loop = asyncio.get_running_loop()
+                relevant_text, relevant_ids, chunks = await loop.run_in_executor(
+                    self.rerank_executor, self._rerank_hits, topic, hits
+                )
+            
+            return self._remember_result(cache_key, self._topic_result(topic, documents, relevant_text, relevant_ids, chunks))
                 
         except Exception as e:
             logging.error(f"❌ Error searching specific topic: {str(e)}")
+            return self._topic_error(topic, e)
+    
+    def _rerank_hits(self, topic: str, hits: List[Dict[str, Any]], top_k: int = 3) -> tuple[str, List[int], List[Dict[str, Any]]]:
+        scores = self._score_found([(topic, hits)], top_k)[0]
+        relevant_ids = self._top_ids(scores, top_k)
+        relevant = [
+            {"id": hits[i]["id"], "document": hits[i]["document"], "score": scores[i], "metadata": hits[i].get("metadata") or {}}
+            for i in relevant_ids
+        ]
+        if self.parent_context and any(chunk["metadata"].get("parent_id") for chunk in relevant):
+            # Return the parent sections of the best children
+            relevant = self._pack_chunks(relevant)
+        return "".join(chunk["document"] + "\n\n" for chunk in relevant), relevant_ids, [self._chunk_reference(chunk) for chunk in relevant]
+    
+    @staticmethod
+    def _topic_result(topic: str, documents: List[str], relevant_text: str, relevant_ids: List[int], chunks: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        if documents:
             return {
-                "status": "error",
-                "error": str(e),
+                "status": "success",
                 "topic": topic,
-                "relevant_text": ""
-            } 
\ No newline at end of file
+                "documents_found": len(documents),
+                "relevant_text": relevant_text,
+                "document_ids": relevant_ids,
+                "chunks": chunks or []
+            }
+        else:
+            return {
+                "status": "no_results",
+                "topic": topic,
+                "documents_found": 0,
+                "relevant_text": "",
+                "document_ids": []
+            }
+    
+    @staticmethod
+    def _topic_error(topic: str, error: Exception) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "error": str(error),
+            "topic": topic,
+            "relevant_text": ""
+        }
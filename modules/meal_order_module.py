@@ -1,5 +1,7 @@
 class MealOrderModule:
-    def __init__(self):
+    def __init__(self, store=None):
+        # Optional shared data store; the sample orders below are the in-memory fallback
+        self.store = store
         self.flightList = []
         flight1 = {"mflId": 1, "f": 8, "j": 15, "w": 0, "y": 40}  # EK0202 21-Jun-2025
         flight2 = {"mflId": 6, "f": 2, "j": 20, "w": 0, "y": 55}  # EK0203 20-Jun-2025
@@ -20,8 +22,13 @@ class MealOrderModule:
                 "total_items": 0
             }
         
-        # Return meal order details based on mflId fetched from the flightList
-        for flight in self.flightList:
+        # Return meal order details based on mflId fetched from the data store or the flightList
+        if self.store is not None:
+            order = self.store.get_meal_order(mflId)
+            matches = [order] if order else []
+        else:
+            matches = self.flightList
+        for flight in matches:
             if flight["mflId"] == mflId:
                 # Convert to structured format
                 meal_orders = [
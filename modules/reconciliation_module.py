@@ -0,0 +1,317 @@
+import argparse
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from modules.erp_module import ERPModule
+from modules.stock_count_module import StockCountModule
+
+# Discrepancies listed in a verdict; the rest are only counted, so the response stays small
+RECONCILIATION_MAX_LISTED = int(os.getenv("RECONCILIATION_MAX_LISTED", "50"))
+
+# Only these fields decide approval; float_book / float_actual and the rest are ignored
+COMPARED_FIELDS = ("book_bulk", "book_actual")
+
+class ReconciliationDiscrepancy(BaseModel):
+    item_code: str = Field(..., description="Item Code")
+    item_desc: str = Field(..., description="Item Description")
+    issue: str = Field(..., description="mismatch, missing_in_erp or missing_in_stock_count")
+    stock_count_book_bulk: Optional[int] = Field(None, description="Stock Count Book Bulk Quantity")
+    erp_book_bulk: Optional[int] = Field(None, description="ERP Book Bulk Quantity")
+    book_bulk_difference: Optional[int] = Field(None, description="Stock count minus ERP book_bulk")
+    stock_count_book_actual: Optional[int] = Field(None, description="Stock Count Book Actual Quantity")
+    erp_book_actual: Optional[int] = Field(None, description="ERP Book Actual Quantity")
+    book_actual_difference: Optional[int] = Field(None, description="Stock count minus ERP book_actual")
+
+class ReconciliationResponse(BaseModel):
+    status: str = Field(..., description="Response status")
+    message: str = Field(..., description="Response message")
+    transaction_id: str = Field("", description="Transaction ID")
+    overall_approval: Optional[str] = Field(None, description="APPROVED or REJECTED")
+    total_items: int = Field(0, description="Distinct items in either source")
+    items_approved: int = Field(0, description="Items present in both sources with equal book_bulk and book_actual")
+    items_requiring_review: int = Field(0, description="Items with a difference or missing from one source")
+    approval_percentage: float = Field(0.0, description="Items approved / total items x 100")
+    mismatched_items: int = Field(0, description="Items in both sources whose book_bulk or book_actual differ")
+    missing_in_erp: int = Field(0, description="Items in the stock count but not in ERP")
+    missing_in_stock_count: int = Field(0, description="Items in ERP but not in the stock count")
+    discrepancies: List[ReconciliationDiscrepancy] = Field(default_factory=list, description="Discrepancies, by item code")
+    discrepancies_not_listed: int = Field(0, description="Discrepancies counted but left out of the list")
+
+class ReconciliationModule:
+    """
+    Deterministic stock count vs ERP reconciliation.
+    In memory, both sides of a transaction are read as column arrays sorted by item_code
+    and joined on item_code with NumPy, so the comparison costs milliseconds even for
+    thousands of items and the LLM only has to phrase the verdict. Store-backed data is
+    merge-joined from sorted row streams instead (StreamingReconciliation).
+    """
+
+    def __init__(self, stock_count_module: StockCountModule, erp_module: ERPModule, max_listed: int = RECONCILIATION_MAX_LISTED):
+        self.stock_count_module = stock_count_module
+        self.erp_module = erp_module
+        self.max_listed = max_listed
+
+    def reconcile_transaction(self, transaction_id: str) -> ReconciliationResponse:
+        """
+        Compare the stock count and ERP records of a transaction on book_bulk and book_actual.
+
+        Args:
+            transaction_id: Transaction ID to reconcile
+
+        Returns:
+            ReconciliationResponse: APPROVED only if every item is in both sources with equal
+            book_bulk and book_actual; counts, approval percentage and the discrepancies found
+        """
+        # Check if transaction_id is provided
+        if not transaction_id:
+            return ReconciliationResponse(status="error", message="Please provide a valid transaction ID.")
+
+        # Store-backed data is streamed rather than loaded, so memory stays bounded
+        if self.stock_count_module.store is not None or self.erp_module.store is not None:
+            return self.reconcile_transaction_streaming(transaction_id)
+
+        try:
+            stock = self.stock_count_module.get_transaction_columns(transaction_id)
+            erp = self.erp_module.get_transaction_columns(transaction_id)
+        except Exception as e:
+            logging.error(f"❌ Error loading reconciliation data for {transaction_id}: {str(e)}")
+            return ReconciliationResponse(status="error", message=f"Error loading data: {str(e)}", transaction_id=transaction_id)
+
+        if not len(stock["item_code"]) and not len(erp["item_code"]):
+            return ReconciliationResponse(
+                status="error",
+                message=f"No stock count or ERP data found for transaction {transaction_id}",
+                transaction_id=transaction_id,
+            )
+
+        # Duplicate item codes within a source use their first record, as in merge_join_items,
+        # so every item is counted once
+        stock, erp = _first_per_item(stock), _first_per_item(erp)
+        _, stock_index, erp_index = np.intersect1d(stock["item_code"], erp["item_code"], return_indices=True)
+        differences = {
+            field: stock[field][stock_index] - erp[field][erp_index] for field in COMPARED_FIELDS
+        }
+        mismatched = np.logical_or.reduce([differences[field] != 0 for field in COMPARED_FIELDS])
+        missing_in_erp = np.flatnonzero(~np.isin(stock["item_code"], erp["item_code"]))
+        missing_in_stock_count = np.flatnonzero(~np.isin(erp["item_code"], stock["item_code"]))
+
+        missing = len(missing_in_erp) + len(missing_in_stock_count)
+        totals = {
+            "total_items": len(stock_index) + missing,
+            "items_approved": int(len(stock_index) - np.count_nonzero(mismatched)),
+            "mismatched_items": int(np.count_nonzero(mismatched)),
+            "missing_in_erp": len(missing_in_erp),
+            "missing_in_stock_count": len(missing_in_stock_count),
+        }
+        discrepancies = self._list_discrepancies(
+            stock, erp, stock_index[mismatched], erp_index[mismatched], missing_in_erp, missing_in_stock_count
+        )
+        return _verdict(transaction_id, totals, discrepancies)
+
+    def _list_discrepancies(self, stock, erp, stock_mismatched, erp_mismatched, missing_in_erp, missing_in_stock_count) -> List[ReconciliationDiscrepancy]:
+        # The first max_listed discrepancies by item code, built only for those listed
+        codes = np.concatenate([
+            stock["item_code"][stock_mismatched],
+            stock["item_code"][missing_in_erp],
+            erp["item_code"][missing_in_stock_count],
+        ])
+        kinds = np.repeat([0, 1, 2], [len(stock_mismatched), len(missing_in_erp), len(missing_in_stock_count)])
+        positions = np.concatenate([
+            np.arange(len(stock_mismatched)),
+            np.arange(len(missing_in_erp)),
+            np.arange(len(missing_in_stock_count)),
+        ])
+
+        discrepancies = []
+        for order in np.argsort(codes, kind="stable")[:max(0, self.max_listed)].tolist():
+            kind, position = int(kinds[order]), int(positions[order])
+            if kind == 0:
+                row, erp_row = int(stock_mismatched[position]), int(erp_mismatched[position])
+                values = {"issue": "mismatch", "item_code": str(stock["item_code"][row]), "item_desc": str(stock["item_desc"][row])}
+                for field in COMPARED_FIELDS:
+                    stock_value, erp_value = int(stock[field][row]), int(erp[field][erp_row])
+                    values[f"stock_count_{field}"] = stock_value
+                    values[f"erp_{field}"] = erp_value
+                    values[f"{field}_difference"] = stock_value - erp_value
+            elif kind == 1:
+                row = int(missing_in_erp[position])
+                values = {"issue": "missing_in_erp", "item_code": str(stock["item_code"][row]), "item_desc": str(stock["item_desc"][row])}
+                values.update({f"stock_count_{field}": int(stock[field][row]) for field in COMPARED_FIELDS})
+            else:
+                row = int(missing_in_stock_count[position])
+                values = {"issue": "missing_in_stock_count", "item_code": str(erp["item_code"][row]), "item_desc": str(erp["item_desc"][row])}
+                values.update({f"erp_{field}": int(erp[field][row]) for field in COMPARED_FIELDS})
+            discrepancies.append(ReconciliationDiscrepancy(**values))
+        return discrepancies
+
+    def iter_reconciliation(self, transaction_id: str) -> "StreamingReconciliation":
+        """
+        Streaming reconciliation of a transaction: iterate it for discrepancies as they are found
+        """
+        return StreamingReconciliation(
+            self.stock_count_module.iter_stock_counts(transaction_id),
+            self.erp_module.iter_erp_items(transaction_id),
+        )
+
+    def reconcile_transaction_streaming(self, transaction_id: str) -> ReconciliationResponse:
+        """
+        reconcile_transaction in one merge-join pass over the sorted records, with constant memory
+        """
+        if not transaction_id:
+            return ReconciliationResponse(status="error", message="Please provide a valid transaction ID.")
+        try:
+            return self.iter_reconciliation(transaction_id).verdict(transaction_id, self.max_listed)
+        except Exception as e:
+            logging.error(f"❌ Error reconciling {transaction_id}: {str(e)}")
+            return ReconciliationResponse(status="error", message=f"Error reconciling data: {str(e)}", transaction_id=transaction_id)
+
+
+def _first_per_item(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    # Keep the first row of each item_code (rows are sorted by item_code in load order)
+    _, first = np.unique(columns["item_code"], return_index=True)
+    if len(first) == len(columns["item_code"]):
+        return columns
+    return {name: column[first] for name, column in columns.items()}
+
+
+def merge_join_items(
+    stock_rows: Iterable[Dict[str, Any]], erp_rows: Iterable[Dict[str, Any]]
+) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    """
+    Single-pass merge join of two record streams sorted by item_code.
+    Yields (item_code, stock_row, erp_row) with None for the side lacking the item;
+    a repeated item code keeps its first record. Raises ValueError on unsorted input.
+    """
+    stock_rows = _sorted_unique(stock_rows, "Stock count")
+    erp_rows = _sorted_unique(erp_rows, "ERP")
+    stock, erp = next(stock_rows, None), next(erp_rows, None)
+    while stock is not None or erp is not None:
+        if erp is None or (stock is not None and stock["item_code"] < erp["item_code"]):
+            yield stock["item_code"], stock, None
+            stock = next(stock_rows, None)
+        elif stock is None or erp["item_code"] < stock["item_code"]:
+            yield erp["item_code"], None, erp
+            erp = next(erp_rows, None)
+        else:
+            yield stock["item_code"], stock, erp
+            stock, erp = next(stock_rows, None), next(erp_rows, None)
+
+
+def _sorted_unique(rows: Iterable[Dict[str, Any]], label: str) -> Iterator[Dict[str, Any]]:
+    previous = None
+    for row in rows:
+        item_code = row["item_code"]
+        if previous is not None and item_code <= previous:
+            if item_code == previous:
+                continue
+            raise ValueError(f"{label} records are not sorted by item_code ({item_code} after {previous})")
+        previous = item_code
+        yield row
+
+
+class StreamingReconciliation:
+    """
+    Bounded-memory reconciliation of one transaction.
+    Stock count and ERP records are merge-joined from item_code-sorted streams in a single
+    pass; iterating yields each discrepancy as it is found, and totals holds the running
+    counts of the rows seen so far. Only one record per side is held at a time.
+    """
+
+    def __init__(self, stock_rows: Iterable[Dict[str, Any]], erp_rows: Iterable[Dict[str, Any]]):
+        self._pairs = merge_join_items(stock_rows, erp_rows)
+        self.totals = {"total_items": 0, "items_approved": 0, "mismatched_items": 0, "missing_in_erp": 0, "missing_in_stock_count": 0}
+
+    def __iter__(self) -> Iterator[ReconciliationDiscrepancy]:
+        for item_code, stock, erp in self._pairs:
+            self.totals["total_items"] += 1
+            if erp is None:
+                self.totals["missing_in_erp"] += 1
+                yield ReconciliationDiscrepancy(
+                    item_code=item_code, item_desc=stock["item_desc"], issue="missing_in_erp",
+                    **{f"stock_count_{field}": stock[field] for field in COMPARED_FIELDS},
+                )
+            elif stock is None:
+                self.totals["missing_in_stock_count"] += 1
+                yield ReconciliationDiscrepancy(
+                    item_code=item_code, item_desc=erp["item_desc"], issue="missing_in_stock_count",
+                    **{f"erp_{field}": erp[field] for field in COMPARED_FIELDS},
+                )
+            elif any(stock[field] != erp[field] for field in COMPARED_FIELDS):
+                self.totals["mismatched_items"] += 1
+                values = {}
+                for field in COMPARED_FIELDS:
+                    values[f"stock_count_{field}"] = stock[field]
+                    values[f"erp_{field}"] = erp[field]
+                    values[f"{field}_difference"] = stock[field] - erp[field]
+                yield ReconciliationDiscrepancy(item_code=item_code, item_desc=stock["item_desc"], issue="mismatch", **values)
+            else:
+                self.totals["items_approved"] += 1
+
+    def get_totals(self) -> Dict[str, Any]:
+        """
+        Running totals with the review count and approval percentage so far
+        """
+        totals = dict(self.totals)
+        totals["items_requiring_review"] = totals["total_items"] - totals["items_approved"]
+        totals["approval_percentage"] = round(totals["items_approved"] / totals["total_items"] * 100, 2) if totals["total_items"] else 0.0
+        return totals
+
+    def verdict(self, transaction_id: str, max_listed: int = RECONCILIATION_MAX_LISTED) -> ReconciliationResponse:
+        """
+        Consume the rest of the stream; the first max_listed discrepancies by item code are kept
+        """
+        discrepancies = []
+        for discrepancy in self:
+            if len(discrepancies) < max_listed:
+                discrepancies.append(discrepancy)
+        if not self.totals["total_items"]:
+            return ReconciliationResponse(
+                status="error",
+                message=f"No stock count or ERP data found for transaction {transaction_id}",
+                transaction_id=transaction_id,
+            )
+        return _verdict(transaction_id, self.totals, discrepancies)
+
+
+def _verdict(transaction_id: str, totals: Dict[str, int], discrepancies: List[ReconciliationDiscrepancy]) -> ReconciliationResponse:
+    total_items, items_approved = totals["total_items"], totals["items_approved"]
+    items_requiring_review = total_items - items_approved
+    overall_approval = "APPROVED" if items_requiring_review == 0 else "REJECTED"
+    return ReconciliationResponse(
+        status="success",
+        message=f"Transaction {transaction_id} {overall_approval}: {items_approved} of {total_items} items match",
+        transaction_id=transaction_id,
+        overall_approval=overall_approval,
+        total_items=total_items,
+        items_approved=items_approved,
+        items_requiring_review=items_requiring_review,
+        approval_percentage=round(items_approved / total_items * 100, 2),
+        mismatched_items=totals["mismatched_items"],
+        missing_in_erp=totals["missing_in_erp"],
+        missing_in_stock_count=totals["missing_in_stock_count"],
+        discrepancies=discrepancies,
+        discrepancies_not_listed=items_requiring_review - len(discrepancies),
+    )
+
+
+if __name__ == "__main__":
+    from modules.data_store import DATA_STORE_PATH, SQLiteDataStore
+
+    parser = argparse.ArgumentParser(description="Stream a transaction's reconciliation from the SQLite data store")
+    parser.add_argument("transaction_id")
+    parser.add_argument("--db", default=DATA_STORE_PATH, help="SQLite database path")
+    args = parser.parse_args()
+
+    # One JSON line per discrepancy as it is found, then the totals
+    data_store = SQLiteDataStore(args.db)
+    reconciliation = ReconciliationModule(StockCountModule(store=data_store), ERPModule(store=data_store))
+    run = reconciliation.iter_reconciliation(args.transaction_id)
+    for discrepancy in run:
+        print(discrepancy.model_dump_json(exclude_none=True))
+    print(json.dumps({"transaction_id": args.transaction_id, **run.get_totals()}))
+    data_store.close()
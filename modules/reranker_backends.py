@@ -0,0 +1,150 @@
+# reranker_backends.py
+import json
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Cross-encoder used to rerank retrieved chunks
+RERANKER_MODEL = os.getenv("KNOWLEDGE_RERANKER_MODEL", "./Modal/ms-marco-MiniLM-L-6-v2")
+RERANKER_HUB_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Inference runtime: "torch" (default) or "onnx"; quantize selects int8 dynamic quantization
+RERANKER_RUNTIME = os.getenv("KNOWLEDGE_RERANKER_RUNTIME", "torch").lower()
+RERANKER_QUANTIZE = os.getenv("KNOWLEDGE_RERANKER_QUANTIZE", "false").lower() == "true"
+# ONNX file inside the model directory (defaults to onnx/model.onnx, or the int8 file when quantized)
+RERANKER_ONNX_FILE = os.getenv("KNOWLEDGE_RERANKER_ONNX_FILE", "")
+# Intra-op threads per reranker call (0 derives it from the CPU count, the rerank workers
+# and the worker processes sharing the host)
+RERANKER_THREADS = int(os.getenv("KNOWLEDGE_RERANKER_THREADS", "0"))
+# Worker processes on one host that each load a reranker (e.g. uvicorn/gunicorn workers)
+RERANKER_PROCESSES = int(os.getenv("KNOWLEDGE_RERANKER_PROCESSES", os.getenv("WEB_CONCURRENCY", "1")))
+
+DEFAULT_ONNX_FILE = "onnx/model.onnx"
+DEFAULT_QUANTIZED_ONNX_FILE = "onnx/model_qint8_avx512.onnx"
+
+
+def reranker_thread_count(workers: int = 1, threads: int = RERANKER_THREADS, processes: int = RERANKER_PROCESSES) -> int:
+    """
+    Threads each reranker call may use. By default the cores are split between the
+    concurrent rerank workers of every process on the host, so they do not oversubscribe the CPU.
+    """
+    if threads > 0:
+        return threads
+    return max(1, (os.cpu_count() or 1) // (max(1, workers) * max(1, processes)))
+
+
+class OnnxCrossEncoder:
+    """
+    Cross-encoder served by ONNX Runtime on CPU with an explicit thread pool.
+    Exposes the CrossEncoder.predict signature used by KnowledgeModule.
+    """
+
+    def __init__(self, model_path: str, file_name: str = DEFAULT_ONNX_FILE, num_threads: int = 1, max_length: int = 512):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.max_length = max_length
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_path, file_name), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.apply_sigmoid = self._uses_sigmoid(model_path)
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        scores: List[float] = []
+        pairs = list(pairs)
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            features = self.tokenizer(
+                [query for query, _ in batch],
+                [document for _, document in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            inputs = {name: features[name].astype(np.int64) for name in self.input_names if name in features}
+            logits = self.session.run(None, inputs)[0]
+            scores.extend(logits.reshape(len(batch), -1)[:, 0].tolist())
+        scores = np.asarray(scores, dtype=np.float32)
+        return 1.0 / (1.0 + np.exp(-scores)) if self.apply_sigmoid else scores
+
+    @staticmethod
+    def _uses_sigmoid(model_path: str) -> bool:
+        # Match CrossEncoder: the activation stored in the model config, else sigmoid for one label
+        try:
+            with open(os.path.join(model_path, "config.json"), "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            return False
+        activation = (config.get("sentence_transformers") or {}).get("activation_fn")
+        if activation:
+            return activation.endswith("Sigmoid")
+        return len(config.get("id2label") or {"0": None}) == 1
+
+
+def _resolve_model_path(model_name_or_path: str, runtime: str) -> str:
+    if os.path.exists(model_name_or_path):
+        return model_name_or_path
+    if runtime == "onnx":
+        # ONNX Runtime needs the files on disk; the hub repo ships exported ONNX weights
+        from huggingface_hub import snapshot_download
+
+        return snapshot_download(RERANKER_HUB_MODEL, allow_patterns=["*.json", "*.txt", "onnx/*"])
+    # Fallback to online model if local doesn't exist
+    return RERANKER_HUB_MODEL
+
+
+def create_reranker(
+    model_name_or_path: str = RERANKER_MODEL,
+    runtime: str = RERANKER_RUNTIME,
+    quantize: bool = RERANKER_QUANTIZE,
+    workers: int = 1,
+    threads: Optional[int] = None,
+):
+    """
+    Build the configured cross-encoder: PyTorch (optionally int8 dynamic-quantized)
+    or ONNX Runtime (optionally an int8 ONNX file), pinned to an explicit thread count
+    """
+    num_threads = threads or reranker_thread_count(workers)
+    model_path = _resolve_model_path(model_name_or_path, runtime)
+
+    if runtime == "onnx":
+        file_name = RERANKER_ONNX_FILE or (DEFAULT_QUANTIZED_ONNX_FILE if quantize else DEFAULT_ONNX_FILE)
+        if not RERANKER_ONNX_FILE and quantize and not os.path.exists(os.path.join(model_path, file_name)):
+            # Not quantized yet (see quantize_onnx_reranker); the float model still works
+            logging.warning(f"⚠️ {file_name} not found in {model_path}; loading {DEFAULT_ONNX_FILE}")
+            file_name = DEFAULT_ONNX_FILE
+        logging.info(f"✅ Loading ONNX reranker {file_name} with {num_threads} threads")
+        return OnnxCrossEncoder(model_path, file_name=file_name, num_threads=num_threads)
+
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    # torch's thread pool is process-wide; without this it grabs every core per process
+    torch.set_num_threads(num_threads)
+    encoder = CrossEncoder(model_path, device="cpu", trust_remote_code=True, revision="main")
+    if quantize:
+        encoder = torch.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+    logging.info(f"✅ Loading torch reranker{' (int8)' if quantize else ''} with {num_threads} threads")
+    return encoder
+
+
+def quantize_onnx_reranker(model_path: str, source_file: str = DEFAULT_ONNX_FILE, output_file: str = DEFAULT_QUANTIZED_ONNX_FILE) -> str:
+    """
+    Write an int8 dynamic-quantized copy of the ONNX reranker (requires the onnx package).
+    The default output is the file create_reranker loads for runtime="onnx", quantize=True.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output_path = os.path.join(model_path, output_file)
+    quantize_dynamic(os.path.join(model_path, source_file), output_path, weight_type=QuantType.QInt8)
+    return output_path
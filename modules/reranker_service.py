@@ -0,0 +1,278 @@
+# reranker_service.py
+import argparse
+import logging
+import os
+import queue
+import stat
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Unix socket of a shared reranker service; when set, KnowledgeModule sends rerank
+# requests there instead of loading its own cross-encoder in every worker process
+RERANKER_SOCKET = os.getenv("KNOWLEDGE_RERANKER_SOCKET", "")
+# Shared secret for the socket handshake, required on both ends. Messages are pickled, so
+# the HMAC challenge in both directions is what keeps another local user from serving or
+# sending payloads on the socket
+RERANKER_SOCKET_AUTHKEY = os.getenv("KNOWLEDGE_RERANKER_SOCKET_AUTHKEY", "")
+# Micro-batching: requests arriving within the wait window are scored in one predict call
+RERANKER_SERVICE_MAX_BATCH_PAIRS = int(os.getenv("KNOWLEDGE_RERANKER_SERVICE_MAX_BATCH_PAIRS", "256"))
+RERANKER_SERVICE_MAX_WAIT_MS = float(os.getenv("KNOWLEDGE_RERANKER_SERVICE_MAX_WAIT_MS", "5"))
+RERANKER_SERVICE_BATCH_SIZE = int(os.getenv("KNOWLEDGE_RERANKER_SERVICE_BATCH_SIZE", "32"))
+
+
+def _authkey(value: str) -> Optional[bytes]:
+    return value.encode("utf-8") if value else None
+
+
+def _require_authkey(authkey: Optional[bytes]) -> bytes:
+    if not authkey:
+        raise ValueError("The reranker service needs an authkey; set KNOWLEDGE_RERANKER_SOCKET_AUTHKEY on the service and every worker")
+    return authkey
+
+
+def default_socket_path() -> str:
+    """
+    Socket path inside a per-user runtime directory with mode 0700, created if missing
+    """
+    base = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    directory = os.path.join(base, f"knowledge-reranker-{os.getuid()}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    # A directory created first by another user, or left open, cannot be trusted
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) != 0o700:
+        raise PermissionError(f"{directory} must be a directory owned by the current user with mode 0700")
+    return os.path.join(directory, "reranker.sock")
+
+
+class _PendingRequest:
+    def __init__(self, pairs: List[Tuple[str, str]]):
+        self.pairs = pairs
+        self.result: Tuple[str, Any] = ("error", "not scored")
+        self.done = threading.Event()
+
+
+class RerankerService:
+    """
+    Holds one cross-encoder and serves rerank requests from every worker process
+    over a Unix socket. Requests from all connections are micro-batched into a
+    single predict call. Connections must authenticate with the shared authkey.
+    """
+
+    def __init__(
+        self,
+        encoder,
+        socket_path: str,
+        authkey: Optional[bytes] = None,
+        max_batch_pairs: int = RERANKER_SERVICE_MAX_BATCH_PAIRS,
+        max_wait_ms: float = RERANKER_SERVICE_MAX_WAIT_MS,
+        batch_size: int = RERANKER_SERVICE_BATCH_SIZE,
+    ):
+        self.encoder = encoder
+        self.socket_path = socket_path
+        self.authkey = _require_authkey(authkey)
+        self.max_batch_pairs = max_batch_pairs
+        self.max_wait = max_wait_ms / 1000
+        self.batch_size = batch_size
+        self.listener = None
+        self.ready = threading.Event()
+        self._requests: "queue.Queue[Optional[_PendingRequest]]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "batches": 0, "pairs": 0, "errors": 0}
+
+    def serve_forever(self):
+        """Accept connections until stop() is called"""
+        if os.path.exists(self.socket_path):
+            # Left behind by a previous run; Listener cannot bind over it
+            os.unlink(self.socket_path)
+        # Owner-only from the moment it is bound, rather than chmod after a window
+        previous_umask = os.umask(0o177)
+        try:
+            self.listener = Listener(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+        finally:
+            os.umask(previous_umask)
+        batcher = threading.Thread(target=self._batch_loop, name="reranker-batcher", daemon=True)
+        batcher.start()
+        logging.info(f"✅ Reranker service listening on {self.socket_path}")
+        self.ready.set()
+
+        while not self._stopped.is_set():
+            try:
+                connection = self.listener.accept()
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                logging.warning(f"⚠️ Reranker service rejected a connection: {str(e)}")
+                continue
+            threading.Thread(target=self._handle_connection, args=(connection,), daemon=True).start()
+
+        batcher.join()
+
+    def stop(self):
+        self._stopped.set()
+        self._requests.put(None)
+        if self.listener is not None:
+            # Closing the socket does not interrupt a blocked accept(); connect once to wake it
+            try:
+                Client(self.socket_path, family="AF_UNIX", authkey=self.authkey).close()
+            except Exception:
+                pass
+            self.listener.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["avg_batch_pairs"] = round(stats["pairs"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    def _handle_connection(self, connection):
+        with connection:
+            while not self._stopped.is_set():
+                try:
+                    pairs = connection.recv()
+                except (EOFError, OSError):
+                    return
+                request = _PendingRequest([(str(query), str(document)) for query, document in pairs])
+                if request.pairs:
+                    self._requests.put(request)
+                    request.done.wait()
+                else:
+                    # Empty request is a health check
+                    request.result = ("ok", [])
+                try:
+                    connection.send(request.result)
+                except OSError:
+                    return
+
+    def _batch_loop(self):
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+            batch = [first]
+            total_pairs = len(first.pairs)
+            deadline = time.monotonic() + self.max_wait
+            while total_pairs < self.max_batch_pairs:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._requests.put(None)
+                    break
+                batch.append(request)
+                total_pairs += len(request.pairs)
+            self._score_batch(batch)
+
+    def _score_batch(self, batch: List[_PendingRequest]):
+        pairs = [pair for request in batch for pair in request.pairs]
+        try:
+            scores = self.encoder.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            offset = 0
+            for request in batch:
+                request.result = ("ok", [float(score) for score in scores[offset:offset + len(request.pairs)]])
+                offset += len(request.pairs)
+        except Exception as e:
+            logging.error(f"❌ Reranker service failed to score {len(pairs)} pairs: {str(e)}")
+            for request in batch:
+                request.result = ("error", str(e))
+            with self._stats_lock:
+                self.stats["errors"] += 1
+        finally:
+            with self._stats_lock:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["pairs"] += len(pairs)
+            for request in batch:
+                request.done.set()
+
+
+class RerankerClient:
+    """
+    Client for RerankerService exposing the CrossEncoder.predict signature used by
+    KnowledgeModule. Each thread keeps its own connection.
+    """
+
+    def __init__(self, socket_path: str = RERANKER_SOCKET, authkey: Optional[bytes] = None):
+        self.socket_path = socket_path
+        # Defaults to KNOWLEDGE_RERANKER_SOCKET_AUTHKEY
+        self.authkey = _require_authkey(authkey or _authkey(RERANKER_SOCKET_AUTHKEY))
+        self._local = threading.local()
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        pairs = [(query, document) for query, document in pairs]
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        status, payload = self._request(pairs)
+        if status != "ok":
+            raise RuntimeError(f"Reranker service error: {payload}")
+        return np.asarray(payload, dtype=np.float32)
+
+    def ping(self) -> bool:
+        """Check that the service is reachable and accepts our authkey"""
+        try:
+            return self._request([])[0] == "ok"
+        except Exception:
+            return False
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _request(self, pairs: List[Tuple[str, str]]) -> Tuple[str, Any]:
+        # Retry once on a fresh connection so a service restart is transparent
+        for attempt in range(2):
+            try:
+                connection = self._connection()
+                connection.send(pairs)
+                return connection.recv()
+            except (EOFError, OSError):
+                self.close()
+                if attempt:
+                    raise
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = Client(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+            self._local.connection = connection
+        return connection
+
+
+if __name__ == "__main__":
+    from modules.reranker_backends import RERANKER_MODEL, RERANKER_QUANTIZE, RERANKER_RUNTIME, create_reranker
+
+    parser = argparse.ArgumentParser(description="Serve one shared cross-encoder to all knowledge workers")
+    parser.add_argument("--socket", default=RERANKER_SOCKET, help="Unix socket path (defaults to a private per-user runtime directory)")
+    parser.add_argument("--model", default=RERANKER_MODEL)
+    parser.add_argument("--runtime", default=RERANKER_RUNTIME, choices=["torch", "onnx"])
+    parser.add_argument("--quantize", action="store_true", default=RERANKER_QUANTIZE)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads (defaults to every core)")
+    parser.add_argument("--max-batch-pairs", type=int, default=RERANKER_SERVICE_MAX_BATCH_PAIRS)
+    parser.add_argument("--max-wait-ms", type=float, default=RERANKER_SERVICE_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Fail before loading the model when no authkey is configured
+    authkey = _require_authkey(_authkey(RERANKER_SOCKET_AUTHKEY))
+    service = RerankerService(
+        create_reranker(args.model, runtime=args.runtime, quantize=args.quantize, threads=args.threads),
+        args.socket or default_socket_path(),
+        authkey=authkey,
+        max_batch_pairs=args.max_batch_pairs,
+        max_wait_ms=args.max_wait_ms,
+    )
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        service.stop()
@@ -0,0 +1,135 @@
+# result_cache.py
+import copy
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from modules.embedding_cache import normalize_query
+from modules.lru_cache import LRUCache
+
+
+class CollectionVersion:
+    """
+    Version stamp for the knowledge collection.
+    Ingestion bumps it whenever chunks are written or deleted; with a path the stamp is
+    kept in a small file so other worker processes notice the change via a cheap stat().
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._version = 0
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+
+    def get(self) -> int:
+        if not self.path:
+            return self._version
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return self._version
+        if mtime_ns != self._mtime_ns:
+            with self._lock:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._version = int(f.read().strip() or 0)
+                    self._mtime_ns = mtime_ns
+                except (OSError, ValueError) as e:
+                    logging.warning(f"⚠️ Could not read collection version: {str(e)}")
+        return self._version
+
+    def bump(self) -> int:
+        """
+        Increment and persist the version; returns the new value
+        """
+        with self._lock:
+            version = self._version + 1
+            if self.path:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        version = int(f.read().strip() or 0) + 1
+                except (OSError, ValueError):
+                    pass
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(str(version))
+                os.replace(tmp_path, self.path)
+                self._mtime_ns = None
+            self._version = version
+            return version
+
+
+class ResultCache:
+    """
+    Bounded LRU cache for knowledge tool results.
+    Keys include the normalized query, the call parameters and the collection version,
+    so re-ingestion invalidates every cached result automatically.
+    """
+
+    def __init__(self, collection_version: CollectionVersion, max_entries: int = 512, ttl_seconds: Optional[float] = None):
+        self.collection_version = collection_version
+        self.cache = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._seen_version = None
+
+    def make_key(self, method: str, query: str, n_results: Optional[int] = None, previous_queries: Optional[Sequence[str]] = None) -> Hashable:
+        version = self.collection_version.get()
+        if version != self._seen_version:
+            # Entries for older versions can never hit again; free them
+            if self._seen_version is not None:
+                self.cache.clear()
+            self._seen_version = version
+        previous = tuple(normalize_query(text) for text in previous_queries) if previous_queries else ()
+        return (method, normalize_query(query), n_results, previous, version)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        result = self.cache.get(key)
+        return copy.deepcopy(result) if result is not None else None
+
+    def put(self, key: Hashable, result: Dict[str, Any]) -> None:
+        # Only successful results with documents are cached: search failures surface
+        # as empty results and must not be pinned until the next ingestion
+        if result.get("status") == "success" and (result.get("total_documents_found") or result.get("documents_found")):
+            self.cache.put(key, copy.deepcopy(result))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.cache.get_stats(), "collection_version": self.collection_version.get()}
+
+
+class ScoreCache:
+    """
+    Bounded LRU cache of cross-encoder scores keyed by (normalized query hash, chunk id).
+    Chunk ids are only stable within one collection version, so a version change
+    clears the cache.
+    """
+
+    def __init__(self, collection_version: CollectionVersion, max_entries: int = 20000, ttl_seconds: Optional[float] = None):
+        self.collection_version = collection_version
+        self.cache = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._seen_version = None
+
+    @staticmethod
+    def query_hash(query: str) -> str:
+        return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[Tuple[str, str]]) -> List[Optional[float]]:
+        """
+        Look up scores for (query_hash, chunk_id) keys; None marks a miss
+        """
+        self._check_version()
+        return [self.cache.get(key) for key in keys]
+
+    def put_many(self, keys: Sequence[Tuple[str, str]], scores: Sequence[float]) -> None:
+        for key, score in zip(keys, scores):
+            self.cache.put(key, float(score))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.cache.get_stats(), "collection_version": self.collection_version.get()}
+
+    def _check_version(self) -> None:
+        version = self.collection_version.get()
+        if version != self._seen_version:
+            if self._seen_version is not None:
+                self.cache.clear()
+            self._seen_version = version
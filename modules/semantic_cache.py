@@ -0,0 +1,133 @@
+# semantic_cache.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from modules.embedding_cache import normalize_query
+from modules.result_cache import CollectionVersion
+
+
+class SemanticCache:
+    """
+    Cache of past knowledge questions keyed by meaning rather than exact text.
+    Each entry keeps the query embedding with its retrieved context and (once the
+    knowledge agent has replied) its final answer. A lookup returns the most similar
+    entry whose cosine similarity reaches the threshold. Entries belong to one
+    collection version and are evicted by LRU and optional TTL.
+    """
+
+    def __init__(self, collection_version: CollectionVersion, threshold: float = 0.95, max_entries: int = 256, ttl_seconds: Optional[float] = None):
+        self.collection_version = collection_version
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._matrix = None
+        self._matrix_keys: List[str] = []
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, embedding: Sequence[float], field: str = "context") -> Optional[Dict[str, Any]]:
+        """
+        Return a copy of the closest entry that has `field` set, or None.
+        The copy carries the matched query and its similarity.
+        """
+        with self._lock:
+            self._check_version()
+            self._expire()
+            best_key, best_score = None, -1.0
+            if self._entries:
+                if self._matrix is None:
+                    self._rebuild_matrix()
+                scores = self._matrix @ self._normalize(embedding)
+                for index in np.argsort(-scores):
+                    key = self._matrix_keys[index]
+                    if scores[index] < self.threshold:
+                        break
+                    if self._entries[key].get(field) is not None:
+                        best_key, best_score = key, float(scores[index])
+                        break
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            return {
+                "query": entry["query"],
+                "similarity": round(best_score, 4),
+                field: copy.deepcopy(entry[field]),
+            }
+
+    def store(self, query: str, embedding: Sequence[float], context: Optional[Dict[str, Any]] = None, answer: Optional[str] = None) -> None:
+        """
+        Add or update the entry for query with its context and/or answer
+        """
+        key = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"query": query, "embedding": self._normalize(embedding), "context": None, "answer": None}
+                self._entries[key] = entry
+                self._matrix = None
+            if context is not None:
+                entry["context"] = copy.deepcopy(context)
+            if answer is not None:
+                entry["answer"] = answer
+            entry["created_at"] = time.time()
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._matrix = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _check_version(self) -> None:
+        version = self.collection_version.get()
+        if version != self._version:
+            # Context and answers from an older collection are stale
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _expire(self) -> None:
+        if self.ttl_seconds is None:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry["created_at"] < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _rebuild_matrix(self) -> None:
+        self._matrix_keys = list(self._entries)
+        self._matrix = np.stack([self._entries[key]["embedding"] for key in self._matrix_keys])
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -1,6 +1,21 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+import numpy as np
 from pydantic import BaseModel, Field
 
+from modules.transaction_table import TransactionTable
+
+# Column types of the in-memory columnar table
+STOCK_COUNT_COLUMNS = {
+    "transaction_id": str,
+    "item_code": str,
+    "item_desc": str,
+    "book_bulk": int,
+    "book_actual": int,
+    "float_book": int,
+    "float_actual": int,
+    "is_review_yn": str,
+}
+
 class StockCountItem(BaseModel):
     transaction_id: str = Field(..., description="Transaction ID")
     item_code: str = Field(..., description="Item Code")
@@ -18,8 +33,10 @@ class StockCountResponse(BaseModel):
     total_items: int = Field(0, description="Total number of items")
 
 class StockCountModule:
-    def __init__(self):
-        self.stockCountList = []
+    def __init__(self, store=None):
+        # Optional shared data store; the dummy records below are the in-memory fallback
+        self.store = store
+        records = []
         
         # Dummy data with multiple records per transaction ID
         # Transaction TXN001 - Multiple items
@@ -149,17 +166,48 @@ class StockCountModule:
         }
         
         # Add all records to the list
-        self.stockCountList.append(stock1)
-        self.stockCountList.append(stock2)
-        self.stockCountList.append(stock3)
-        self.stockCountList.append(stock4)
-        self.stockCountList.append(stock5)
-        self.stockCountList.append(stock6)
-        self.stockCountList.append(stock7)
-        self.stockCountList.append(stock8)
-        self.stockCountList.append(stock9)
-        self.stockCountList.append(stock10)
-        self.stockCountList.append(stock11)
+        records.append(stock1)
+        records.append(stock2)
+        records.append(stock3)
+        records.append(stock4)
+        records.append(stock5)
+        records.append(stock6)
+        records.append(stock7)
+        records.append(stock8)
+        records.append(stock9)
+        records.append(stock10)
+        records.append(stock11)
+
+        # Records grouped by transaction in contiguous column ranges; the table is the only
+        # copy, so bulk loads below are reflected in every lookup
+        self.table = TransactionTable(STOCK_COUNT_COLUMNS, unique=True)
+        self.table.load(records)
+
+    def load_stock_counts(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Bulk-load stock count records into the data store or the in-memory table; returns rows loaded
+        """
+        if self.store is not None:
+            return self.store.load_rows("stock_counts", records)["loaded"]
+        return self.table.load(records)
+
+    def get_transaction_columns(self, transaction_id: str) -> Dict[str, np.ndarray]:
+        """
+        Column arrays of one transaction's stock count records, sorted by item_code
+        """
+        if self.store is None:
+            return self.table.get_columns(transaction_id)
+        rows = TransactionTable(STOCK_COUNT_COLUMNS)
+        rows.load(self.store.get_stock_counts(transaction_id))
+        return rows.get_columns(transaction_id)
+
+    def iter_stock_counts(self, transaction_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream one transaction's stock count records in item_code order without loading them all
+        """
+        if self.store is None:
+            return self.table.iter_rows(transaction_id)
+        return self.store.iter_stock_counts(transaction_id)
 
     def get_stock_count_details(self, transaction_id: str) -> StockCountResponse:
         # Check if transaction_id is provided
@@ -172,10 +220,10 @@ class StockCountModule:
             )
         
         # Find all stock count records that match the transaction_id
-        matching_records = []
-        for stock in self.stockCountList:
-            if stock["transaction_id"] == transaction_id:
-                matching_records.append(stock)
+        if self.store is not None:
+            matching_records = self.store.get_stock_counts(transaction_id)
+        else:
+            matching_records = self.table.get_rows(transaction_id)
         
         # Return results based on number of matches
         if len(matching_records) == 0:
@@ -186,8 +234,11 @@ class StockCountModule:
                 total_items=0
             )
         else:
-            # Convert to Pydantic models
-            stock_count_items = [StockCountItem(**record) for record in matching_records]
+            # Convert to Pydantic models; table rows are already typed by their columns
+            if self.store is not None:
+                stock_count_items = [StockCountItem(**record) for record in matching_records]
+            else:
+                stock_count_items = [StockCountItem.model_construct(**record) for record in matching_records]
             return StockCountResponse(
                 status="success",
                 message=f"Found {len(stock_count_items)} stock count records for transaction {transaction_id}",
@@ -0,0 +1,156 @@
+# transaction_table.py
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class TransactionTable:
+    """
+    Columnar, array-backed rows grouped by transaction.
+    Rows are kept sorted by (transaction_id, item_code), so every transaction is one
+    contiguous row range; a transaction_id -> (start, end) index turns a lookup into
+    slicing O(items in the transaction) rows with no scan over the other transactions.
+    With unique=True a repeated (transaction_id, item_code) keeps its first loaded row.
+    """
+
+    def __init__(self, columns: Dict[str, type], key: str = "transaction_id", sort_key: str = "item_code", unique: bool = False):
+        # Column name -> int or str; ints are stored as int64, strings as fixed-width unicode
+        self.column_types = dict(columns)
+        self.key = key
+        self.sort_key = sort_key
+        self.unique = unique
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.array([], dtype=self._dtype(column_type)) for name, column_type in self.column_types.items()
+        }
+        self._ranges: Dict[str, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.columns[self.key])
+
+    @property
+    def transaction_ids(self) -> List[str]:
+        return list(self._ranges)
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Bulk-load record dicts alongside the rows already held; returns the number added
+        """
+        values: Dict[str, List[Any]] = {name: [] for name in self.column_types}
+        count = 0
+        for row in rows:
+            for name, column in values.items():
+                column.append(row.get(name))
+            count += 1
+        return self.load_columns(values) if count else 0
+
+    def load_columns(self, values: Dict[str, Iterable[Any]]) -> int:
+        """
+        Bulk-load column-wise data (lists or arrays of equal length). Only the new rows are
+        sorted; they are then merged into the already sorted table, so a load costs one pass
+        over the existing rows rather than a full re-sort. Returns the number of rows added.
+        """
+        added = {name: self._to_array(values[name], column_type) for name, column_type in self.column_types.items()}
+        if len({len(column) for column in added.values()}) > 1:
+            raise ValueError("All columns must have the same length")
+        # Stable sort: duplicate (transaction_id, item_code) rows keep their load order
+        order = np.lexsort((added[self.sort_key], added[self.key]))
+        added = {name: column[order] for name, column in added.items()}
+        positions = self._insert_positions(added[self.key], added[self.sort_key])
+        if self.unique:
+            keep = self._first_occurrences(added, positions)
+            added = {name: column[keep] for name, column in added.items()}
+            positions = positions[keep]
+        merged = {}
+        for name, column in self.columns.items():
+            # Widen fixed-width string columns first so longer new values are not truncated
+            column = column.astype(np.result_type(column, added[name]), copy=False)
+            merged[name] = np.insert(column, positions, added[name])
+        self.columns = merged
+        self._build_ranges()
+        return len(positions)
+
+    def _first_occurrences(self, added: Dict[str, np.ndarray], positions: np.ndarray) -> np.ndarray:
+        # New rows whose (key, sort_key) is neither held already nor repeated earlier in the load
+        keys, sort_keys = added[self.key], added[self.sort_key]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (sort_keys[1:] != sort_keys[:-1])
+        # An existing duplicate sits right before the new row's insert position
+        held = positions > 0
+        previous = np.maximum(positions - 1, 0)
+        if len(self):
+            held &= (self.columns[self.key][previous] == keys) & (self.columns[self.sort_key][previous] == sort_keys)
+        else:
+            held[:] = False
+        return keep & ~held
+
+    def _insert_positions(self, keys: np.ndarray, sort_keys: np.ndarray) -> np.ndarray:
+        """
+        Where each sorted new row goes in the existing rows: after every existing row with a
+        smaller or equal (key, sort_key), so existing duplicates stay ahead of new ones
+        """
+        positions = np.searchsorted(self.columns[self.key], keys, side="left")
+        for start, end in self._group_bounds(keys):
+            existing = self._ranges.get(keys[start].item())
+            if existing is not None:
+                # Transaction already held: place rows by item_code within its range
+                range_start, range_end = existing
+                positions[start:end] += np.searchsorted(self.columns[self.sort_key][range_start:range_end], sort_keys[start:end], side="right")
+        return positions
+
+    def get_range(self, transaction_id: str) -> Optional[Tuple[int, int]]:
+        return self._ranges.get(transaction_id)
+
+    def get_columns(self, transaction_id: str) -> Dict[str, np.ndarray]:
+        """
+        Array views of one transaction's rows, sorted by item_code; empty arrays if unknown
+        """
+        start, end = self._ranges.get(transaction_id, (0, 0))
+        return {name: column[start:end] for name, column in self.columns.items()}
+
+    def get_rows(self, transaction_id: str) -> List[Dict[str, Any]]:
+        """
+        One transaction's rows as record dicts with plain Python values, sorted by item_code
+        """
+        return list(self.iter_rows(transaction_id))
+
+    def iter_all_rows(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every row, transaction by transaction
+        """
+        for transaction_id in self.transaction_ids:
+            yield from self.iter_rows(transaction_id)
+
+    def iter_rows(self, transaction_id: str, batch_size: int = 1024) -> Iterator[Dict[str, Any]]:
+        """
+        Stream one transaction's rows, sorted by item_code, converting batch_size rows at a time
+        """
+        names = list(self.column_types)
+        columns = self.get_columns(transaction_id)
+        for start in range(0, len(columns[self.key]), batch_size):
+            for values in zip(*(columns[name][start:start + batch_size].tolist() for name in names)):
+                yield dict(zip(names, values))
+
+    def _build_ranges(self):
+        keys = self.columns[self.key]
+        self._ranges = {keys[start].item(): (start, end) for start, end in self._group_bounds(keys)}
+
+    @staticmethod
+    def _group_bounds(keys: np.ndarray) -> List[Tuple[int, int]]:
+        # (start, end) of each run of equal keys in a sorted array
+        if not len(keys):
+            return []
+        starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+        ends = np.append(starts[1:], len(keys))
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    @staticmethod
+    def _dtype(column_type: type):
+        return np.int64 if column_type is int else np.str_
+
+    @classmethod
+    def _to_array(cls, values: Iterable[Any], column_type: type) -> np.ndarray:
+        if isinstance(values, np.ndarray):
+            return values.astype(cls._dtype(column_type), copy=False)
+        if column_type is int:
+            return np.array([int(value) for value in values], dtype=np.int64)
+        return np.array(["" if value is None else str(value) for value in values], dtype=np.str_)
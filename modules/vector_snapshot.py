@@ -0,0 +1,226 @@
+# vector_snapshot.py
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from modules.result_cache import CollectionVersion
+
+# Rows scored per matrix product; bounds the float32 working set for float16 snapshots
+SEARCH_BLOCK_ROWS = 8192
+# Rows fetched per collection.get call while exporting
+EXPORT_PAGE_SIZE = 2000
+
+
+def collection_space(collection) -> str:
+    """
+    Distance function of a Chroma collection ("l2", "cosine" or "ip")
+    """
+    configuration = getattr(collection, "configuration", None) or {}
+    space = (configuration.get("hnsw") or {}).get("space") if isinstance(configuration, dict) else None
+    return (space or (collection.metadata or {}).get("hnsw:space") or "l2").lower()
+
+
+class _SnapshotData:
+    """
+    One exported snapshot: memory-mapped vectors plus documents stored as a UTF-8 blob
+    with offsets, so only the returned hits are decoded
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.signature = meta["signature"]
+        self.space = meta["space"]
+        self.ids = meta["ids"]
+        self.metadatas = meta["metadatas"]
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.squared_norms = np.load(os.path.join(directory, "squared_norms.npy"))
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.documents = np.memmap(os.path.join(directory, "documents.bin"), dtype=np.uint8, mode="r") if self.offsets[-1] else None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def document(self, row: int) -> Optional[str]:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        if self.documents is None or start == end:
+            return None
+        return bytes(self.documents[start:end]).decode("utf-8")
+
+    def distances(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Distances in the collection's own space, matching what collection.query returns
+        """
+        products = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            products[:, start:start + len(block)] = queries @ block.T
+        if self.space == "cosine":
+            query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            query_norms[query_norms == 0] = 1.0
+            norms = np.sqrt(self.squared_norms)
+            norms[norms == 0] = 1.0
+            return 1.0 - products / query_norms / norms
+        if self.space == "ip":
+            return 1.0 - products
+        # Chroma reports squared L2
+        return np.maximum(np.sum(queries * queries, axis=1, keepdims=True) + self.squared_norms - 2.0 * products, 0.0)
+
+    def search(self, query_embeddings: List[List[float]], n_results: int) -> List[List[Dict[str, Any]]]:
+        if not len(self):
+            return [[] for _ in query_embeddings]
+        distances = self.distances(np.asarray(query_embeddings, dtype=np.float32))
+        k = min(n_results, len(self))
+        hits = []
+        for row_distances in distances:
+            top = np.argpartition(row_distances, k - 1)[:k] if k < len(self) else np.arange(len(self))
+            top = top[np.argsort(row_distances[top], kind="stable")]
+            hits.append([
+                {
+                    "id": self.ids[row],
+                    "document": self.document(row),
+                    "distance": float(row_distances[row]),
+                    "metadata": self.metadatas[row] or {},
+                }
+                for row in top
+            ])
+        return hits
+
+
+class VectorSnapshot:
+    """
+    Flat NumPy copy of a small collection for brute-force top-k search.
+    The snapshot is exported to disk (float32 or float16 vectors, memory-mapped) and
+    tagged with the collection version and chunk count; it is rebuilt when either
+    changes, and other worker processes reuse the exported files.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        collection_version: CollectionVersion,
+        max_chunks: int = 50000,
+        dtype: str = "float32",
+        count_check_seconds: float = 30.0,
+    ):
+        self.path = path
+        self.collection_version = collection_version
+        self.max_chunks = max_chunks
+        self.dtype = np.dtype(dtype)
+        self.count_check_seconds = count_check_seconds
+        self.data: Optional[_SnapshotData] = None
+        self._count = None
+        self._count_version = None
+        self._count_checked_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"searches": 0, "rebuilds": 0, "loads": 0}
+
+    def search(self, collection, query_embeddings: List[List[float]], n_results: int) -> Optional[List[List[Dict[str, Any]]]]:
+        """
+        Top-k hits in collection.query's shape, or None when the collection is too
+        large for a flat scan (the caller then queries Chroma)
+        """
+        data = self._current(collection)
+        if data is None:
+            return None
+        self.stats["searches"] += 1
+        return data.search(query_embeddings, n_results)
+
+    def get_stats(self) -> Dict[str, Any]:
+        data = self.data
+        return {
+            **self.stats,
+            "chunks": len(data) if data is not None else 0,
+            "dtype": self.dtype.name,
+            "max_chunks": self.max_chunks,
+        }
+
+    def _current(self, collection) -> Optional[_SnapshotData]:
+        version = self.collection_version.get()
+        count = self._collection_count(collection, version)
+        if count > self.max_chunks:
+            return None
+        signature = {"collection": collection.name, "version": version, "count": count, "dtype": self.dtype.name}
+        data = self.data
+        if data is not None and data.signature == signature:
+            return data
+
+        with self._lock:
+            if self.data is not None and self.data.signature == signature:
+                return self.data
+            # Another worker may already have exported this version
+            data = self._load()
+            if data is not None and data.signature == signature:
+                self.stats["loads"] += 1
+            else:
+                data = self._export(collection, signature)
+                self.stats["rebuilds"] += 1
+            self.data = data
+            return data
+
+    def _collection_count(self, collection, version: int) -> int:
+        # count() is a database call: it is re-read when the version changes (ingestion)
+        # and periodically, to notice writers that do not bump the version
+        now = time.monotonic()
+        if self._count is None or version != self._count_version or now - self._count_checked_at >= self.count_check_seconds:
+            self._count = collection.count()
+            self._count_version = version
+            self._count_checked_at = now
+        return self._count
+
+    def _load(self) -> Optional[_SnapshotData]:
+        if not os.path.exists(os.path.join(self.path, "meta.json")):
+            return None
+        try:
+            return _SnapshotData(self.path)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"⚠️ Could not load vector snapshot: {str(e)}")
+            return None
+
+    def _export(self, collection, signature: Dict[str, Any]) -> _SnapshotData:
+        started = time.perf_counter()
+        ids, metadatas, documents, vectors = [], [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=EXPORT_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            metadatas.extend(page["metadatas"] or [None] * len(page["ids"]))
+            documents.extend(page["documents"] or [None] * len(page["ids"]))
+            vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+            offset += len(page["ids"])
+
+        matrix = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        encoded = [(document or "").encode("utf-8") for document in documents]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(document) for document in encoded])
+        stored = matrix.astype(self.dtype)
+
+        # Write to a temporary directory and swap it in, so readers never see a partial snapshot
+        tmp_path = f"{self.path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "vectors.npy"), stored)
+        # Norms of the stored (possibly float16) vectors keep L2 distances consistent
+        np.save(os.path.join(tmp_path, "squared_norms.npy"), np.sum(stored.astype(np.float32) ** 2, axis=1))
+        np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+        with open(os.path.join(tmp_path, "documents.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"signature": signature, "space": collection_space(collection), "ids": ids, "metadatas": metadatas}, f)
+
+        old_path = f"{self.path}.old-{os.getpid()}-{threading.get_ident()}"
+        if os.path.exists(self.path):
+            os.replace(self.path, old_path)
+        os.replace(tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        logging.info(f"✅ Exported vector snapshot of {len(ids)} chunks in {time.perf_counter() - started:.2f}s")
+        return _SnapshotData(self.path)
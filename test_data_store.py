@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared SQLite data store behind the data modules
+"""
+
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.data_store import SQLiteDataStore, seed_sample_data
+from modules.erp_module import ERPModule
+from modules.flight_module import FlightModule
+from modules.meal_order_module import MealOrderModule
+from modules.stock_count_module import StockCountModule
+
+
+def test_modules_answer_from_seeded_store():
+    """The modules return the same results from the store as from their built-in data"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteDataStore(os.path.join(directory, "data.sqlite3"))
+        stats = seed_sample_data(store)
+        assert stats["flights"]["loaded"] == 4 and stats["stock_counts"]["skipped"] == 0
+
+        flights = FlightModule(store=store)
+        assert flights.flightList == []
+        assert flights.get_flight_details("ek202", "21-Jun-2025") == FlightModule().get_flight_details("EK0202", "21-Jun-2025")
+        assert flights.get_flight_details("EK0202", "22-Jun-2025") == "Flight details not found"
+        assert flights.add_flight({"flightNo": "EK0202", "flightDate": "24-Jun-2025", "mflId": 7})
+        assert not flights.add_flight({"flightNo": "EK 202", "flightDate": "2025-06-24", "mflId": 8})
+        assert flights.get_next_flight("EK0202", "22-Jun-2025")["mflId"] == 7
+        assert flights.get_latest_flight("EK0202", "23-Jun-2025")["mflId"] == 1
+
+        meal_orders = MealOrderModule(store=store)
+        assert meal_orders.get_meal_order_details(4) == MealOrderModule().get_meal_order_details(4)
+        assert meal_orders.get_meal_order_details(99)["status"] == "error"
+
+        stock_counts = StockCountModule(store=store).get_stock_count_details("TXN001")
+        assert stock_counts == StockCountModule().get_stock_count_details("TXN001")
+        erp_items = ERPModule(store=store).get_erp_details("TXN002")
+        assert erp_items == ERPModule().get_erp_details("TXN002")
+        assert ERPModule(store=store).get_erp_details("TXN999").status == "error"
+        store.close()
+
+
+def test_bulk_load_uses_wal_and_indexes():
+    """CSV and JSONL files stream in; lookups are index searches and reads run concurrently"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "data.sqlite3")
+        store = SQLiteDataStore(path)
+
+        csv_path = os.path.join(directory, "flights.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("flightNo,flightDate,mflId,serviceType\n")
+            for day in range(1, 29):
+                f.write(f"EK0{day:03d},{day:02d}-Jul-2025,{1000 + day},J\n")
+            f.write(",01-Jul-2025,1,J\n")
+        assert store.load_file("flights", csv_path, batch_size=10) == {"loaded": 28, "skipped": 1}
+
+        jsonl_path = os.path.join(directory, "meal_orders.jsonl")
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            for day in range(1, 29):
+                f.write(json.dumps({"mflId": 1000 + day, "f": day, "j": 0, "w": 0, "y": 2 * day}) + "\n")
+        assert store.load_file("meal_orders", jsonl_path)["loaded"] == 28
+
+        with store._reader() as connection:
+            assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            plan = " ".join(
+                row[-1] for row in connection.execute(
+                    'EXPLAIN QUERY PLAN SELECT * FROM flights WHERE "flightNo" = ? AND flight_date_ordinal = ?', ("EK0001", 1)
+                )
+            )
+            assert "SEARCH" in plan and "SCAN" not in plan
+
+        flights = FlightModule(store=store)
+        meal_orders = MealOrderModule(store=store)
+
+        def lookup(day):
+            flight = flights.get_flight_details(f"EK{day}", f"{day:02d}-Jul-2025")
+            return meal_orders.get_meal_order_details(flight["mflId"])["data"][3]["quantity"]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert list(executor.map(lookup, range(1, 29))) == [2 * day for day in range(1, 29)]
+        assert store.count("flights") == 28
+        store.close()
+
+
+def test_blank_fields_take_defaults_or_reject_the_row():
+    """Blank text fields load as empty strings; rows with a blank quantity are skipped"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteDataStore(os.path.join(directory, "data.sqlite3"))
+        csv_path = os.path.join(directory, "stock_counts.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("transaction_id,item_code,item_desc,book_bulk,book_actual,float_book,float_actual,is_review_yn\n")
+            f.write("TXN100,ITEM001,,10,9,5,5,\n")
+            f.write("TXN100,ITEM002,Rice,,9,5,5,N\n")
+        assert store.load_file("stock_counts", csv_path) == {"loaded": 1, "skipped": 1}
+
+        response = StockCountModule(store=store).get_stock_count_details("TXN100")
+        assert response.status == "success" and response.data[0].item_desc == "" and response.data[0].is_review_yn == ""
+        store.close()
+
+
+def test_duplicate_rows_keep_the_first_record_in_both_backends():
+    """A repeated (transaction_id, item_code) keeps its first record in the store and in memory"""
+    def record(item_code, book_bulk):
+        return {"transaction_id": "TXN200", "item_code": item_code, "item_desc": "Item", "book_bulk": book_bulk,
+                "book_actual": 5, "float_book": 0, "float_actual": 0, "is_review_yn": "N"}
+
+    first_load = [record("ITEM002", 1), record("ITEM001", 2), record("ITEM002", 3)]
+    second_load = [record("ITEM001", 4), record("ITEM003", 5)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteDataStore(os.path.join(directory, "data.sqlite3"))
+        backends = [StockCountModule(store=store), StockCountModule()]
+        for module in backends:
+            assert module.load_stock_counts(first_load) == 2
+            assert module.load_stock_counts(second_load) == 1
+        from_store, in_memory = (module.get_stock_count_details("TXN200") for module in backends)
+        assert from_store == in_memory
+        assert [(item.item_code, item.book_bulk) for item in in_memory.data] == [("ITEM001", 2), ("ITEM002", 1), ("ITEM003", 5)]
+
+        erp_store, erp_memory = ERPModule(store=store), ERPModule()
+        for module in (erp_store, erp_memory):
+            module.load_erp_items(first_load + second_load)
+        assert erp_store.get_erp_details("TXN200") == erp_memory.get_erp_details("TXN200")
+        assert store.load_rows("stock_counts", first_load) == {"loaded": 0, "skipped": 3}
+        store.close()
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for the indexed flight lookups in FlightModule
+"""
+
+from datetime import date
+
+from modules.flight_module import FlightModule, flight_date_ordinal, normalize_flight_no
+
+LEGS = [
+    {"flightNo": "EK0202", "flightDate": "25-Jun-2025", "mflId": 12},
+    {"flightNo": "EK0202", "flightDate": "21-Jun-2025", "mflId": 11},
+    {"flightNo": "EK0202", "flightDate": "28-Jun-2025", "mflId": 13},
+    {"flightNo": "EK0203", "flightDate": "20-Jun-2025", "mflId": 2},
+]
+
+
+def test_lookup_normalizes_flight_number_and_date():
+    """Lookups match regardless of case, padding and accepted date formats"""
+    module = FlightModule(LEGS)
+
+    assert normalize_flight_no("ek 202") == "EK0202"
+    assert flight_date_ordinal("21-jun-2025") == date(2025, 6, 21).toordinal()
+    assert module.get_flight_details("EK202", "21-JUN-2025")["mflId"] == 11
+    assert module.get_flight_details("EK0202", "2025-06-25")["mflId"] == 12
+    assert module.get_flight_details("EK0202", "22-Jun-2025") == "Flight details not found"
+    assert module.get_flight_details("EK0202", "31-Jun-2025") == "Please provide flightDate in DD-MMM-YYYY format"
+    assert module.get_flight_details("", "21-Jun-2025") == "Please provide flightNo"
+
+
+def test_next_and_latest_leg_follow_date_order():
+    """Legs are ordered by date however they were loaded or added"""
+    module = FlightModule(LEGS)
+    module.add_flight({"flightNo": "EK0202", "flightDate": "23-Jun-2025", "mflId": 14})
+    module.load_flights([{"flightNo": "EK0202", "flightDate": "30-Jun-2025", "mflId": 15}])
+
+    assert module.get_next_flight("EK0202", "22-Jun-2025")["mflId"] == 14
+    assert module.get_next_flight("EK0202", "25-Jun-2025")["mflId"] == 12
+    assert module.get_next_flight("EK0202", "01-Jul-2025") is None
+    assert module.get_latest_flight("EK0202", "27-Jun-2025")["mflId"] == 12
+    assert module.get_latest_flight("EK0202", "20-Jun-2025") is None
+    assert module.get_latest_flight("EK0202")["mflId"] == 15
+    # Without a date: the next leg from today, else the most recent one
+    assert module.get_flight_details("EK0202", "")["mflId"] == 15
+    assert not module.add_flight({"flightNo": "ek0202", "flightDate": "23-jun-2025", "mflId": 99})
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,918 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the knowledge retrieval pipeline
+Uses an in-memory ChromaDB collection with a deterministic fake embedder and reranker,
+so no Azure / HuggingFace access is required
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import stat
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+import chromadb
+import numpy as np
+
+from modules.context_packer import estimate_tokens, pack_context, stitch_sections
+from modules.embedding_backends import check_collection_compatibility
+from modules.embedding_cache import EmbeddingCache
+from modules.embedding_coalescer import EmbeddingCoalescer
+from modules.knowledge_ingestion import KnowledgeIngestion, iter_chunks, iter_parent_child_chunks
+from modules.keyword_search import ChromaKeywordSearch, is_lexical_query, keyword_terms, reciprocal_rank_fusion
+from modules.knowledge_module import KnowledgeModule
+from modules import reranker_backends
+from modules.reranker_backends import DEFAULT_ONNX_FILE, DEFAULT_QUANTIZED_ONNX_FILE, OnnxCrossEncoder
+from modules.reranker_service import RerankerClient, RerankerService, default_socket_path
+from modules.result_cache import CollectionVersion, ResultCache, ScoreCache
+from modules.semantic_cache import SemanticCache
+from modules.vector_snapshot import VectorSnapshot
+
+DOCUMENTS = [
+    "Stock count approval requires the reviewer to compare book quantities with ERP data.",
+    "Meal orders are allowed only for passenger flights with service type P.",
+    "Cargo flights carry freight and meal orders cannot be placed.",
+    "The FF status marks a flight as finalised for catering uplift.",
+    "Inventory management alerts you on low stock and generates purchase orders.",
+    "Customers can place catering orders online and pay with cards or wallets.",
+]
+
+
+def _tokens(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class FakeEmbeddings:
+    """Deterministic bag-of-words embedder that counts calls"""
+
+    def __init__(self, dimensions=64):
+        self.dimensions = dimensions
+        self.calls = []
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for token in _tokens(text):
+            bucket = int(hashlib.md5(token.encode()).hexdigest(), 16) % self.dimensions
+            vector[bucket] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeEncoder:
+    """Word-overlap cross-encoder stand-in that counts calls"""
+
+    def __init__(self):
+        self.predict_calls = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.predict_calls.append(len(pairs))
+        return [
+            float(len(set(_tokens(query)) & set(_tokens(document))))
+            for query, document in pairs
+        ]
+
+
+def build_test_module():
+    """Create a KnowledgeModule backed by fakes and an in-memory collection"""
+    module = KnowledgeModule(warm_up=False)
+
+    embeddings = FakeEmbeddings()
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection(name=f"test_{uuid.uuid4().hex}")
+    collection.add(
+        ids=[f"doc-{i}" for i in range(len(DOCUMENTS))],
+        documents=DOCUMENTS,
+        embeddings=embeddings.embed_documents(DOCUMENTS),
+    )
+    embeddings.calls.clear()
+
+    module.chroma_client = client
+    module.collection = collection
+    module.embeddings = embeddings
+    module.embedding_model_key = "fake:test"
+    module.encoder_model = FakeEncoder()
+    # Predict-call counts in the batching tests assume every candidate is reranked
+    module.adaptive_rerank = False
+    module.embedding_cache = EmbeddingCache(model_key="fake:test")
+    module.keyword_search = ChromaKeywordSearch(collection)
+    module.collection_version = CollectionVersion()
+    module.result_cache = ResultCache(module.collection_version)
+    module.score_cache = ScoreCache(module.collection_version)
+    module.semantic_cache = SemanticCache(module.collection_version, threshold=0.8)
+    # Searches go through ChromaDB unless a test opts into the flat snapshot
+    module.vector_snapshot = None
+    module.ready.set()
+    return module
+
+
+def test_initialization_failure_is_reported_as_an_error():
+    """A broken backend returns an error status instead of an empty knowledge base"""
+    module = KnowledgeModule(warm_up=False)
+
+    def fail():
+        raise RuntimeError("ChromaDB path not found")
+
+    module._initialize_components = fail
+
+    async def run_async():
+        return await asyncio.gather(
+            module.get_knowledge_context_async("meal orders"),
+            module.search_specific_topic_async("cargo flights"),
+            module.get_knowledge_documents_async(["doc-0"]),
+        )
+
+    results = [module.get_knowledge_context("meal orders"), module.search_specific_topic("cargo flights")]
+    results += asyncio.run(run_async())
+    assert [result["status"] for result in results] == ["error"] * 5
+    assert all(result["error"] == "ChromaDB path not found" for result in results)
+    assert module.init_error == "ChromaDB path not found" and not module.is_ready()
+
+
+def test_search_vector_store_batch_single_round_trip():
+    """All sub-queries are embedded with one call and split back per query"""
+    module = build_test_module()
+    queries = ["meal orders passenger flights", "stock count approval"]
+
+    results = module.search_vector_store_batch(queries, n_results=2)
+
+    assert len(module.embeddings.calls) == 1
+    assert module.embeddings.calls[0] == queries
+    assert len(results) == 2
+    assert results[0][0] == DOCUMENTS[1]
+    assert results[1][0] == DOCUMENTS[0]
+
+
+def test_get_knowledge_context_uses_batched_search():
+    """A multi-part question costs a single embedding round trip"""
+    module = build_test_module()
+
+    result = module.get_knowledge_context(
+        "meal orders for passenger flights and stock count approval",
+        previous_queries=["cargo flights"],
+    )
+
+    assert result["status"] == "success"
+    assert len(module.embeddings.calls) == 1
+    assert len(module.encoder_model.predict_calls) == 1
+    assert set(result["query_results"]) <= set(result["all_queries_processed"])
+    assert DOCUMENTS[0] in result["combined_context"]
+
+
+def test_semantic_cache_embeds_full_query_with_sub_queries():
+    """With the semantic cache on, a decomposed question still costs one embedding call"""
+    module = build_test_module()
+    question = "meal orders for passenger flights and stock count approval"
+
+    result = module.get_knowledge_context(question)
+    assert result["status"] == "success" and len(result["decomposed_queries"]) == 2
+    assert module.embeddings.calls == [[question] + result["decomposed_queries"]]
+
+    async_module = build_test_module()
+    asyncio.run(async_module.get_knowledge_context_async(question))
+    assert len(async_module.embeddings.calls) == 1
+
+
+def test_rerank_documents_batch_slices_scores_per_query():
+    """Scores from one batched predict call are split back to each query"""
+    module = build_test_module()
+    module.rerank_batch_size = 2
+
+    results = module.rerank_documents_batch([
+        ("cargo flights freight", [DOCUMENTS[0], DOCUMENTS[2]]),
+        ("low stock purchase orders", [DOCUMENTS[3], DOCUMENTS[1], DOCUMENTS[4]]),
+    ], top_k=1)
+
+    assert module.encoder_model.predict_calls == [5]
+    assert results[0] == (DOCUMENTS[2] + "\n\n", [1])
+    assert results[1] == (DOCUMENTS[4] + "\n\n", [2])
+
+
+def test_get_knowledge_context_deduplicates_chunks():
+    """Chunks retrieved by overlapping sub-queries are reranked and packed once"""
+    module = build_test_module()
+
+    result = module.get_knowledge_context("meal orders for flights, meal orders and cargo flights")
+
+    documents = [doc for entry in result["query_results"].values() for doc in entry["documents"]]
+    assert len(documents) == len(set(documents)) == result["total_documents_found"]
+    assert module.encoder_model.predict_calls == [len(documents)]
+    for document in DOCUMENTS:
+        assert result["combined_context"].count(document) <= 1
+
+
+def test_pack_context_respects_token_budget_and_mmr():
+    """The packer stays within budget and MMR prefers diverse chunks"""
+    chunks = [
+        {"id": "a", "document": "meal orders for passenger flights only", "score": 3.0},
+        {"id": "b", "document": "meal orders for passenger flights only please", "score": 2.9},
+        {"id": "c", "document": "stock count approval workflow", "score": 2.0},
+    ]
+
+    greedy = pack_context(chunks, token_budget=20)
+    assert [chunk["id"] for chunk in greedy] == ["a", "b"]
+    assert sum(estimate_tokens(chunk["document"]) for chunk in greedy) <= 20
+
+    diverse = pack_context(chunks, token_budget=20, mmr_lambda=0.3)
+    assert [chunk["id"] for chunk in diverse] == ["a", "c"]
+
+    truncated = pack_context(chunks, token_budget=2)
+    assert truncated[0]["id"] == "a" and len(truncated[0]["document"]) == 8
+
+
+def test_async_pipeline_matches_sync_results():
+    """Concurrent async calls return the same context as the sync pipeline"""
+    module = build_test_module()
+    question = "meal orders for passenger flights and stock count approval"
+    expected = module.get_knowledge_context(question)
+    expected_topic = module.search_specific_topic("cargo flights")
+
+    async def run_concurrently():
+        return await asyncio.gather(
+            module.get_knowledge_context_async(question),
+            module.search_specific_topic_async("cargo flights"),
+        )
+
+    context, topic = asyncio.run(run_concurrently())
+    assert context == expected
+    assert topic == expected_topic
+
+    # Packing fetches parent sections from ChromaDB, which must not block the event loop
+    packing_threads = []
+    build_context_result = module._build_context_result
+    module._build_context_result = lambda *args: packing_threads.append(threading.current_thread()) or build_context_result(*args)
+    module.collection_version.bump()
+    module.semantic_cache.clear()
+    assert asyncio.run(module.get_knowledge_context_async(question)) == expected
+    assert packing_threads and threading.main_thread() not in packing_threads
+
+
+def test_components_load_lazily_with_background_warm_up():
+    """Construction is cheap; warm_up loads components once and flips readiness"""
+    module = KnowledgeModule(warm_up=False)
+    assert not module.is_ready()
+    assert module.collection is None
+
+    calls = []
+
+    def fake_initialize():
+        calls.append(1)
+        module.collection = object()
+
+    module._initialize_components = fake_initialize
+    module.warm_up().join(timeout=5)
+    module.warm_up(background=False)
+
+    assert module.is_ready()
+    assert calls == [1]
+
+
+def test_embedding_cache_skips_repeated_queries():
+    """Previous queries resent on a follow-up turn are not embedded again"""
+    module = build_test_module()
+
+    module.get_knowledge_context("cargo flights", previous_queries=["meal orders"])
+    module.get_knowledge_context("FF status", previous_queries=["Cargo  flights", "meal orders"])
+
+    assert module.embeddings.calls[1] == ["FF status"]
+    stats = module.get_cache_stats()["embedding_cache"]
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+
+
+def test_embedding_cache_disk_tier_survives_restart():
+    """Vectors written to the SQLite tier are served by a fresh cache instance"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "embeddings.sqlite3")
+        EmbeddingCache(model_key="fake:v1", path=path).put_many(["stock count"], [[0.5, 0.25]])
+
+        restarted = EmbeddingCache(model_key="fake:v1", path=path)
+        assert restarted.get_many(["Stock Count"]) == [[0.5, 0.25]]
+        assert restarted.get_stats()["disk_hits"] == 1
+
+        other_model = EmbeddingCache(model_key="fake:v2", path=path)
+        assert other_model.get_many(["stock count"]) == [None]
+
+
+def test_hybrid_mode_keyword_fast_path_skips_embedding():
+    """Lexical lookups are answered by keyword search without an embedding call"""
+    module = build_test_module()
+    module.retrieval_mode = "hybrid"
+
+    assert is_lexical_query("FF status")
+    assert not is_lexical_query("how do meal orders work for cargo flights")
+
+    hits = module.query_collection(["FF status"], n_results=3)[0]
+    assert hits[0]["id"] == "doc-3"
+    assert module.embeddings.calls == []
+
+    hits = module.query_collection(["which flights allow meal orders"], n_results=3)[0]
+    assert len(module.embeddings.calls) == 1
+    assert hits[0]["id"] == "doc-1"
+    assert hits[0]["distance"] is not None
+
+
+def test_keyword_search_uses_chroma_fts_index():
+    """A persistent collection is searched through Chroma's FTS5 table with BM25 ranking"""
+    embeddings = FakeEmbeddings()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = chromadb.PersistentClient(path=tmp_dir)
+        collection = client.create_collection(name="rag_collection")
+        collection.add(
+            ids=[f"doc-{i}" for i in range(len(DOCUMENTS))],
+            documents=DOCUMENTS,
+            embeddings=embeddings.embed_documents(DOCUMENTS),
+        )
+        search = ChromaKeywordSearch(collection, sqlite_path=os.path.join(tmp_dir, "chroma.sqlite3"))
+        assert search.sqlite_path is not None
+
+        hits = search.search(["cargo freight", "purchase orders"], n_results=2)
+
+    assert hits[0][0]["id"] == "doc-2"
+    assert hits[1][0]["id"] == "doc-4"
+    assert hits[0][0]["keyword_score"] > 0
+
+
+def test_keyword_search_finds_short_hyphenated_codes():
+    """Codes whose parts are under 3 characters are searched as one substring"""
+    documents = DOCUMENTS + ["Form CX-12 records a bonded store transfer.", "Status FF-01 marks a flight as final."]
+    embeddings = FakeEmbeddings()
+    assert keyword_terms("CX-12") == ["CX-12"]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = chromadb.PersistentClient(path=tmp_dir)
+        collection = client.create_collection(name="rag_collection")
+        collection.add(ids=[f"doc-{i}" for i in range(len(documents))], documents=documents, embeddings=embeddings.embed_documents(documents))
+        fts_hits = ChromaKeywordSearch(collection, sqlite_path=os.path.join(tmp_dir, "chroma.sqlite3")).search(["CX-12", "what is ff-01?"])
+        fallback_hits = ChromaKeywordSearch(collection).search(["CX-12"])
+
+    assert [hit["id"] for hit in fts_hits[0]] == ["doc-6"]
+    assert [hit["id"] for hit in fts_hits[1]] == ["doc-7"]
+    assert [hit["id"] for hit in fallback_hits[0]] == ["doc-6"]
+
+
+def test_reciprocal_rank_fusion_merges_by_id():
+    """Hits found by both retrievers rise to the top and keep their vector distance"""
+    vector = [{"id": "a", "distance": 0.1}, {"id": "b", "distance": 0.2}]
+    keyword = [{"id": "b", "distance": None}, {"id": "c", "distance": None}]
+
+    merged = reciprocal_rank_fusion([vector, keyword], n_results=3)
+
+    assert [hit["id"] for hit in merged] == ["b", "a", "c"]
+    assert merged[0]["distance"] == 0.2
+
+
+def test_result_cache_serves_repeats_until_version_bump():
+    """Repeat questions skip the pipeline; ingestion's version bump invalidates them"""
+    module = build_test_module()
+    question = "How are meal orders handled for cargo flights?"
+
+    first = module.get_knowledge_context(question)
+    repeat = module.get_knowledge_context("how are meal orders handled for  cargo flights?")
+    assert repeat == first
+    assert len(module.embeddings.calls) == 1
+    assert len(module.encoder_model.predict_calls) == 1
+
+    module.search_specific_topic("cargo flights", n_results=2)
+    module.search_specific_topic("cargo flights", n_results=3)
+    assert module.get_cache_stats()["result_cache"]["hits"] == 1
+
+    module.bump_collection_version()
+    module.get_knowledge_context(question)
+    assert len(module.encoder_model.predict_calls) == 4
+    assert module.get_cache_stats()["result_cache"]["collection_version"] == 1
+
+
+def test_rerank_score_cache_scores_only_new_pairs():
+    """Repeated (query, chunk) pairs are served from the score cache"""
+    module = build_test_module()
+    module.result_cache = None
+
+    module.search_specific_topic("meal orders for cargo flights", n_results=2)
+    module.search_specific_topic("Meal orders for  cargo flights", n_results=4)
+    assert module.encoder_model.predict_calls == [2, 2]
+
+    module.search_specific_topic("meal orders for cargo flights", n_results=4)
+    assert module.encoder_model.predict_calls == [2, 2]
+    stats = module.get_cache_stats()["score_cache"]
+    assert stats["hits"] == 6 and stats["misses"] == 4
+
+    module.bump_collection_version()
+    module.search_specific_topic("meal orders for cargo flights", n_results=2)
+    assert module.encoder_model.predict_calls == [2, 2, 2]
+
+
+def test_adaptive_rerank_skips_decisive_and_small_candidate_lists():
+    """The cross-encoder only sees candidates that can still change the top results"""
+    module = build_test_module()
+    module.adaptive_rerank = True
+    module.rerank_distance_margin = 0.1
+
+    def hits(*distances):
+        return [{"id": f"doc-{i}", "document": DOCUMENTS[i], "distance": d} for i, d in enumerate(distances)]
+
+    assert module._rerank_plan(hits(0.2, 0.3, 0.4), 3) == ("skipped_few_candidates", [])
+    assert module._rerank_plan(hits(0.1, 0.5, 0.52, 0.55, 0.6), 3) == ("skipped_decisive", [])
+    assert module._rerank_plan(hits(0.3, 0.32, 0.35, 0.38, 0.6, 0.9), 3) == ("shortened", [0, 1, 2, 3])
+    assert module._rerank_plan(hits(0.3, 0.32, 0.35, 0.38, 0.39), 3)[0] == "full"
+    assert module._rerank_plan(hits(0.3, None, 0.35, 0.38, 0.9), 3)[0] == "full"
+
+    scores = module._score_found([("cargo flights freight", hits(0.3, 0.32, 0.35, 0.38, 0.6, 0.9))])[0]
+    assert module.encoder_model.predict_calls == [4]
+    assert scores[4] < min(scores[:4]) and scores[5] < scores[4]
+
+    module.search_specific_topic("cargo flights", n_results=2)
+    stats = module.get_rerank_stats()
+    assert stats["shortened"] == 1 and stats["skipped_few_candidates"] == 1
+    assert stats["pairs_skipped"] == 4 and stats["skip_rate"] == 0.5
+    assert len(module.encoder_model.predict_calls) == 1
+
+
+def test_scores_share_one_scale_across_sub_queries():
+    """A strong sub-query outranks a weak one; hits that skipped the reranker rank below both"""
+    module = build_test_module()
+    module.adaptive_rerank = True
+    module.rerank_distance_margin = 0.1
+    module.context_mmr_lambda = None
+
+    def hits(first, *distances):
+        return [{"id": f"doc-{first + n}", "document": DOCUMENTS[first + n], "distance": d} for n, d in enumerate(distances)]
+
+    found = [
+        ("strong", hits(0, 0.2, 0.21, 0.22, 0.23)),
+        ("weak", hits(2, 0.2, 0.21, 0.22, 0.23)),
+        # Decisive vector winner: not reranked
+        ("skipped", hits(1, 0.05, 0.5, 0.55, 0.6)),
+    ]
+    logits = {"strong": [5.0, 3.0, 2.0, 1.0], "weak": [-6.0, -9.0, -9.5, -10.0]}
+    module.score_documents_batch = lambda query_documents, chunk_ids: [logits.get(query, []) for query, _ in query_documents]
+    all_scores = module._score_found(found)
+
+    sigmoid = lambda logit: 1 / (1 + math.exp(-logit))
+    assert all_scores[0][0] == sigmoid(5.0) and all_scores[1][0] == sigmoid(-6.0)
+    reranked = [score for scores in all_scores[:2] for score in scores]
+    assert max(all_scores[2]) < min(reranked)
+    assert all_scores[2] == sorted(all_scores[2], reverse=True)
+
+    module.context_token_budget = 10000
+    queries = [query for query, _ in found]
+    result = module._build_context_result("q", queries, queries, found, all_scores, 8)
+    scores = [chunk["score"] for chunk in result["chunks"]]
+    assert scores == sorted(scores, reverse=True)
+    assert result["chunks"][0]["id"] == "doc-0" and scores[0] > 0.99 and scores[3] < 0.01
+
+
+def test_compact_response_references_chunks_for_lookup():
+    """Compact tool output carries chunk references instead of repeating every document"""
+    module = build_test_module()
+    module.semantic_cache = None
+    question = "meal orders for passenger flights and stock count approval"
+
+    full = module.get_knowledge_context(question)
+    compact = module.format_context_response(full)
+    assert "query_results" not in compact
+    assert compact["combined_context"] == full["combined_context"]
+    assert len(str(compact)) < len(str(full))
+    ids = [chunk["id"] for chunk in compact["chunks"]]
+    assert ids and all(set(chunk) >= {"id", "score"} for chunk in compact["chunks"])
+
+    lookup = module.get_knowledge_documents(ids + ["missing"])
+    assert [doc["id"] for doc in lookup["documents"]] == ids
+    assert all(doc["document"] in full["combined_context"] for doc in lookup["documents"])
+    assert lookup["missing_ids"] == ["missing"]
+
+    topic = module.format_topic_response(module.search_specific_topic("cargo flights"))
+    assert "document_ids" not in topic and topic["chunks"][0]["id"].startswith("doc-")
+
+    module.response_mode = "full"
+    assert module.format_context_response(full) is full
+
+
+def test_semantic_cache_reuses_context_and_answers_for_paraphrases():
+    """Paraphrased questions skip retrieval and generation until the collection changes"""
+    module = build_test_module()
+    question = "How are meal orders handled for cargo flights?"
+
+    first = module.get_knowledge_context(question)
+    paraphrase = module.get_knowledge_context("meal orders handled for cargo flights")
+    assert paraphrase["semantic_cache_hit"]["matched_query"] == question
+    assert paraphrase["combined_context"] == first["combined_context"]
+    assert len(module.encoder_model.predict_calls) == 1
+
+    module.get_knowledge_context("Which flights are finalised for catering uplift?")
+    assert len(module.encoder_model.predict_calls) == 2
+
+    async def answer_flow():
+        assert await module.lookup_semantic_answer(question) is None
+        await module.remember_semantic_answer(question, "Cargo flights cannot order meals.")
+        return await module.lookup_semantic_answer("meal orders handled for cargo flights")
+
+    assert asyncio.run(answer_flow())["answer"] == "Cargo flights cannot order meals."
+
+    module.bump_collection_version()
+    assert asyncio.run(module.lookup_semantic_answer(question)) is None
+    assert module.get_cache_stats()["semantic_cache"]["size"] == 0
+
+
+def test_embedding_coalescer_batches_concurrent_sessions():
+    """Concurrent sessions share batched embedding calls, each capped in size"""
+    module = build_test_module()
+    in_flight = []
+    queries = ["meal orders", "stock count", "cargo flights", "purchase orders", "catering uplift", "low stock"]
+
+    def embed(texts):
+        in_flight.append(texts)
+        assert len(in_flight) == 1
+        try:
+            if texts == ["warm up"]:
+                # Keep the only slot busy until every session has queued its request
+                while module.embedding_coalescer.get_stats()["requests"] < len(queries) + 1:
+                    time.sleep(0.001)
+            return module.embeddings.embed_documents(texts)
+        finally:
+            in_flight.pop()
+
+    module.embedding_coalescer = EmbeddingCoalescer(embed, max_wait_ms=100, max_batch_size=4, max_concurrency=1)
+
+    async def sessions():
+        return await asyncio.gather(*(module.embed_queries_async([query]) for query in queries))
+
+    # Nothing else is queued or in flight, so the warm-up request goes out alone at once
+    warm_up = threading.Thread(target=module.embedding_coalescer.embed, args=(["warm up"],))
+    warm_up.start()
+    while not in_flight:
+        time.sleep(0.001)
+    results = asyncio.run(sessions())
+    warm_up.join()
+    assert [vectors[0] for vectors in results] == [module.embeddings._embed(query) for query in queries]
+    # Requests queued behind the busy slot share capped batches
+    assert [len(call) for call in module.embeddings.calls] == [1, 4, 2]
+    assert sorted(text for call in module.embeddings.calls[1:] for text in call) == sorted(queries)
+    assert module.get_cache_stats()["embedding_coalescer"]["requests"] == len(queries) + 1
+
+    # With nothing queued or in flight, a lone caller does not wait out max_wait_ms
+    lone = EmbeddingCoalescer(module.embeddings.embed_documents, max_wait_ms=2000)
+    start = time.perf_counter()
+    assert lone.embed(["cargo flights"]) == [module.embeddings._embed("cargo flights")]
+    assert time.perf_counter() - start < 1.0
+    lone.close()
+
+
+def test_vector_snapshot_matches_chroma_and_rebuilds_on_change():
+    """The flat NumPy scan returns Chroma's hits and follows collection updates"""
+    module = build_test_module()
+    queries = ["meal orders passenger flights", "stock count approval"]
+    expected = module.query_collection(queries, n_results=3)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        module.vector_snapshot = VectorSnapshot(os.path.join(tmp_dir, "snapshot"), module.collection_version)
+        hits = module.query_collection(queries, n_results=3)
+        assert [[hit["id"] for hit in per_query] for per_query in hits] == [[hit["id"] for hit in per_query] for per_query in expected]
+        assert all(
+            math.isclose(hit["distance"], reference["distance"], abs_tol=1e-4) and hit["document"] == reference["document"]
+            for per_query, reference_hits in zip(hits, expected) for hit, reference in zip(per_query, reference_hits)
+        )
+        assert module.vector_snapshot.get_stats()["rebuilds"] == 1
+
+        # A second worker reuses the exported files; float16 keeps the ranking
+        shared = VectorSnapshot(os.path.join(tmp_dir, "snapshot"), module.collection_version)
+        assert shared.search(module.collection, module.embed_queries(queries), 3) == hits
+        assert shared.get_stats()["loads"] == 1
+        half = VectorSnapshot(os.path.join(tmp_dir, "half"), module.collection_version, dtype="float16")
+        assert [hit["id"] for hit in half.search(module.collection, module.embed_queries(queries[:1]), 3)[0]] == [hit["id"] for hit in hits[0]]
+
+        document = "Galley carts are sealed after the stock count is approved."
+        module.collection.add(ids=["doc-new"], documents=[document], embeddings=module.embeddings.embed_documents([document]))
+        module.bump_collection_version()
+        assert module.query_collection(["sealed galley carts"], n_results=1)[0][0]["id"] == "doc-new"
+        assert module.vector_snapshot.get_stats()["chunks"] == len(DOCUMENTS) + 1
+
+        module.vector_snapshot.max_chunks = len(DOCUMENTS)
+        assert module.vector_snapshot.search(module.collection, module.embed_queries(queries), 3) is None
+
+
+def test_reranker_service_micro_batches_requests_from_clients():
+    """Concurrent clients share one encoder and their pairs are scored in one batch"""
+    encoder = FakeEncoder()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "reranker.sock")
+        service = RerankerService(encoder, socket_path, authkey=b"test-key", max_wait_ms=200)
+        server = threading.Thread(target=service.serve_forever, daemon=True)
+        server.start()
+        assert service.ready.wait(5)
+
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+        module = build_test_module()
+        module.encoder_model = module._connect_reranker_service(socket_path, authkey=b"test-key")
+        assert isinstance(module.encoder_model, RerankerClient)
+        assert module._connect_reranker_service(os.path.join(tmp_dir, "missing.sock"), authkey=b"test-key") is None
+        # A client with the wrong secret fails the handshake; none at all is refused up front
+        assert module._connect_reranker_service(socket_path, authkey=b"wrong-key") is None
+        try:
+            RerankerClient(socket_path, authkey=None)
+            assert False, "a client without an authkey must be rejected"
+        except ValueError:
+            pass
+
+        client = RerankerClient(socket_path, authkey=b"test-key")
+        scores = {}
+        workers = [
+            threading.Thread(target=lambda: scores.update(module=module.rerank_documents(DOCUMENTS, "cargo meal orders"))),
+            threading.Thread(target=lambda: scores.update(client=client.predict([("stock count", DOCUMENTS[0])]))),
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        assert "Cargo flights" in scores["module"][0]
+        assert float(scores["client"][0]) == 2.0
+        assert encoder.predict_calls == [len(DOCUMENTS) + 1]
+        assert service.get_stats()["requests"] == 2
+
+        service.stop()
+        server.join(5)
+        assert not server.is_alive()
+
+    try:
+        RerankerService(encoder, "unused.sock")
+        assert False, "a service without an authkey must refuse to start"
+    except ValueError:
+        pass
+    with tempfile.TemporaryDirectory() as runtime_dir, mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": runtime_dir}):
+        directory = os.path.dirname(default_socket_path())
+        assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+
+class FakeTokenizer:
+    """Encodes each (query, document) pair as the document length"""
+
+    def __call__(self, queries, documents, **kwargs):
+        return {"input_ids": np.array([[len(document)] for document in documents]), "attention_mask": np.ones((len(documents), 1))}
+
+
+class FakeOnnxSession:
+    def __init__(self, path, options, providers):
+        self.path, self.options, self.run_calls = path, options, 0
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, outputs, inputs):
+        self.run_calls += 1
+        return [inputs["input_ids"].astype(np.float32)]
+
+
+def _fake_onnx_modules():
+    ort = SimpleNamespace(
+        SessionOptions=SimpleNamespace, InferenceSession=FakeOnnxSession,
+        ExecutionMode=SimpleNamespace(ORT_SEQUENTIAL="sequential"), GraphOptimizationLevel=SimpleNamespace(ORT_ENABLE_ALL="all"),
+    )
+    transformers = SimpleNamespace(AutoTokenizer=SimpleNamespace(from_pretrained=lambda path: FakeTokenizer()))
+    return {"onnxruntime": ort, "transformers": transformers}
+
+
+def test_onnx_cross_encoder_scores_pairs_in_order():
+    """Scores come back one per pair, in input order, across batches; pinned to the given threads"""
+    documents = ["a", "abcd", "ab", "abcdef", "abc"]
+    with tempfile.TemporaryDirectory() as model_dir, mock.patch.dict(sys.modules, _fake_onnx_modules()):
+        encoder = OnnxCrossEncoder(model_dir, num_threads=3)
+        scores = encoder.predict([("q", document) for document in documents], batch_size=2)
+        assert encoder.session.options.intra_op_num_threads == 3 and encoder.session.options.inter_op_num_threads == 1
+        assert encoder.session.path == os.path.join(model_dir, "onnx/model.onnx")
+        assert scores.shape == (5,) and scores.tolist() == [1.0, 4.0, 2.0, 6.0, 3.0]
+        assert encoder.session.run_calls == 3
+
+        with open(os.path.join(model_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"id2label": {"0": "LABEL_0"}}, f)
+        sigmoid = OnnxCrossEncoder(model_dir).predict([("q", "ab")])
+        assert abs(float(sigmoid[0]) - 1 / (1 + math.exp(-2))) < 1e-6
+
+
+def test_create_reranker_selects_runtime_file_and_threads():
+    """The runtime, ONNX file, hub fallback and thread count follow the configuration"""
+    loaded = []
+    with tempfile.TemporaryDirectory() as model_dir, mock.patch.object(reranker_backends, "OnnxCrossEncoder", lambda path, file_name, num_threads: loaded.append((path, file_name, num_threads))):
+        os.makedirs(os.path.join(model_dir, "onnx"))
+        open(os.path.join(model_dir, DEFAULT_ONNX_FILE), "w").close()
+        # Quantized file missing: the float model is loaded instead
+        reranker_backends.create_reranker(model_dir, runtime="onnx", quantize=True, threads=2)
+        open(os.path.join(model_dir, DEFAULT_QUANTIZED_ONNX_FILE), "w").close()
+        reranker_backends.create_reranker(model_dir, runtime="onnx", quantize=True, threads=2)
+    assert [(file_name, threads) for _, file_name, threads in loaded] == [(DEFAULT_ONNX_FILE, 2), (DEFAULT_QUANTIZED_ONNX_FILE, 2)]
+
+    torch = SimpleNamespace(set_num_threads=mock.Mock())
+    cross_encoder = mock.Mock()
+    with mock.patch.dict(sys.modules, {"torch": torch, "sentence_transformers": SimpleNamespace(CrossEncoder=cross_encoder)}), \
+            mock.patch.object(reranker_backends.os, "cpu_count", return_value=16):
+        reranker_backends.create_reranker("./missing-reranker", runtime="torch", quantize=False, workers=2)
+        torch.set_num_threads.assert_called_once_with(max(1, 8 // reranker_backends.RERANKER_PROCESSES))
+        assert cross_encoder.call_args.args[0] == reranker_backends.RERANKER_HUB_MODEL
+        # Worker processes on the host share the cores too
+        assert reranker_backends.reranker_thread_count(workers=2, threads=0, processes=4) == 2
+        assert reranker_backends.reranker_thread_count(workers=2, threads=5, processes=4) == 5
+
+
+def test_collection_version_file_is_shared_between_instances():
+    """A bump written by one process is picked up by another reader"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "rag_collection.version")
+        writer, reader = CollectionVersion(path), CollectionVersion(path)
+
+        assert reader.get() == 0
+        assert writer.bump() == 1
+        assert reader.get() == 1
+        assert reader.bump() == 2 and writer.get() == 2
+
+
+def _write_pdf(path, pages):
+    import pymupdf
+
+    document = pymupdf.open()
+    for text in pages:
+        document.new_page().insert_textbox(pymupdf.Rect(36, 36, 560, 800), text)
+    document.save(path)
+    document.close()
+
+
+def test_iter_chunks_streams_overlapping_chunks():
+    """Chunks stay within size, overlap, and cover text spanning pages"""
+    pages = [(1, "alpha " * 100), (2, "beta " * 100)]
+
+    chunks = list(iter_chunks(pages, chunk_size=200, chunk_overlap=30))
+
+    assert all(len(text) <= 200 for _, text in chunks)
+    assert chunks[0][0] == 1 and chunks[-1][0] == 2
+    assert any("alpha" in text and "beta" in text for _, text in chunks)
+
+    try:
+        iter_chunks(pages, chunk_size=200, chunk_overlap=100)
+        assert False, "an overlap of half the chunk size must be rejected"
+    except ValueError:
+        pass
+
+
+def test_ingestion_is_incremental():
+    """Re-ingesting skips unchanged chunks and only embeds edited ones"""
+    module = build_test_module()
+    ingestion = KnowledgeIngestion(module, chunk_size=300, chunk_overlap=0, batch_size=4)
+    base_pages = [" ".join(DOCUMENTS), " ".join(reversed(DOCUMENTS))]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _write_pdf(os.path.join(tmp_dir, "manual.pdf"), base_pages)
+
+        first = ingestion.ingest_directory(tmp_dir, purge_unmanaged=True)
+        assert first["status"] == "success"
+        assert first["embedded"] == first["chunks"] > 0
+        assert first["deleted"] == len(DOCUMENTS)
+        assert module.collection.count() == first["chunks"]
+
+        second = ingestion.ingest_directory(tmp_dir)
+        assert second["embedded"] == 0
+        assert second["unchanged"] == first["chunks"]
+
+        _write_pdf(os.path.join(tmp_dir, "manual.pdf"), [base_pages[0]])
+        third = ingestion.ingest_directory(tmp_dir)
+        # Only the chunk that used to run into the removed page changes
+        assert third["embedded"] <= 1
+        assert third["unchanged"] == third["chunks"] - third["embedded"]
+        assert third["deleted"] == first["chunks"] - third["chunks"]
+        assert module.collection.count() == third["chunks"]
+
+        # With prune_missing, chunks of a document removed from the directory are deleted
+        _write_pdf(os.path.join(tmp_dir, "extra.pdf"), [DOCUMENTS[0]])
+        with_extra = ingestion.ingest_directory(tmp_dir)
+        assert with_extra["files"] == 2 and module.collection.count() == third["chunks"] + with_extra["embedded"]
+        os.remove(os.path.join(tmp_dir, "extra.pdf"))
+        assert ingestion.ingest_directory(tmp_dir)["deleted"] == 0
+        removed = ingestion.ingest_directory(tmp_dir, prune_missing=True)
+        assert removed["deleted"] == with_extra["embedded"] and removed["embedded"] == 0
+        assert module.collection.count() == third["chunks"]
+
+    stored = module.collection.get(ids=["manual.pdf::0"], include=["metadatas"])
+    assert stored["metadatas"][0]["source"] == "manual.pdf"
+    assert stored["metadatas"][0]["page"] == 1
+
+
+def test_ingesting_another_directory_keeps_earlier_documents():
+    """A second directory (a new batch or a subfolder) adds to the library without pruning it"""
+    module = build_test_module()
+    ingestion = KnowledgeIngestion(module, chunk_size=300, chunk_overlap=0)
+
+    with tempfile.TemporaryDirectory() as first_dir, tempfile.TemporaryDirectory() as second_dir:
+        _write_pdf(os.path.join(first_dir, "manual.pdf"), [" ".join(DOCUMENTS)])
+        _write_pdf(os.path.join(second_dir, "addendum.pdf"), [" ".join(reversed(DOCUMENTS))])
+        first = ingestion.ingest_directory(first_dir, purge_unmanaged=True)
+        second = ingestion.ingest_directory(second_dir)
+
+    assert second["deleted"] == 0
+    sources = [metadata["source"] for metadata in module.collection.get(include=["metadatas"])["metadatas"]]
+    assert sources.count("manual.pdf") == first["chunks"]
+    assert sources.count("addendum.pdf") == second["chunks"]
+
+
+def test_parent_child_chunks_rebuild_their_parent():
+    """Children carry offsets that reproduce the parent section exactly"""
+    page = " ".join(DOCUMENTS * 3)
+    parents = list(iter_chunks([(1, page)], chunk_size=400, chunk_overlap=0))
+    children = list(iter_parent_child_chunks([(1, page)], parent_chunk_size=400, chunk_size=120, chunk_overlap=30))
+
+    assert all(len(text) <= 120 for _, text, _, _ in children)
+    for parent_index, (_, parent) in enumerate(parents):
+        pieces = [(offset, text) for _, text, index, offset in children if index == parent_index]
+        assert len(pieces) > 1 or len(parent) <= 120
+        assert stitch_sections(pieces) == parent
+
+
+def test_parent_context_returns_deduplicated_parent_sections():
+    """Small children are reranked, their parent sections fill the context once each"""
+    module = build_test_module()
+    ingestion = KnowledgeIngestion(module, chunk_size=120, chunk_overlap=20, parent_chunk_size=500)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _write_pdf(os.path.join(tmp_dir, "manual.pdf"), [" ".join(DOCUMENTS), " ".join(reversed(DOCUMENTS))])
+        ingestion.ingest_directory(tmp_dir, purge_unmanaged=True)
+
+    stored = module.collection.get(include=["metadatas"])
+    assert all(metadata["parent_id"].startswith("manual.pdf::parent::") for metadata in stored["metadatas"])
+
+    result = module.get_knowledge_context("meal orders for cargo flights and passenger flights")
+    parent_ids = [chunk["id"] for chunk in result["chunks"]]
+    assert parent_ids and len(parent_ids) == len(set(parent_ids))
+    assert all("::parent::" in parent_id for parent_id in parent_ids)
+    # Every scored pair is a small child chunk, the context holds whole parent sections
+    assert all(len(document) <= 120 for query in result["query_results"].values() for document in query["documents"])
+    assert len(result["combined_context"]) > 120
+
+    documents = module.get_knowledge_documents(parent_ids[:1])
+    assert documents["documents"][0]["document"] in result["combined_context"]
+    assert documents["missing_ids"] == []
+
+    module.context_token_budget = 40
+    module.semantic_cache.clear()
+    capped = module.get_knowledge_context("meal orders for cargo flights")
+    assert estimate_tokens(capped["combined_context"]) <= 40
+
+
+def test_parent_context_ranks_legacy_chunks_by_their_own_score():
+    """In a mixed collection a relevant chunk without a parent is not pushed behind parent sections"""
+    module = build_test_module()
+    module.parent_context = True
+    module.context_mmr_lambda = None
+    section = " ".join(DOCUMENTS[:3])
+    module._load_parent_sections = lambda parent_ids: {
+        parent_id: {"id": parent_id, "document": section, "metadata": {}} for parent_id in parent_ids
+    }
+    chunks = [
+        {"id": "manual.pdf::0", "document": DOCUMENTS[0], "score": 0.4, "metadata": {"parent_id": "manual.pdf::parent::0"}},
+        {"id": "legacy-1", "document": DOCUMENTS[3], "score": 0.9, "metadata": {}},
+        {"id": "manual.pdf::1", "document": DOCUMENTS[1], "score": 0.3, "metadata": {"parent_id": "manual.pdf::parent::0"}},
+    ]
+
+    module.context_token_budget = estimate_tokens(section) + estimate_tokens(DOCUMENTS[3])
+    assert [chunk["id"] for chunk in module._pack_chunks(chunks)] == ["legacy-1", "manual.pdf::parent::0"]
+
+    # Only one unit fits: the higher-scoring legacy chunk wins over the parent section
+    module.context_token_budget = estimate_tokens(section)
+    packed = module._pack_chunks(chunks)
+    assert packed[0]["id"] == "legacy-1"
+    assert "manual.pdf::parent::0" not in [chunk["id"] for chunk in packed]
+
+
+def test_collection_compatibility_check():
+    """Collections embedded with another model or dimension are rejected"""
+    module = build_test_module()
+    collection = module.collection
+
+    assert check_collection_compatibility(collection, "fake:test", 64) is None
+    assert "dimensional" in check_collection_compatibility(collection, "fake:test", 384)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _write_pdf(os.path.join(tmp_dir, "manual.pdf"), DOCUMENTS)
+        KnowledgeIngestion(module).ingest_directory(tmp_dir)
+
+    assert module.collection.metadata["embedding_model"] == "fake:test"
+    assert check_collection_compatibility(module.collection, "fake:test", None) is None
+    assert "embedded with fake:test" in check_collection_compatibility(module.collection, "local:other:onnx", None)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for the deterministic stock count vs ERP reconciliation tool
+"""
+
+import os
+import tempfile
+
+from modules.data_store import SQLiteDataStore, seed_sample_data
+from modules.erp_module import ERPModule
+from modules.reconciliation_module import ReconciliationModule, StreamingReconciliation, merge_join_items
+from modules.stock_count_module import StockCountModule
+
+
+def _record(transaction_id, n, book_bulk, book_actual, **extra):
+    return {"transaction_id": transaction_id, "item_code": f"ITEM{n:05d}", "item_desc": f"Item {n}",
+            "book_bulk": book_bulk, "book_actual": book_actual, "float_book": n, "float_actual": 0, **extra}
+
+
+def test_sample_transaction_verdict():
+    """Only book_bulk and book_actual decide approval; differences are stock count - ERP"""
+    verdict = ReconciliationModule(StockCountModule(), ERPModule()).reconcile_transaction("TXN001")
+
+    assert verdict.overall_approval == "REJECTED"
+    assert (verdict.total_items, verdict.items_approved, verdict.items_requiring_review) == (3, 1, 2)
+    assert verdict.approval_percentage == 33.33
+    assert [(item.item_code, item.book_bulk_difference, item.book_actual_difference) for item in verdict.discrepancies] == [
+        ("ITEM001", 0, -3), ("ITEM002", 5, 0),
+    ]
+    assert ReconciliationModule(StockCountModule(), ERPModule()).reconcile_transaction("TXN999").status == "error"
+
+
+def test_large_transaction_with_missing_items():
+    """A 5,000-item count lists a bounded number of discrepancies"""
+    stock_counts, erp = StockCountModule(), ERPModule()
+    stock_counts.load_stock_counts(
+        _record("TXN500", n, 100, 90 if n % 1000 == 0 else 95, is_review_yn="N") for n in range(5000)
+    )
+    # ERP lacks item 1 and has an extra item 5000
+    erp.load_erp_items(_record("TXN500", n, 100, 95) for n in range(5001) if n != 1)
+    reconciliation = ReconciliationModule(stock_counts, erp, max_listed=3)
+
+    verdict = reconciliation.reconcile_transaction("TXN500")
+
+    assert verdict.total_items == 5001 and verdict.items_approved == 4994
+    assert (verdict.mismatched_items, verdict.missing_in_erp, verdict.missing_in_stock_count) == (5, 1, 1)
+    assert [(item.item_code, item.issue) for item in verdict.discrepancies] == [
+        ("ITEM00000", "mismatch"), ("ITEM00001", "missing_in_erp"), ("ITEM01000", "mismatch"),
+    ]
+    assert verdict.discrepancies_not_listed == 4
+
+
+def test_duplicate_item_codes_are_counted_once():
+    """A repeated item code counts as one item, as in the streaming merge join"""
+    stock_records = [_record("TXN700", n, 10, 10) for n in (1, 1, 2, 3, 3)]
+    erp_records = [_record("TXN700", n, 10, 10) for n in (2, 4, 4, 5)]
+    stock_counts, erp = StockCountModule(), ERPModule()
+    stock_counts.load_stock_counts(stock_records)
+    erp.load_erp_items(erp_records)
+
+    verdict = ReconciliationModule(stock_counts, erp).reconcile_transaction("TXN700")
+    assert (verdict.total_items, verdict.missing_in_erp, verdict.missing_in_stock_count) == (5, 2, 2)
+    assert verdict == StreamingReconciliation(stock_records, erp_records).verdict("TXN700")
+
+
+def test_store_backed_reconciliation_matches_memory():
+    """The tool gives the same verdict from the SQLite store"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteDataStore(os.path.join(directory, "data.sqlite3"))
+        seed_sample_data(store)
+        from_store = ReconciliationModule(StockCountModule(store=store), ERPModule(store=store))
+        in_memory = ReconciliationModule(StockCountModule(), ERPModule())
+        for transaction_id in ("TXN001", "TXN004"):
+            assert from_store.reconcile_transaction(transaction_id) == in_memory.reconcile_transaction(transaction_id)
+        store.close()
+
+
+def test_streaming_merge_join_matches_vectorized_verdict():
+    """Store-backed counts stream through one merge-join pass with running totals"""
+    stock_records = [_record("TXN900", n, 100, 95 if n % 997 else 94, is_review_yn="N") for n in range(20000) if n != 5]
+    erp_records = [_record("TXN900", n, 100, 95) for n in range(20003) if n != 7]
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteDataStore(os.path.join(directory, "data.sqlite3"))
+        store.load_rows("stock_counts", reversed(stock_records))
+        store.load_rows("erp_items", erp_records)
+        streaming = ReconciliationModule(StockCountModule(store=store), ERPModule(store=store))
+
+        run = streaming.iter_reconciliation("TXN900")
+        first = next(iter(run))
+        assert (first.item_code, first.issue) == ("ITEM00000", "mismatch")
+        assert run.get_totals()["total_items"] == 1
+        assert [discrepancy.issue for discrepancy in run][:2] == ["missing_in_stock_count", "missing_in_erp"]
+        assert run.get_totals()["items_requiring_review"] == 21 + 1 + 1 + 3
+
+        stock_counts, erp = StockCountModule(), ERPModule()
+        stock_counts.load_stock_counts(stock_records)
+        erp.load_erp_items(erp_records)
+        vectorized = ReconciliationModule(stock_counts, erp).reconcile_transaction("TXN900")
+        assert streaming.reconcile_transaction("TXN900") == vectorized
+        assert streaming.reconcile_transaction("TXN999").status == "error"
+        store.close()
+
+    unsorted = [{"item_code": "B", "item_desc": "", "book_bulk": 1, "book_actual": 1}, {"item_code": "A", "item_desc": "", "book_bulk": 1, "book_actual": 1}]
+    try:
+        list(merge_join_items(unsorted, []))
+        assert False, "unsorted input must be rejected"
+    except ValueError:
+        pass
+    assert StreamingReconciliation([], []).verdict("TXN000").status == "error"
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the transaction-grouped columnar table behind StockCountModule and ERPModule
+"""
+
+from modules.erp_module import ERPModule
+from modules.stock_count_module import StockCountModule
+from modules.transaction_table import TransactionTable
+
+
+def test_rows_are_grouped_into_sorted_contiguous_ranges():
+    """Rows loaded in any order come back per transaction, sorted by item_code"""
+    table = TransactionTable({"transaction_id": str, "item_code": str, "qty": int})
+    table.load([
+        {"transaction_id": "T2", "item_code": "B", "qty": "3"},
+        {"transaction_id": "T1", "item_code": "C", "qty": 1},
+        {"transaction_id": "T2", "item_code": "A", "qty": 2},
+    ])
+    table.load_columns({"transaction_id": ["T1", "T3"], "item_code": ["A", "A"], "qty": [4, 5]})
+
+    assert len(table) == 5 and table.transaction_ids == ["T1", "T2", "T3"]
+    assert table.get_range("T2") == (2, 4)
+    assert table.get_rows("T2") == [
+        {"transaction_id": "T2", "item_code": "A", "qty": 2},
+        {"transaction_id": "T2", "item_code": "B", "qty": 3},
+    ]
+    assert table.get_columns("T1")["qty"].tolist() == [4, 1]
+    assert table.get_rows("T9") == [] and len(table.get_columns("T9")["qty"]) == 0
+
+
+def test_incremental_loads_merge_into_the_sorted_table():
+    """Several loads give the same rows as one sorted load; duplicates keep load order"""
+    batches = [
+        [("T2", "B", 1), ("T1", "Z", 2)],
+        [("T2", "A", 3), ("T2", "B", 4), ("T10", "ITEM-LONGER-CODE", 5)],
+        [("T1", "A", 6), ("T3", "C", 7), ("T2", "B", 8)],
+    ]
+    table = TransactionTable({"transaction_id": str, "item_code": str, "qty": int})
+    for batch in batches:
+        table.load({"transaction_id": t, "item_code": c, "qty": q} for t, c, q in batch)
+
+    rows = [row for batch in batches for row in batch]
+    expected = sorted(rows, key=lambda row: (row[0], row[1]))
+    actual = [(row["transaction_id"], row["item_code"], row["qty"]) for t in table.transaction_ids for row in table.get_rows(t)]
+    assert actual == expected
+    assert [row["qty"] for row in table.get_rows("T2")] == [3, 1, 4, 8]
+    assert table.get_rows("T10")[0]["item_code"] == "ITEM-LONGER-CODE"
+
+
+def test_modules_read_loaded_records_from_the_table():
+    """Bulk-loaded records are returned by the existing detail lookups"""
+    stock_counts = StockCountModule()
+    stock_counts.load_stock_counts([
+        {"transaction_id": "TXN100", "item_code": f"ITEM{n:03d}", "item_desc": "Item", "book_bulk": n,
+         "book_actual": n, "float_book": 0, "float_actual": 0, "is_review_yn": "N"}
+        for n in range(50, 0, -1)
+    ])
+    response = stock_counts.get_stock_count_details("TXN100")
+    assert response.total_items == 50 and response.data[0].item_code == "ITEM001"
+    assert stock_counts.get_stock_count_details("TXN001").total_items == 3
+
+    erp = ERPModule()
+    assert [item.item_code for item in erp.get_erp_details("TXN004").data] == ["ITEM007", "ITEM008", "ITEM009"]
+    assert erp.get_erp_details("TXN100").status == "error"
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ {name}")